@@ -25,6 +25,7 @@
              'view/sale_workflow_process_view.xml',
              'data/automatic_workflow_data.xml',
              'view/common_log_lines_ept.xml',
+             'view/postal_code_state_ept.xml',
             'view/assets.xml',
     ],
     'qweb': [
@@ -1,6 +1,8 @@
 # coding: utf-8
 # See LICENSE file for full copyright and licensing details.
 from . import res_partner
+from . import res_country
+from . import res_currency
 from . import sale_workflow_process
 from . import sale_order
 from . import sale_order_line
@@ -21,4 +23,6 @@ from . import vendor_stock_ept
 from . import account_move
 from . import ir_cron
 from . import data_queue_mixin_ept
+from . import data_queue_state_mixin_ept
 from . import account_bank_statement_line
+from . import postal_code_state_ept
@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
 # See LICENSE file for full copyright and licensing details.
+import logging
+import time
 from odoo import models
 
+_logger = logging.getLogger("Common Connector")
+
+
 class AccountMove(models.Model):
     _inherit = 'account.move'
 
@@ -23,3 +28,42 @@ class AccountMove(models.Model):
             'payment_method_id': work_flow_process_record.inbound_payment_method_id.id,
             'partner_type': 'customer'
         }
+
+    def paid_invoices_in_batch_ept(self, work_flow_process_record):
+        """
+        This method registers the payments of the invoices with the journal and payment method of the workflow.
+        All payments are created and posted at once and then reconciled with their invoices.
+        :param work_flow_process_record: Sale Workflow object.
+        :return: Recordset of the payments.
+        """
+        account_payment_obj = self.env['account.payment']
+        start = time.time()
+        invoices = self.filtered(lambda x: x.state == 'posted' and x.amount_residual)
+        if not invoices:
+            return account_payment_obj
+
+        payments = account_payment_obj.create([invoice.prepare_payment_dict(work_flow_process_record)
+                                               for invoice in invoices])
+        payments.action_post()
+        invoices.reconcile_payments_in_batch_ept(payments)
+
+        duration = time.time() - start
+        _logger.info("Registered and reconciled %s payments of workflow %s in %.2f seconds (%.2f payments/second).",
+                     len(payments), work_flow_process_record.name, duration,
+                     len(payments) / duration if duration else len(payments))
+        return payments
+
+    def reconcile_payments_in_batch_ept(self, payments):
+        """
+        This method reconciles the receivable lines of each invoice with the lines of its payment. The lines are
+        taken from the already loaded moves instead of searching them per invoice. Each pair is reconciled on its
+        own, as the reconciliation of many lines matches them by date and not by invoice.
+        :param payments: Payments in the same order as the invoices.
+        """
+        domain = [('account_internal_type', 'in', ('receivable', 'payable')), ('reconciled', '=', False)]
+        for invoice, payment in zip(self, payments):
+            invoice_lines = invoice.line_ids.filtered(lambda line: line.account_internal_type == 'receivable')
+            lines = (payment.line_ids + invoice_lines).filtered_domain(domain)
+            for account in lines.account_id:
+                lines.filtered(lambda line: line.account_id == account).reconcile()
+        return True
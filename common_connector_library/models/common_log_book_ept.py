@@ -24,6 +24,13 @@ class CommonLogBookEpt(models.Model):
     res_id = fields.Integer(string="Record ID", help="Process record id")
     attachment_id = fields.Many2one('ir.attachment', string="Attachment")
 
+    def init(self):
+        """
+        Creates the index of the log books by creation date, used to purge the old log books.
+        """
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS common_log_book_ept_create_date_index
+                            ON common_log_book_ept (create_date)""")
+
     @api.model
     def create(self, vals):
         """
@@ -14,6 +14,13 @@ class CommonLogLineEpt(models.Model):
     model_id = fields.Many2one("ir.model", string="Model")
     res_id = fields.Integer("Record ID")
 
+    def init(self):
+        """
+        Creates the index of the log lines by log book, used to purge the lines of the old log books.
+        """
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS common_log_lines_ept_log_book_id_index
+                            ON common_log_lines_ept (log_book_id)""")
+
     @api.model
     def get_model_id(self, model_name):
         """
@@ -1,19 +1,29 @@
 # -*- coding: utf-8 -*-
 # See LICENSE file for full copyright and licensing details.
 """ Mixin class for deleting unused data queue from database."""
+import logging
+import time
+from datetime import datetime, timedelta
 from odoo import models
 
+_logger = logging.getLogger("Common Connector")
+
+
 class DataQueueMixinEpt(models.AbstractModel):
     """ Mixin class for deleting unused data queue from database."""
     _name = 'data.queue.mixin.ept'
     _description = 'Data Queue Mixin'
 
-    def delete_data_queue_ept(self, queue_detail=[], is_delete_queue=False):
+    def delete_data_queue_ept(self, queue_detail=[], is_delete_queue=False, retention_days=7, chunk_size=1000,
+                              throttle_seconds=0.1):
         """
         Usage: Method for deleting unused data queues from connectors after 7 days.
         @author: Dipak Gogiya
         :param is_delete_queue: Delete all data form queue table.
         :param queue_detail: ['sample_data_queue_ept1','sample_data_queue_ept2']
+        :param retention_days: Records created before these many days are deleted.
+        :param chunk_size: Number of records deleted and committed at a time.
+        :param throttle_seconds: Pause between two chunks, to let other transactions and replication catch up.
         :return: True
 
         Changes done by twinkalc on 3rd FEB 2021 to delete log book data and process
@@ -27,8 +37,63 @@ class DataQueueMixinEpt(models.AbstractModel):
                     if is_delete_queue:
                         self._cr.execute("""delete from %s """ % str(tbl_name))
                         continue
-                    self._cr.execute(
-                        """delete from %s where cast(create_date as Date) <= current_date - %d""" % (str(tbl_name), 7))
+                    self.purge_data_queue_table_ept(tbl_name, retention_days, chunk_size, throttle_seconds)
             except Exception as error:
                 return error
         return True
+
+    def get_cascade_child_tables_ept(self, tbl_name):
+        """
+        Usage: Finds the tables having a foreign key to the table which deletes their rows on cascade, i.e. the
+        queue lines of a queue table.
+        :param tbl_name: Name of the parent table.
+        :return: List of tuples of child table and foreign key column.
+        """
+        self._cr.execute("""SELECT child.relname, attribute.attname
+                            FROM pg_constraint AS foreign_key
+                            INNER JOIN pg_class AS child ON child.oid = foreign_key.conrelid
+                            INNER JOIN pg_class AS parent ON parent.oid = foreign_key.confrelid
+                            INNER JOIN pg_attribute AS attribute ON attribute.attrelid = foreign_key.conrelid
+                                AND attribute.attnum = foreign_key.conkey[1]
+                            WHERE foreign_key.contype = 'f' AND foreign_key.confdeltype = 'c'
+                                AND parent.relname = %s""", (tbl_name,))
+        return self._cr.fetchall()
+
+    def purge_data_queue_table_ept(self, tbl_name, retention_days=7, chunk_size=1000, throttle_seconds=0.1):
+        """
+        Usage: Deletes the records of the table created before the retention days in chunks ordered by id. The rows
+        deleted on cascade, like the queue lines, are deleted first in chunks as well, so each committed delete
+        stays bounded. The creation date indexes are created by the init of the models.
+        :param tbl_name: Name of the queue table.
+        :return: Number of deleted records.
+        """
+        start = time.time()
+        deleted_count = 0
+        limit_date = datetime.combine(datetime.now().date() - timedelta(days=retention_days - 1), datetime.min.time())
+        child_tables = self.get_cascade_child_tables_ept(tbl_name)
+        while True:
+            self._cr.execute("""SELECT id FROM %s WHERE create_date < %%s ORDER BY id LIMIT %%s""" % tbl_name,
+                             (limit_date, chunk_size))
+            record_ids = [result[0] for result in self._cr.fetchall()]
+            if not record_ids:
+                break
+            for child_table, column_name in child_tables:
+                while True:
+                    self._cr.execute("""DELETE FROM %s WHERE id IN (
+                                            SELECT id FROM %s WHERE %s IN %%s LIMIT %%s)""" % (
+                        child_table, child_table, column_name), (tuple(record_ids), chunk_size))
+                    child_count = self._cr.rowcount
+                    self._cr.commit()
+                    if child_count < chunk_size:
+                        break
+                    if throttle_seconds:
+                        time.sleep(throttle_seconds)
+            self._cr.execute("""DELETE FROM %s WHERE id IN %%s""" % tbl_name, (tuple(record_ids),))
+            deleted_count += self._cr.rowcount
+            self._cr.commit()
+            if len(record_ids) < chunk_size:
+                break
+            if throttle_seconds:
+                time.sleep(throttle_seconds)
+        _logger.info("Deleted %s records from %s in %.2f seconds.", deleted_count, tbl_name, time.time() - start)
+        return deleted_count
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+""" Mixin class for counting the lines of data queues by state."""
+from odoo import models
+
+
+class DataQueueStateMixinEpt(models.AbstractModel):
+    """ Mixin class for counting the lines of data queues by state."""
+    _name = 'data.queue.state.mixin.ept'
+    _description = 'Data Queue State Mixin'
+
+    def get_queue_line_state_counts_ept(self, line_model, queue_field):
+        """
+        Usage: Counts the queue lines of the queues by state with one grouped query.
+        :param line_model: Model of the queue lines.
+        :param queue_field: Field of the queue line which links it to its queue.
+        :return: Dictionary of queue id and dictionary of state and number of lines.
+        """
+        state_counts = {}
+        if not self.ids:
+            return state_counts
+        for group in self.env[line_model].read_group([(queue_field, 'in', self.ids)], [queue_field, 'state'],
+                                                     [queue_field, 'state'], lazy=False):
+            queue_counts = state_counts.setdefault(group[queue_field][0], {})
+            queue_counts[group['state']] = group['__count']
+        return state_counts
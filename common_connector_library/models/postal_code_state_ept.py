@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+import csv
+import logging
+
+from odoo import models, fields, api, tools
+
+_logger = logging.getLogger(__name__)
+
+
+class PostalCodeStateEpt(models.Model):
+    _name = "postal.code.state.ept"
+    _description = "Postal Code State"
+    _order = "country_id, postal_prefix"
+
+    country_id = fields.Many2one("res.country", required=True, ondelete="cascade")
+    postal_prefix = fields.Char(required=True, help="Beginning of the postal codes of the state. The longest "
+                                                    "prefix matching a postal code gives its state.")
+    state_id = fields.Many2one("res.country.state", required=True, ondelete="cascade")
+
+    _sql_constraints = [("postal_prefix_unique", "unique(country_id,postal_prefix)",
+                         "Postal prefix must be unique per country.")]
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Normalizes the prefixes and clears the cached index.
+        """
+        for vals in vals_list:
+            if vals.get("postal_prefix"):
+                vals.update({"postal_prefix": self.normalize_postal_code_ept(vals.get("postal_prefix"))})
+        records = super(PostalCodeStateEpt, self).create(vals_list)
+        self.clear_caches()
+        return records
+
+    def write(self, vals):
+        """
+        Normalizes the prefix and clears the cached index.
+        """
+        if vals.get("postal_prefix"):
+            vals.update({"postal_prefix": self.normalize_postal_code_ept(vals.get("postal_prefix"))})
+        res = super(PostalCodeStateEpt, self).write(vals)
+        self.clear_caches()
+        return res
+
+    def unlink(self):
+        """
+        Clears the cached index.
+        """
+        res = super(PostalCodeStateEpt, self).unlink()
+        self.clear_caches()
+        return res
+
+    @api.model
+    def normalize_postal_code_ept(self, postal_code):
+        """
+        Usage: Removes the spaces and the extension after the dash, and makes the postal code upper case.
+        :param postal_code: Postal code or prefix.
+        :return: Normalized postal code.
+        """
+        return (postal_code or "").split("-")[0].replace(" ", "").upper()
+
+    @api.model
+    @tools.ormcache("country_id")
+    def _get_postal_prefix_index(self, country_id):
+        """
+        Usage: Loads the prefixes of the country in a dictionary of prefix and state id. It is cached per worker
+        until a prefix is changed.
+        :param country_id: Id of the country.
+        :return: Dictionary of postal prefix and state id.
+        """
+        self._cr.execute("SELECT postal_prefix, state_id FROM postal_code_state_ept WHERE country_id = %s",
+                         (country_id,))
+        return dict(self._cr.fetchall())
+
+    @api.model
+    @tools.ormcache("country_id", "postal_code")
+    def _resolve_state_id(self, country_id, postal_code):
+        """
+        Usage: Finds the state of the longest prefix of the postal code. The result is cached per postal code.
+        :param country_id: Id of the country.
+        :param postal_code: Normalized postal code.
+        :return: Id of the state or False.
+        """
+        prefix_index = self._get_postal_prefix_index(country_id)
+        for length in range(len(postal_code), 0, -1):
+            state_id = prefix_index.get(postal_code[:length])
+            if state_id:
+                return state_id
+        return False
+
+    @api.model
+    def resolve_state_ept(self, country, postal_code):
+        """
+        Usage: Finds the state of a postal code from the local postal prefixes, without any network request.
+        :param country: Record of the country.
+        :param postal_code: Postal code of the address.
+        :return: Record of the state or empty recordset.
+        """
+        state_obj = self.env["res.country.state"]
+        postal_code = self.normalize_postal_code_ept(postal_code)
+        if not country or not postal_code:
+            return state_obj
+        return state_obj.browse(self._resolve_state_id(country.id, postal_code))
+
+    def _register_hook(self):
+        """
+        Usage: Loads the postal prefixes when the registry of the worker is loaded.
+        """
+        res = super(PostalCodeStateEpt, self)._register_hook()
+        try:
+            with self._cr.savepoint():
+                self.preload_postal_code_index_ept()
+        except Exception as error:
+            _logger.warning("Postal prefixes are not preloaded: %s", error)
+        return res
+
+    @api.model
+    def preload_postal_code_index_ept(self):
+        """
+        Usage: Loads the prefixes of all countries in the cache of the worker, so the first imports do not wait
+        for it.
+        """
+        self._cr.execute("SELECT DISTINCT country_id FROM postal_code_state_ept")
+        for country_id, in self._cr.fetchall():
+            self._get_postal_prefix_index(country_id)
+        return True
+
+    @api.model
+    def import_postal_code_file_ept(self, file_path, delimiter=","):
+        """
+        Usage: Imports the postal prefixes from a CSV file with the columns country_code, postal_prefix,
+        state_code and state_name. It can be called from the Odoo shell, i.e.
+        env["postal.code.state.ept"].import_postal_code_file_ept("/path/to/us.csv")
+        :param file_path: Path of the CSV file.
+        :param delimiter: Delimiter of the columns.
+        :return: Number of imported prefixes.
+        """
+        with open(file_path, newline="", encoding="utf-8") as postal_file:
+            return self.import_postal_code_data_ept(csv.DictReader(postal_file, delimiter=delimiter))
+
+    @api.model
+    def import_postal_code_data_ept(self, rows):
+        """
+        Usage: Creates or updates the postal prefixes from rows with the keys country_code, postal_prefix,
+        state_code and state_name. Missing states are created with one create, like the states found by the
+        postal code API.
+        :param rows: Iterable of dictionaries.
+        :return: Number of imported prefixes.
+        """
+        country_obj = self.env["res.country"]
+        state_obj = self.env["res.country.state"]
+        countries = {}
+        state_ids = {}
+        missing_states = {}
+        prefix_states = {}
+        for row in rows:
+            country_code = (row.get("country_code") or "").strip().upper()
+            state_code = (row.get("state_code") or "").strip()
+            postal_prefix = self.normalize_postal_code_ept(row.get("postal_prefix"))
+            if not country_code or not state_code or not postal_prefix:
+                continue
+            if country_code not in countries:
+                countries[country_code] = country_obj.search([("code", "=", country_code)], limit=1)
+            country = countries[country_code]
+            if not country:
+                continue
+            state_key = (country.id, state_code.upper())
+            if state_key not in state_ids and state_key not in missing_states:
+                state = state_obj.search([("code", "=ilike", state_code), ("country_id", "=", country.id)], limit=1)
+                if state:
+                    state_ids[state_key] = state.id
+                else:
+                    missing_states[state_key] = {"name": (row.get("state_name") or state_code).strip(),
+                                                 "code": state_code, "country_id": country.id}
+            prefix_states[(country.id, postal_prefix)] = state_key
+
+        if missing_states:
+            created_states = state_obj.create(list(missing_states.values()))
+            state_ids.update(zip(missing_states.keys(), created_states.ids))
+        params = [(country_id, postal_prefix, state_ids[state_key])
+                  for (country_id, postal_prefix), state_key in prefix_states.items()]
+        for chunk in tools.split_every(1000, params):
+            self._cr.execute("""INSERT INTO postal_code_state_ept
+                                    (country_id, postal_prefix, state_id, create_uid, create_date, write_uid,
+                                     write_date)
+                                SELECT country_id, postal_prefix, state_id, %s, now() at time zone 'UTC', %s,
+                                       now() at time zone 'UTC'
+                                FROM unnest(%s, %s, %s) AS data(country_id, postal_prefix, state_id)
+                                ON CONFLICT (country_id, postal_prefix)
+                                DO UPDATE SET state_id = EXCLUDED.state_id, write_date = EXCLUDED.write_date""",
+                             (self.env.uid, self.env.uid, [param[0] for param in chunk],
+                              [param[1] for param in chunk], [param[2] for param in chunk]))
+        self.clear_caches()
+        self.preload_postal_code_index_ept()
+        _logger.info("Imported %s postal prefixes.", len(params))
+        return len(params)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+from odoo import models, api, tools
+
+# Fields of the cached lookups. Writing other fields keeps the registry cache.
+COUNTRY_LOOKUP_FIELDS = {"name", "code"}
+STATE_LOOKUP_FIELDS = {"name", "code", "country_id"}
+
+
+class ResCountry(models.Model):
+    _inherit = "res.country"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Clears the cached lookup of the countries.
+        """
+        countries = super(ResCountry, self).create(vals_list)
+        self.clear_caches()
+        return countries
+
+    def write(self, vals):
+        """
+        Clears the cached lookup of the countries, when a field of the lookup is changed.
+        """
+        res = super(ResCountry, self).write(vals)
+        if COUNTRY_LOOKUP_FIELDS.intersection(vals):
+            self.clear_caches()
+        return res
+
+    def unlink(self):
+        """
+        Clears the cached lookup of the countries.
+        """
+        res = super(ResCountry, self).unlink()
+        self.clear_caches()
+        return res
+
+    @api.model
+    @tools.ormcache("self.env.lang")
+    def _get_country_lookup_ept(self):
+        """
+        Usage: Loads the codes and names of all countries in a dictionary. It is cached in the registry until a
+        country is changed.
+        :return: Dictionary of lower case code or name and id of the country.
+        """
+        countries = self.search_read([], ["code", "name"])
+        lookup = {}
+        for field_name in ["code", "name"]:
+            for country in countries:
+                if country[field_name]:
+                    lookup.setdefault(country[field_name].strip().lower(), country["id"])
+        return lookup
+
+    @api.model
+    def get_country_by_name_or_code_ept(self, country_name_or_code):
+        """
+        Usage: Finds the country by code or name, ignoring the case, from the cached lookup.
+        :param country_name_or_code: Country Name or Country Code, Type: Char
+        :return: res.country()
+        """
+        if not country_name_or_code or not isinstance(country_name_or_code, str):
+            return self
+        return self.browse(self._get_country_lookup_ept().get(country_name_or_code.strip().lower()))
+
+
+class ResCountryState(models.Model):
+    _inherit = "res.country.state"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Clears the cached lookup of the states.
+        """
+        states = super(ResCountryState, self).create(vals_list)
+        self.clear_caches()
+        return states
+
+    def write(self, vals):
+        """
+        Clears the cached lookup of the states, when a field of the lookup is changed.
+        """
+        res = super(ResCountryState, self).write(vals)
+        if STATE_LOOKUP_FIELDS.intersection(vals):
+            self.clear_caches()
+        return res
+
+    def unlink(self):
+        """
+        Clears the cached lookup of the states.
+        """
+        res = super(ResCountryState, self).unlink()
+        self.clear_caches()
+        return res
+
+    @api.model
+    @tools.ormcache("country_id", "self.env.lang")
+    def _get_state_lookup_ept(self, country_id):
+        """
+        Usage: Loads the names and codes of the states of a country in a dictionary. It is cached in the registry
+        until a state is changed.
+        :param country_id: Id of the country.
+        :return: Dictionary of lower case name or code and id of the state.
+        """
+        states = self.search_read([("country_id", "=", country_id)], ["name", "code"])
+        lookup = {}
+        for field_name in ["name", "code"]:
+            for state in states:
+                if state[field_name]:
+                    lookup.setdefault(state[field_name].strip().lower(), state["id"])
+        return lookup
+
+    @api.model
+    def get_state_by_name_or_code_ept(self, country, state_name_or_code):
+        """
+        Usage: Finds the state of the country by name or code, ignoring the case, from the cached lookup.
+        :param country: Record of the country.
+        :param state_name_or_code: State Name or State Code, Type: Char
+        :return: res.country.state()
+        """
+        if not country or not state_name_or_code or not isinstance(state_name_or_code, str):
+            return self
+        return self.browse(self._get_state_lookup_ept(country.id).get(state_name_or_code.strip().lower()))
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+from odoo import models, api, tools
+
+# Fields of the cached lookup. Writing other fields, like the rounding, keeps the registry cache.
+CURRENCY_LOOKUP_FIELDS = {"name", "active"}
+
+
+class ResCurrency(models.Model):
+    _inherit = "res.currency"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Clears the cached lookup of the currencies.
+        """
+        currencies = super(ResCurrency, self).create(vals_list)
+        self.clear_caches()
+        return currencies
+
+    def write(self, vals):
+        """
+        Clears the cached lookup of the currencies, when a field of the lookup is changed.
+        """
+        res = super(ResCurrency, self).write(vals)
+        if CURRENCY_LOOKUP_FIELDS.intersection(vals):
+            self.clear_caches()
+        return res
+
+    def unlink(self):
+        """
+        Clears the cached lookup of the currencies.
+        """
+        res = super(ResCurrency, self).unlink()
+        self.clear_caches()
+        return res
+
+    @api.model
+    @tools.ormcache()
+    def _get_currency_lookup_ept(self):
+        """
+        Usage: Loads the names of all currencies, active or not, in a dictionary. It is cached in the registry until
+        a currency is changed.
+        :return: Dictionary of upper case name and tuple of id and active of the currency.
+        """
+        currencies = self.with_context(active_test=False).search_read([], ["name", "active"])
+        return {currency["name"].upper(): (currency["id"], currency["active"]) for currency in currencies}
+
+    @api.model
+    def get_currency_by_name_ept(self, currency_name, include_inactive=False):
+        """
+        Usage: Finds the currency by its name (ISO code) from the cached lookup.
+        :param currency_name: Name of the currency, i.e. USD.
+        :param include_inactive: Returns the inactive currency too, if True.
+        :return: res.currency()
+        """
+        if not currency_name or not isinstance(currency_name, str):
+            return self
+        currency_id, active = self._get_currency_lookup_ept().get(currency_name.strip().upper(), (False, False))
+        if not active and not include_inactive:
+            return self
+        return self.browse(currency_id)
@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
 # Part of Odoo. See LICENSE file for full copyright and licensing details.
 
-import ast
+import time
+
 import requests
 from odoo import models, fields, api
 
+# States found by the postal code API per country and zip code, misses included, with the time they were found.
+_postal_code_api_cache = {}
+POSTAL_CODE_API_CACHE_SECONDS = 24 * 60 * 60
+POSTAL_CODE_API_CACHE_SIZE = 10000
+
 
 class ResPartner(models.Model):
     _inherit = "res.partner"
@@ -41,30 +47,55 @@ class ResPartner(models.Model):
             return partner
         return False
 
+    def init(self):
+        """
+        Creates the index of the case insensitive email searches.
+        """
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS res_partner_lower_email_index
+                            ON res_partner (lower(email)) WHERE email IS NOT NULL""")
+
     def search_partner_by_email(self, email):
         """
-        Usage : Search Partner by Email if not found then use =ilike operator for ignore case sensitive search
-        and set limit 1 because it may possible to find multiple emails due to =ilike operator
+        Usage : Search Partner by Email ignoring the case and set limit 1 because it may possible to find multiple
+        partners with the same email
         :param email: Email Id, Type: Char
         @Task : 166956 - Common connector changes
         @Updated By : Dipak Gogiya, 21/09/2020
         :return: res.partner()
         """
-        partner = self.search([('email', '=ilike', email)], limit=1)
-        return partner
+        if not email:
+            return self
+        return self.search_partners_by_emails_ept([email]).get(email.strip().lower(), self)
+
+    def search_partners_by_emails_ept(self, emails):
+        """
+        Usage : Search the partners of a page of emails ignoring the case. The emails are matched with one query on
+        the lower(email) index, then the partners are searched by id, so the active filter, the record rules and
+        the order of the partners are applied as in a normal search.
+        :param emails: List of emails.
+        :return: Dictionary of lower case email and the first partner found with it.
+        """
+        emails = list({email.strip().lower() for email in emails if email})
+        if not emails:
+            return {}
+        # The emails written in the transaction and not yet flushed are found by the query as well.
+        self.flush(['email'])
+        self._cr.execute("""SELECT id FROM res_partner WHERE lower(email) = ANY(%s)""", (emails,))
+        partner_ids = [row[0] for row in self._cr.fetchall()]
+        partners_by_email = {}
+        for partner in self.search([('id', 'in', partner_ids)]) if partner_ids else []:
+            partners_by_email.setdefault(partner.email.strip().lower(), partner)
+        return partners_by_email
 
     def get_country(self, country_name_or_code):
         """
-            Usage : Search Country by name or code if not found then use =ilike operator for ignore case sensitive
-            search and set limit 1 because it may possible to find multiple emails due to =ilike operator
+            Usage : Search Country by name or code, ignoring the case, from the cached lookup of the countries.
             :param country_name_or_code: Country Name or Country Code, Type: Char
             @Task : 166956 - Common connector changes
             @Updated By : Dipak Gogiya, 21/09/2020
             :return: res.country()
         """
-        country = self.env['res.country'].search(['|', ('code', '=ilike', country_name_or_code),
-                                                  ('name', '=ilike', country_name_or_code)], limit=1)
-        return country
+        return self.env['res.country'].get_country_by_name_or_code_ept(country_name_or_code)
 
     def create_or_update_state_ept(self, country_code, state_name_or_code, zip_code, country_obj=False):
         """
@@ -72,17 +103,38 @@ class ResPartner(models.Model):
         @last_updated_on : 4/10/2019
         Modified the below method to set state from the api of zippopotam.
         Migration done by twinkalc August 2020
+        The state of the zip code is found from the local postal prefixes, imported in Sales > Configuration >
+        Postal Code States. The zippopotam api is requested only when the system parameter
+        common_connector_library.use_postal_code_api is True, and its answers are kept per zip code for a day.
         """
         if not country_obj:
             country = self.get_country(country_code)
         else:
             country = country_obj
-        state = self.env['res.country.state'].search(['|', ('name', '=ilike', state_name_or_code),
-                                                      ('code', '=ilike', state_name_or_code),
-                                                      ('country_id', '=', country.id)], limit=1)
+        state = self.env['res.country.state'].get_state_by_name_or_code_ept(country, state_name_or_code)
 
         if not state and zip_code:
-            state = self.get_state_from_api(country_code, zip_code, country)
+            state = self.env['postal.code.state.ept'].resolve_state_ept(country, zip_code)
+            if not state and self.env['ir.config_parameter'].sudo().get_param(
+                    'common_connector_library.use_postal_code_api') == 'True':
+                state = self.get_cached_state_from_api(country_code, zip_code, country)
+        return state
+
+    def get_cached_state_from_api(self, country_code, zip_code, country):
+        """
+        Usage: Gives the state of the zip code from the postal code API, requesting each country and zip code once
+        a day per worker. Zip codes the API does not know are kept as well, so they are not requested again.
+        :return: Record of state or empty recordset.
+        """
+        key = ((country.code if country else country_code or '').upper(),
+               self.env['postal.code.state.ept'].normalize_postal_code_ept(zip_code))
+        cached = _postal_code_api_cache.get(key)
+        if cached and time.time() - cached[0] < POSTAL_CODE_API_CACHE_SECONDS:
+            return self.env['res.country.state'].browse(cached[1]).exists()
+        state = self.get_state_from_api(country_code, zip_code, country)
+        if len(_postal_code_api_cache) >= POSTAL_CODE_API_CACHE_SIZE:
+            _postal_code_api_cache.clear()
+        _postal_code_api_cache[key] = (time.time(), state.id)
         return state
 
     def get_state_from_api(self, country_code, zip_code, country):
@@ -98,8 +150,8 @@ class ResPartner(models.Model):
         country_obj = self.env['res.country']
         try:
             url = 'https://api.zippopotam.us/' + country_code + '/' + zip_code.split('-')[0]
-            response = requests.get(url)
-            response = ast.literal_eval(response.content.decode('utf-8'))
+            response = requests.get(url, timeout=5)
+            response = response.json()
         except:
             return state_obj
         if response:
@@ -120,14 +172,16 @@ class ResPartner(models.Model):
                                           'country_id': country.id})
         return state
 
-    @api.model
-    def create(self, vals):
+    @api.model_create_multi
+    def create(self, vals_list):
         """
         Inherited for calling onchange method.
         We got issue of not setting the gst_treatment field automatically of Indian accounting and same field is
         required and readonly in Sale order.
         @author: Maulik Barad on Date 17-Sep-2020.
+        The partners are created in batch and the onchange is called only for the partners with a country.
         """
-        partner = super(ResPartner, self).create(vals)
-        partner._onchange_country_id()
-        return partner
+        partners = super(ResPartner, self).create(vals_list)
+        for partner in partners.filtered(lambda x: x.country_id):
+            partner._onchange_country_id()
+        return partners
@@ -174,6 +174,78 @@ class SaleOrder(models.Model):
             order.validate_and_paid_invoices_ept(work_flow_process_record)
         return True
 
+    def process_orders_and_invoices_in_batch_ept(self):
+        """
+        This method does the same as process_orders_and_invoices_ept for many orders at once. The orders are grouped
+        by their workflow, then confirmed, invoiced, posted and paid as recordsets.
+        """
+        for work_flow_process_record in self.auto_workflow_process_id:
+            orders = self.filtered(lambda x: x.auto_workflow_process_id == work_flow_process_record and
+                                   x.invoice_status != 'invoiced')
+            if work_flow_process_record.validate_order:
+                orders.filtered(lambda x: x.state in ['draft', 'sent']).validate_orders_in_batch_ept()
+
+            invoice_orders = orders.filtered(lambda x: x.is_invoiceable_by_workflow_ept())
+            invoice_orders.validate_and_paid_invoices_in_batch_ept(work_flow_process_record)
+        return True
+
+    def is_invoiceable_by_workflow_ept(self):
+        """
+        The workflow invoices the order when its storable products are invoiced on order quantities, or when it has
+        only service and consumable products invoiced on order quantities.
+        """
+        self.ensure_one()
+        order_lines = self.order_line.filtered(lambda l: l.product_id.invoice_policy == 'order')
+        return bool(order_lines.filtered(lambda l: l.product_id.type == 'product')) or len(self.order_line) == len(
+            order_lines.filtered(lambda l: l.product_id.type in ['service', 'consu']))
+
+    def validate_orders_in_batch_ept(self):
+        """
+        This method confirms the orders at once and keeps their order dates, like validate_order_ept.
+        """
+        order_dates = {order.id: order.date_order for order in self}
+        self.action_confirm()
+        for order in self:
+            order.write({'date_order': order_dates[order.id]})
+        return True
+
+    def validate_and_paid_invoices_in_batch_ept(self, work_flow_process_record):
+        """
+        This method creates one invoice per order for all the orders, posts them at once and registers their
+        payments, according to the workflow.
+        :param work_flow_process_record: Workflow of all the orders.
+        """
+        if not self or not work_flow_process_record.create_invoice:
+            return True
+        orders = self
+        if work_flow_process_record.invoice_date_is_order_date:
+            locked_orders = orders.filtered(
+                lambda x: x.date_order.date() <= x.company_id._get_user_fiscal_lock_date())
+            for order in locked_orders:
+                # Logs the lock date message as the single order process does.
+                order.validate_and_paid_invoices_ept(work_flow_process_record)
+            orders -= locked_orders
+        if not orders:
+            return True
+
+        invoices = orders._create_invoices(grouped=True)
+        invoices.action_post()
+        if work_flow_process_record.register_payment:
+            orders.paid_invoices_in_batch_ept(invoices)
+        return True
+
+    def paid_invoices_in_batch_ept(self, invoices):
+        """
+        This method registers the payments of the invoices of the orders with the payment engine, once per workflow.
+        :param invoices: Recordset of invoices of the orders.
+        """
+        for work_flow_process_record in self.auto_workflow_process_id:
+            workflow_invoices = invoices.filtered(
+                lambda x: work_flow_process_record in
+                x.invoice_line_ids.sale_line_ids.order_id.auto_workflow_process_id)
+            workflow_invoices.paid_invoices_in_batch_ept(work_flow_process_record)
+        return True
+
     def validate_and_paid_invoices_ept(self, work_flow_process_record):
         """
         This method will create invoices, validate it and register payment it, according to the configuration in
@@ -227,14 +299,7 @@ class SaleOrder(models.Model):
         Migration done by twinkalc August 2020
         """
         self.ensure_one()
-        account_payment_obj = self.env['account.payment']
-        for invoice in invoices:
-            if invoice.amount_residual:
-                vals = invoice.prepare_payment_dict(self.auto_workflow_process_id)
-                if invoice.amount_residual:
-                    payment_id = account_payment_obj.create(vals)
-                    payment_id.action_post()
-                    self.reconcile_payment_ept(payment_id, invoice)
+        invoices.paid_invoices_in_batch_ept(self.auto_workflow_process_id)
         return True
 
     def reconcile_payment_ept(self, payment_id, invoice):
@@ -260,29 +325,52 @@ class SaleOrder(models.Model):
         :return: This method will generate stock move and done it, it will return boolean.
         Migration done by twinkalc August 2020
         """
-        order_lines = self.order_line.filtered(lambda l: l.product_id.type != 'service')
-        vendor_location = self.env['stock.location'].search(['|', ('company_id', '=', self.company_id.id),
-                                                             ('company_id', '=', False), ('usage', '=', 'supplier')],
-                                                            limit=1)
-        for order_line in order_lines:
-            bom_lines = []
-            if is_mrp_installed:
-                bom_lines = self.check_for_bom_product(order_line.product_id)
-            for bom_line in bom_lines:
-                self.create_and_done_stock_move_ept(order_line, customers_location, bom_line=bom_line)
-            if not bom_lines and order_line.product_id.is_drop_ship_product:
-                self.create_and_done_stock_move_ept(order_line, customers_location, vendor_location=vendor_location)
-            elif not bom_lines or not is_mrp_installed:
-                self.create_and_done_stock_move_ept(order_line, customers_location)
+        return self.auto_shipped_orders_in_batch_ept(customers_location, is_mrp_installed)
+
+    def auto_shipped_orders_in_batch_ept(self, customers_location, is_mrp_installed=False, bom_cache=None):
+        """
+        This method generates the stock moves of all the orders, creates them at once and validates them as one
+        recordset. The kits are exploded once per product and company.
+        :param customers_location: It is customer location object.
+        :param is_mrp_installed: It is a boolean for mrp installed or not.
+        :param bom_cache: Dictionary of exploded kits, shared between calls.
+        """
+        stock_location_obj = self.env['stock.location']
+        bom_cache = {} if bom_cache is None else bom_cache
+        vendor_locations = {}
+        move_vals = []
+        for order in self:
+            if order.company_id.id not in vendor_locations:
+                vendor_locations[order.company_id.id] = stock_location_obj.search(
+                    ['|', ('company_id', '=', order.company_id.id), ('company_id', '=', False),
+                     ('usage', '=', 'supplier')], limit=1)
+            vendor_location = vendor_locations[order.company_id.id]
+            for order_line in order.order_line.filtered(lambda l: l.product_id.type != 'service'):
+                bom_lines = []
+                if is_mrp_installed:
+                    bom_lines = order.check_for_bom_product(order_line.product_id, bom_cache)
+                for bom_line in bom_lines:
+                    move_vals.append(order.prepare_stock_move_vals_ept(order_line, customers_location,
+                                                                       bom_line=bom_line))
+                if not bom_lines and order_line.product_id.is_drop_ship_product:
+                    move_vals.append(order.prepare_stock_move_vals_ept(order_line, customers_location,
+                                                                       vendor_location=vendor_location))
+                elif not bom_lines or not is_mrp_installed:
+                    move_vals.append(order.prepare_stock_move_vals_ept(order_line, customers_location))
+        self.create_and_done_stock_moves_ept([vals for vals in move_vals if vals])
         return True
 
-    def check_for_bom_product(self, product):
+    def check_for_bom_product(self, product, bom_cache=None):
         """
         Find BOM for phantom type only if Bill of Material type is Make to Order then for shipment report there are
         no logic to create Manufacturer Order.
         Author: Twinkalc
         :param product: Record of Product.
+        :param bom_cache: Dictionary of exploded kits by product and company, to explode a kit only once.
         """
+        cache_key = (product.id, self.company_id.id)
+        if bom_cache is not None and cache_key in bom_cache:
+            return bom_cache[cache_key]
         try:
             bom_obj = self.env['mrp.bom']
             bom_point = bom_obj.sudo()._bom_find(product=product, company_id=self.company_id.id, bom_type='phantom')
@@ -290,9 +378,11 @@ class SaleOrder(models.Model):
             to_uom = bom_point.product_uom_id
             factor = from_uom._compute_quantity(1, to_uom) / bom_point.product_qty
             bom, lines = bom_point.explode(product, factor, picking_type=bom_point.picking_type_id)
-            return lines
         except:
-            return {}
+            lines = {}
+        if bom_cache is not None:
+            bom_cache[cache_key] = lines
+        return lines
 
     def create_and_done_stock_move_ept(self, order_line, customers_location, bom_line=False, vendor_location=False):
         """
@@ -303,6 +393,19 @@ class SaleOrder(models.Model):
         @param order_line: Record of sale order line.
         @param bom_line:
         """
+        vals = self.prepare_stock_move_vals_ept(order_line, customers_location, bom_line, vendor_location)
+        if vals:
+            self.create_and_done_stock_moves_ept([vals])
+        return True
+
+    def prepare_stock_move_vals_ept(self, order_line, customers_location, bom_line=False, vendor_location=False):
+        """
+        It prepares the values of the stock move as per the data in order line.
+        @param customers_location: Customer type location.
+        @param order_line: Record of sale order line.
+        @param bom_line: Exploded line of the kit.
+        @return: Dictionary of the values or empty dictionary, when there is nothing to move.
+        """
         if bom_line:
             product = bom_line[0].product_id
             product_qty = bom_line[1].get('qty', 0) * order_line.product_uom_qty
@@ -312,22 +415,33 @@ class SaleOrder(models.Model):
             product_qty = order_line.product_uom_qty
             product_uom = order_line.product_uom
 
-        if product and product_qty and product_uom:
-            vals = {
-                'name': _('Auto processed move : %s') %product.display_name,
-                'company_id': self.company_id.id,
-                'product_id': product.id if product else False,
-                'product_uom_qty': product_qty,
-                'product_uom': product_uom.id if product_uom else False,
-                'location_id': vendor_location.id if vendor_location else self.warehouse_id.lot_stock_id.id,
-                'location_dest_id': customers_location.id,
-                'state': 'confirmed',
-                'sale_line_id': order_line.id
-            }
-            if bom_line:
-                vals.update({'bom_line_id': bom_line[0].id})
-            stock_move = self.env['stock.move'].create(vals)
-            stock_move._action_assign()
-            stock_move._set_quantity_done(product_qty)
-            stock_move._action_done()
-        return True
+        if not (product and product_qty and product_uom):
+            return {}
+        vals = {
+            'name': _('Auto processed move : %s') % product.display_name,
+            'company_id': self.company_id.id,
+            'product_id': product.id,
+            'product_uom_qty': product_qty,
+            'product_uom': product_uom.id,
+            'location_id': vendor_location.id if vendor_location else self.warehouse_id.lot_stock_id.id,
+            'location_dest_id': customers_location.id,
+            'state': 'confirmed',
+            'sale_line_id': order_line.id
+        }
+        if bom_line:
+            vals.update({'bom_line_id': bom_line[0].id})
+        return vals
+
+    def create_and_done_stock_moves_ept(self, move_vals):
+        """
+        It creates the stock moves at once, reserves them and validates them as one recordset.
+        @param move_vals: List of values of the stock moves.
+        @return: Recordset of the stock moves.
+        """
+        stock_moves = self.env['stock.move'].create(move_vals)
+        if stock_moves:
+            stock_moves._action_assign()
+            for stock_move in stock_moves:
+                stock_move._set_quantity_done(stock_move.product_uom_qty)
+            stock_moves._action_done()
+        return stock_moves
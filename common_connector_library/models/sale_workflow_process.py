@@ -107,9 +107,8 @@ class SaleWorkflowProcess(models.Model):
 
         shipped_orders = orders.filtered(lambda x: x.order_line)
 
-        for order in shipped_orders:
-            order.state = 'sale'
-            order.auto_shipped_order_ept(customer_location, mrp_module)
+        shipped_orders.write({'state': 'sale'})
+        shipped_orders.auto_shipped_orders_in_batch_ept(customer_location, mrp_module)
 
-        shipped_orders.validate_and_paid_invoices_ept(self)
+        shipped_orders.validate_and_paid_invoices_in_batch_ept(self)
         return True
@@ -1,7 +1,7 @@
 {
     # App information
     'name': 'Shopify Odoo Connector',
-    'version': '14.0.4.0',
+    'version': '14.0.4.1',
     'category': 'Sales',
     'summary': 'Shopify Odoo Connector helps you in integrating and managing your Shopify store with Odoo by providing'
                ' the most useful features of Product and Order Synchronization.',
@@ -33,6 +33,7 @@
         'view/payment_gateway_view.xml',
         'wizard/queue_process_wizard_view.xml',
         'view/order_data_queue_ept.xml',
+        'view/order_backfill_ept.xml',
         'view/product_data_queue_view.xml',
         'view/customer_data_queue_ept.xml',
         'view/location_ept.xml',
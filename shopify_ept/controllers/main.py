@@ -82,11 +82,7 @@ class Main(http.Controller):
         _logger.info("UPDATE ORDER WEBHOOK call for order: %s", res.get("name"))
 
         fulfillment_status = res.get("fulfillment_status") or "unfulfilled"
-        if request.env["sale.order"].sudo().search_read([("shopify_instance_id", "=", instance.id),
-                                                         ("shopify_order_id", "=", res.get("id")),
-                                                         ("shopify_order_number", "=",
-                                                          res.get("order_number"))],
-                                                        ["id"]):
+        if request.env["sale.order"].sudo().shopify_existing_order_map(instance, [(res.get("id"), False)]):
             request.env["sale.order"].sudo().process_shopify_order_via_webhook(res, instance, True)
         elif fulfillment_status in ["fulfilled", "unfulfilled"]:
             res["fulfillment_status"] = fulfillment_status
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    """
+    Moves the data of the queue lines from the text columns into the compressed payloads.
+    """
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env["shopify.order.data.queue.line.ept"].migrate_queue_payload("order_data")
+    env["shopify.product.data.queue.line.ept"].migrate_queue_payload("synced_product_data")
+    env["shopify.customer.data.queue.line.ept"].migrate_queue_payload("shopify_synced_customer_data")
+    env["shopify.queue.payload.mixin.ept"].queue_payload_size_report()
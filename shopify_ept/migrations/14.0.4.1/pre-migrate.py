@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """
+    Sale orders are unique per instance and Shopify order id from this version. The oldest order of each
+    duplicated Shopify order keeps the id, and the id of the other orders gets the suffix "-duplicate-<order id>",
+    so the constraint can be created and the duplicates can still be found and merged manually.
+    """
+    cr.execute("""SELECT id, name FROM (
+                      SELECT id, name, row_number() OVER (PARTITION BY shopify_instance_id, shopify_order_id
+                                                          ORDER BY id) AS position
+                      FROM sale_order
+                      WHERE shopify_instance_id IS NOT NULL AND shopify_order_id IS NOT NULL) AS orders
+                  WHERE position > 1""")
+    duplicates = cr.fetchall()
+    if not duplicates:
+        return
+    cr.execute("""UPDATE sale_order SET shopify_order_id = shopify_order_id || '-duplicate-' || id
+                  WHERE id IN %s""", (tuple(duplicate[0] for duplicate in duplicates),))
+    _logger.warning("Renamed the Shopify order id of %s duplicated sale orders: %s", len(duplicates),
+                    ", ".join(duplicate[1] for duplicate in duplicates))
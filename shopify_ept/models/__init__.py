@@ -3,6 +3,7 @@
 
 from . import res_company
 from . import instance_ept
+from . import queue_payload_mixin_ept
 from . import shopify_template_ept
 from . import shopify_product_ept
 from . import common_product_image_ept
@@ -12,6 +13,8 @@ from . import common_log_book_ept
 from . import common_log_lines_ept
 from . import order_data_queue_ept
 from . import order_data_queue_line_ept
+from . import order_backfill_ept
+from . import stock_ledger_ept
 from . import customer_data_queue_ept
 from . import customer_data_queue_line_ept
 from . import res_partner
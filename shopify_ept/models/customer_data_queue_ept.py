@@ -6,7 +6,7 @@ from odoo import models, fields, api
 class ShopifyCustomerDataQueueEpt(models.Model):
     """ This model is used to handle the customer data queue."""
     _name = "shopify.customer.data.queue.ept"
-    _inherit = ["mail.thread", "mail.activity.mixin"]
+    _inherit = ["mail.thread", "mail.activity.mixin", "data.queue.state.mixin.ept"]
     _description = "Shopify Synced Customer Data"
 
     name = fields.Char(size=120, readonly=True)
@@ -31,6 +31,13 @@ class ShopifyCustomerDataQueueEpt(models.Model):
     is_action_require = fields.Boolean(default=False)
     queue_process_count = fields.Integer(help="It is used for know, how many time queue is processed.")
 
+    def init(self):
+        """
+        Creates the index of the queues by creation date, used to purge the old queues.
+        """
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS shopify_customer_data_queue_ept_create_date_index
+                            ON shopify_customer_data_queue_ept (create_date)""")
+
     @api.depends("synced_customer_queue_line_ids.state")
     def _compute_total_record_count(self):
         """
@@ -39,13 +46,15 @@ class ShopifyCustomerDataQueueEpt(models.Model):
         :author: Angel Patel @Emipro Technologies Pvt.Ltd on date 02/11/2019.
         :Task ID: 157065
         """
+        state_counts = self.get_queue_line_state_counts_ept("shopify.customer.data.queue.line.ept",
+                                                            "synced_customer_queue_id")
         for record in self:
-            queue_lines = record.synced_customer_queue_line_ids
-            record.total_record_count = len(queue_lines)
-            record.draft_state_count = len(queue_lines.filtered(lambda x: x.state == "draft"))
-            record.done_state_count = len(queue_lines.filtered(lambda x: x.state == "done"))
-            record.fail_state_count = len(queue_lines.filtered(lambda x: x.state == "failed"))
-            record.cancel_state_count = len(queue_lines.filtered(lambda x: x.state == "cancel"))
+            queue_counts = state_counts.get(record.id, {})
+            record.total_record_count = sum(queue_counts.values())
+            record.draft_state_count = queue_counts.get("draft", 0)
+            record.done_state_count = queue_counts.get("done", 0)
+            record.fail_state_count = queue_counts.get("failed", 0)
+            record.cancel_state_count = queue_counts.get("cancel", 0)
 
     @api.depends("synced_customer_queue_line_ids.state")
     def _compute_queue_state(self):
@@ -63,16 +72,17 @@ class ShopifyCustomerDataQueueEpt(models.Model):
             else:
                 record.state = "partially_completed"
 
-    @api.model
-    def create(self, vals):
+    @api.model_create_multi
+    def create(self, vals_list):
         """
         This method used to create a sequence of customer queue.
         @author: Angel Patel @Emipro Technologies Pvt. Ltd on date 25/10/2019.
         :Task ID: 157065
         """
-        seq = self.env["ir.sequence"].next_by_code("shopify.customer.data.queue.ept") or "/"
-        vals.update({"name": seq or ""})
-        return super(ShopifyCustomerDataQueueEpt, self).create(vals)
+        for vals in vals_list:
+            seq = self.env["ir.sequence"].next_by_code("shopify.customer.data.queue.ept") or "/"
+            vals.update({"name": seq or ""})
+        return super(ShopifyCustomerDataQueueEpt, self).create(vals_list)
 
     @api.model
     def create_customer_queue(self, instance, record_created_from):
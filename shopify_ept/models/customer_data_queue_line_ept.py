@@ -15,10 +15,15 @@ class ShopifyCustomerDataQueueLineEpt(models.Model):
     """This model is used to handel the customer data queue line"""
     _name = "shopify.customer.data.queue.line.ept"
     _description = "Shopify Synced Customer Data Line"
+    _inherit = "shopify.queue.payload.mixin.ept"
+    _queue_payload_fields = {"shopify_synced_customer_data": "shopify_synced_customer_data_payload"}
 
     state = fields.Selection([("draft", "Draft"), ("failed", "Failed"), ("done", "Done"),
                               ("cancel", "Cancelled")], default="draft")
-    shopify_synced_customer_data = fields.Char(string="Shopify Synced Data")
+    shopify_synced_customer_data = fields.Char(string="Shopify Synced Data", compute="_compute_queue_payload",
+                                               inverse="_inverse_queue_payload")
+    shopify_synced_customer_data_payload = fields.Binary(attachment=False, copy=False,
+                                                         help="Compressed data of the customer.")
     shopify_customer_data_id = fields.Text(string="Customer ID")
     synced_customer_queue_id = fields.Many2one("shopify.customer.data.queue.ept",
                                                string="Shopify Customer",
@@ -30,6 +35,16 @@ class ShopifyCustomerDataQueueLineEpt(models.Model):
                                            help="Log lines created against which line.")
     name = fields.Char(string="Customer", help="Shopify Customer Name")
 
+    def init(self):
+        """
+        Creates the indexes of the lines by queue and state, and the partial index of the lines to process.
+        """
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS shopify_customer_data_queue_line_ept_queue_pending_index
+                            ON shopify_customer_data_queue_line_ept (synced_customer_queue_id)
+                            WHERE state IN ('draft', 'failed')""")
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS shopify_customer_data_queue_line_ept_queue_state_index
+                            ON shopify_customer_data_queue_line_ept (synced_customer_queue_id, state)""")
+
     def shopify_create_multi_queue(self, customer_queue_id, customer_ids):
         """
         This method used to call child method for create a customer queue line.
@@ -39,9 +54,8 @@ class ShopifyCustomerDataQueueLineEpt(models.Model):
         :Task ID: 157065
         """
         if customer_queue_id:
-            for result in customer_ids:
-                result = result.to_dict()
-                self.shopify_customer_data_queue_line_create(result, customer_queue_id)
+            self.create([self.prepare_customer_data_queue_line_vals(result, customer_queue_id)
+                         for result in customer_ids])
         return True
 
     def shopify_customer_data_queue_line_create(self, result, customer_queue_id):
@@ -51,18 +65,29 @@ class ShopifyCustomerDataQueueLineEpt(models.Model):
         @author: Angel Patel @Emipro Technologies Pvt. Ltd on date 13/01/2020.
         """
         synced_shopify_customers_line_obj = self.env["shopify.customer.data.queue.line.ept"]
+        line_vals = self.prepare_customer_data_queue_line_vals(result, customer_queue_id)
+        return synced_shopify_customers_line_obj.create(line_vals)
+
+    def prepare_customer_data_queue_line_vals(self, result, customer_queue_id):
+        """
+        This method prepares the values of a customer queue line.
+        :param result: Response of 1 customer, as resource or dictionary.
+        :param customer_queue_id: Record of the customer queue.
+        @return: Values of the queue line.
+        """
+        if not isinstance(result, dict):
+            result = result.to_dict()
         name = "%s %s" % (result.get("first_name") or "", result.get("last_name") or "")
         customer_id = result.get("id")
         data = json.dumps(result)
-        line_vals = {
+        return {
             "synced_customer_queue_id": customer_queue_id.id,
             "shopify_customer_data_id": customer_id or "",
             "name": name.strip(),
             "shopify_synced_customer_data": data,
-            "shopify_instance_id": self.shopify_instance_id.id,
+            "shopify_instance_id": customer_queue_id.shopify_instance_id.id,
             "last_process_date": datetime.now(),
         }
-        return synced_shopify_customers_line_obj.create(line_vals)
 
     @api.model
     def sync_shopify_customer_into_odoo(self):
@@ -158,10 +183,36 @@ class ShopifyCustomerDataQueueLineEpt(models.Model):
         return True
 
     def customer_queue_commit_and_process(self, queue, instance, log_book_id):
+        """ This method is used to process the customer queue lines of the queue as one page. If the page fails,
+            the lines are processed one by one with a commit after 10 customer queue lines.
+            :param queue: Record of customer queue.
+            @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 17 October 2020 .
+        """
+        shopify_partner_obj = self.env["shopify.res.partner.ept"]
+        queue.is_process_queue = True
+        self._cr.commit()
+        start = time.time()
+        try:
+            with self._cr.savepoint():
+                customers = [(line, json.loads(line.shopify_synced_customer_data)) for line in self]
+                partner_by_line = shopify_partner_obj.shopify_import_customers_in_batch(customers, instance,
+                                                                                        log_book_id)
+                done_lines = self.browse([line.id for line in partner_by_line])
+                done_lines.write({"state": "done", "last_process_date": datetime.now()})
+                (self - done_lines).write({"state": "failed", "last_process_date": datetime.now()})
+        except Exception as error:
+            _logger.info("Customer queue %s could not be processed in batch, processing lines one by one: %s",
+                         queue.name, str(error))
+            self.customer_queue_process_line_by_line(queue, instance, log_book_id)
+        else:
+            _logger.info("Processed %s customers of queue %s in %s seconds.", len(self), queue.name,
+                         str(time.time() - start))
+        queue.is_process_queue = False
+
+    def customer_queue_process_line_by_line(self, queue, instance, log_book_id):
         """ This method is used to commit the customer queue line after 10 customer queue line process
             and call the child method to process the customer queue line.
             :param queue: Record of customer queue.
-            @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 17 October 2020 .
         """
         shopify_partner_obj = self.env["shopify.res.partner.ept"]
         commit_count = 0
@@ -3,6 +3,11 @@
 
 import json
 import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
 
 from calendar import monthrange
 from datetime import date, datetime, timedelta
@@ -19,6 +24,120 @@ _secondsConverter = {
     'minutes': lambda interval: interval * 60,
 }
 
+SHOPIFY_GRAPHQL_API_VERSION = "2024-01"
+
+_shopify_api_buckets = {}
+_shopify_api_buckets_lock = threading.Lock()
+
+
+class ShopifyApiBucket(object):
+    """
+    Leaky bucket of the Shopify REST Admin API, shared by all the threads requesting the same store.
+    Shopify allows 40 requests in the bucket, which leaks 2 requests per second.
+    """
+
+    def __init__(self, size=40, leak_rate=2.0):
+        self.size = size
+        self.leak_rate = leak_rate
+        self.level = 0.0
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _leak(self):
+        now = time.monotonic()
+        self.level = max(0.0, self.level - (now - self.updated_at) * self.leak_rate)
+        self.updated_at = now
+
+    def acquire(self):
+        """ Waits until one request can be made without exceeding the bucket. """
+        while True:
+            with self.lock:
+                self._leak()
+                if self.level + 1 <= self.size:
+                    self.level += 1
+                    return True
+                wait = (self.level + 1 - self.size) / self.leak_rate
+            time.sleep(wait)
+
+    def sync(self, used, size):
+        """ Corrects the level of the bucket with the call limit header of the last response. """
+        with self.lock:
+            self._leak()
+            self.size = size
+            self.level = max(self.level, float(used))
+
+    def sync_from_response(self, response):
+        """ Corrects the level of the bucket from the call limit header of a response, if it has one. """
+        call_limit = response and getattr(response, "headers", {}).get(shopify.Limits.CREDIT_LIMIT_HEADER_PARAM)
+        if call_limit and "/" in call_limit:
+            used, size = call_limit.split("/")
+            self.sync(int(used), int(size))
+
+
+class ShopifyBatchExecutor(object):
+    """
+    Processes records in savepoints and commits them in batches. A failing record is rolled back alone and the
+    transaction is committed when the batch size or the batch time is reached. The before_commit callable is
+    called before each commit, to save the state which must be committed with the batch.
+    """
+
+    def __init__(self, cr, name, batch_size=50, batch_seconds=60, before_commit=None):
+        self.cr = cr
+        self.name = name
+        self.before_commit = before_commit
+        self.batch_size = max(batch_size, 1)
+        self.batch_seconds = batch_seconds
+        self.pending = 0
+        self.failed = 0
+        self.processed = 0
+        self.started_at = self.batch_started_at = time.time()
+
+    @contextmanager
+    def process(self, on_failure=None):
+        """
+        Runs the body of the with statement in a savepoint. When it raises, the savepoint is rolled back and
+        on_failure is called with the error, which lets the caller mark the record as failed.
+        """
+        try:
+            with self.cr.savepoint():
+                yield
+        except Exception as error:
+            self.failed += 1
+            _logger.exception("%s: Record failed and rolled back.", self.name)
+            if on_failure:
+                on_failure(error)
+        self.step()
+
+    def step(self):
+        """ Counts one processed record and commits when the batch is full or its time is over. """
+        self.pending += 1
+        self.processed += 1
+        if self.pending >= self.batch_size or (
+                self.batch_seconds and time.time() - self.batch_started_at >= self.batch_seconds):
+            self.commit()
+        return True
+
+    def commit(self):
+        """ Commits the pending records and logs the throughput of the batch. """
+        if not self.pending:
+            return True
+        if self.before_commit:
+            self.before_commit()
+        self.cr.commit()
+        duration = time.time() - self.batch_started_at
+        _logger.info("%s: Committed %s records in %.2f seconds (%.2f records/second).", self.name, self.pending,
+                     duration, self.pending / duration if duration else self.pending)
+        self.pending = 0
+        self.batch_started_at = time.time()
+        return True
+
+    def finish(self):
+        """ Commits the last batch and logs the totals. """
+        self.commit()
+        _logger.info("%s: Processed %s records (%s failed) in %.2f seconds.", self.name, self.processed, self.failed,
+                     time.time() - self.started_at)
+        return True
+
 
 class ShopifyInstanceEpt(models.Model):
     _name = "shopify.instance.ept"
@@ -165,6 +284,32 @@ class ShopifyInstanceEpt(models.Model):
     shopify_stock_field = fields.Many2one('ir.model.fields', string='Stock Field')
     last_date_order_import = fields.Datetime(string="Last Date Of Unshipped Order Import",
                                              help="Last date of sync orders from Shopify to Odoo")
+    # Checkpoint of the auto import order cron, used to resume an interrupted import.
+    order_import_checkpoint_status = fields.Char(copy=False, help="Order status which pages were being imported when "
+                                                                  "the last import was interrupted.")
+    order_import_checkpoint_page_info = fields.Char(copy=False, help="Cursor of the next page of orders to import.")
+    order_import_checkpoint_updated_at = fields.Datetime(copy=False, help="Updated date of the last imported order.")
+    order_import_checkpoint_order_id = fields.Char(copy=False, help="Shopify id of the last imported order.")
+    order_import_checkpoint_to_date = fields.Datetime(copy=False, help="End date of the import window in progress.")
+    order_import_overlap_minutes = fields.Integer("Order Import Safety Margin (Minutes)", default=10,
+                                                  help="The next auto import of orders starts this many minutes "
+                                                       "before the end of the previous import window, to catch "
+                                                       "orders updated while it was running.")
+    batch_commit_size = fields.Integer("Commit Batch Size", default=50,
+                                       help="Number of records imported or exported before the transaction is "
+                                            "committed.")
+    batch_commit_seconds = fields.Integer("Commit Batch Time (Seconds)", default=60,
+                                          help="Processed records are committed after this time even if the batch "
+                                               "is not full. Set 0 to commit on the batch size only.")
+    stock_full_reconcile_days = fields.Integer("Full Stock Reconcile (Days)", default=7,
+                                               help="Stock export sends only the quantities changed since their last "
+                                                    "export. Every this many days all quantities are sent, to correct "
+                                                    "changes made in Shopify. Set 0 to always send all quantities.")
+    last_stock_full_reconcile_date = fields.Datetime("Last Full Stock Reconcile", copy=False)
+    stock_export_engine = fields.Selection([("rest", "REST (one request per item)"),
+                                            ("graphql", "GraphQL (250 items per request)")], default="rest",
+                                           help="GraphQL sends the quantities in bulk mutations. Stores where the "
+                                                "mutation is not available are exported by REST.")
     shopify_section_id = fields.Many2one('crm.team', 'Sales Team')
     is_use_default_sequence = fields.Boolean("Use Odoo Default Sequence?",
                                              help="If checked,Then use default sequence of odoo while create sale "
@@ -812,6 +957,101 @@ class ShopifyInstanceEpt(models.Model):
         shopify.ShopifyResource.set_site(shop_url)
         return True
 
+    def shopify_get_api_bucket(self):
+        """
+        This method gives the API bucket of the store, which is shared by all threads of this Odoo process.
+        """
+        with _shopify_api_buckets_lock:
+            if self.shopify_host not in _shopify_api_buckets:
+                _shopify_api_buckets[self.shopify_host] = ShopifyApiBucket()
+            return _shopify_api_buckets[self.shopify_host]
+
+    def shopify_wait_for_api_credit(self):
+        """
+        This method waits until the API bucket of the store allows one more request. It is used by processes which
+        request the store from multiple threads.
+        """
+        bucket = self.shopify_get_api_bucket()
+        self.shopify_sync_api_credit(bucket)
+        return bucket.acquire()
+
+    def shopify_sync_api_credit(self, bucket=False):
+        """
+        This method updates the API bucket of the store from the call limit header of the last response of the
+        current thread, so requests made without waiting for the bucket are counted as well.
+        """
+        bucket = bucket or self.shopify_get_api_bucket()
+        bucket.sync_from_response(shopify.ShopifyResource.connection.response)
+        return True
+
+    def shopify_batch_executor(self, name, before_commit=None):
+        """
+        This method gives the batch executor which commits the processed records with the batch settings of the
+        instance.
+        @param name: Name of the process, used in the log.
+        @param before_commit: Callable called before each commit of the executor.
+        """
+        return ShopifyBatchExecutor(self._cr, "%s (%s)" % (name, self.name), self.batch_commit_size or 50,
+                                    self.batch_commit_seconds, before_commit)
+
+    def shopify_check_index_usage(self):
+        """
+        This method explains the frequent searches of the connector and checks that each of them is planned on its
+        index. Sequential scans are disabled while explaining, so the check does not depend on the size of the
+        tables. It can be run from the shell after an upgrade.
+        @return: Dictionary of the searches with True when the index is used.
+        """
+        queries = [
+            ("Variant by id", "shopify_product_product_ept_instance_variant_index",
+             "SELECT id FROM shopify_product_product_ept WHERE shopify_instance_id = %s AND variant_id = '0'"),
+            ("Variant by inventory item", "shopify_product_product_ept_instance_inventory_item_index",
+             "SELECT id FROM shopify_product_product_ept WHERE shopify_instance_id = %s AND inventory_item_id = '0'"),
+            ("Variant by SKU", "shopify_product_product_ept_instance_default_code_index",
+             "SELECT id FROM shopify_product_product_ept WHERE shopify_instance_id = %s AND default_code = '0'"),
+            ("Template by id", "shopify_product_template_ept_instance_tmpl_index",
+             "SELECT id FROM shopify_product_template_ept WHERE shopify_instance_id = %s AND shopify_tmpl_id = '0'"),
+            ("Order by id", "sale_order_unique_shopify_order",
+             "SELECT id FROM sale_order WHERE shopify_instance_id = %s AND shopify_order_id = '0'"),
+            ("Order by reference", "sale_order_shopify_instance_client_order_ref_index",
+             "SELECT id FROM sale_order WHERE shopify_instance_id = %s AND client_order_ref = '0'"),
+            ("Customer by id", "shopify_res_partner_ept_instance_customer_index",
+             "SELECT id FROM shopify_res_partner_ept WHERE shopify_instance_id = %s AND shopify_customer_id = '0'"),
+            ("Location by id", "shopify_location_ept_instance_location_index",
+             "SELECT id FROM shopify_location_ept WHERE instance_id = %s AND shopify_location_id = '0'"),
+            ("Payout by reference", "shopify_payout_report_ept_instance_reference_index",
+             "SELECT id FROM shopify_payout_report_ept WHERE instance_id = %s AND payout_reference_id = '0'"),
+            ("Image by id", "shopify_product_image_ept_template_image_index",
+             "SELECT id FROM shopify_product_image_ept WHERE shopify_template_id = %s AND shopify_image_id = '0'"),
+            ("Order queue lines to process", "shopify_order_data_queue_line_ept_queue_pending_index",
+             "SELECT id FROM shopify_order_data_queue_line_ept WHERE shopify_order_data_queue_id = %s AND "
+             "state IN ('draft', 'failed')"),
+            # Same predicate and order as lease_order_queue_lines, without constants folding the filter away.
+            ("Order queue lines to lease", "shopify_order_data_queue_line_ept_draft_lease_index",
+             "SELECT queue_line.id FROM shopify_order_data_queue_line_ept AS queue_line "
+             "INNER JOIN shopify_order_data_queue_ept AS queue ON queue_line.shopify_order_data_queue_id = queue.id "
+             "WHERE queue_line.state = 'draft' AND queue.is_action_require = False "
+             "AND NOT queue_line.id = ANY('{}'::integer[]) "
+             "AND (queue_line.lease_expires_at IS NULL OR queue_line.lease_expires_at < (now() at time zone 'UTC')) "
+             "ORDER BY queue_line.create_date, queue_line.id LIMIT 50 FOR UPDATE OF queue_line SKIP LOCKED"),
+            ("Product queue lines to process", "shopify_product_data_queue_line_ept_queue_pending_index",
+             "SELECT id FROM shopify_product_data_queue_line_ept WHERE product_data_queue_id = %s AND "
+             "state IN ('draft', 'failed')"),
+            ("Customer queue lines to process", "shopify_customer_data_queue_line_ept_queue_pending_index",
+             "SELECT id FROM shopify_customer_data_queue_line_ept WHERE synced_customer_queue_id = %s AND "
+             "state IN ('draft', 'failed')"),
+        ]
+        result = {}
+        self._cr.execute("SAVEPOINT shopify_check_index_usage")
+        self._cr.execute("SET LOCAL enable_seqscan = off")
+        for name, index_name, query in queries:
+            self._cr.execute("EXPLAIN " + query, (self.id or 0,) if "%s" in query else None)
+            plan = "\n".join(row[0] for row in self._cr.fetchall())
+            result[name] = index_name in plan
+            if not result[name]:
+                _logger.warning("Search '%s' does not use index %s:\n%s", name, index_name, plan)
+        self._cr.execute("ROLLBACK TO SAVEPOINT shopify_check_index_usage")
+        return result
+
     def prepare_shopify_shop_url(self, host, api_key, password):
         """ This method is used to prepare a shop URL.
             @return shop_url
@@ -826,6 +1066,36 @@ class ShopifyInstanceEpt(models.Model):
 
         return shop_url
 
+    def prepare_shopify_graphql_url(self, api_version=SHOPIFY_GRAPHQL_API_VERSION):
+        """ This method is used to prepare the GraphQL Admin API URL of the store. """
+        host = self.shopify_host.split("//")[-1]
+        return "https://%s/admin/api/%s/graphql.json" % (host, api_version)
+
+    def shopify_graphql_request(self, query, variables=None, retries=3):
+        """
+        This method executes a GraphQL query or mutation on the store. When the query is throttled, it waits for
+        the cost to be restored as told by the throttle status and tries again.
+        @param query: GraphQL query or mutation.
+        @param variables: Dictionary of the variables of the query.
+        @return: Dictionary of the response, with data and errors.
+        """
+        headers = {"Content-Type": "application/json", "X-Shopify-Access-Token": self.shopify_password}
+        payload = json.dumps({"query": query, "variables": variables or {}})
+        for attempt in range(retries + 1):
+            response = requests.post(self.prepare_shopify_graphql_url(), data=payload, headers=headers, timeout=60)
+            response.raise_for_status()
+            result = response.json()
+            throttled = any(error.get("extensions", {}).get("code") == "THROTTLED"
+                            for error in result.get("errors") or [])
+            if not throttled or attempt == retries:
+                return result
+            throttle_status = result.get("extensions", {}).get("cost", {}).get("throttleStatus", {})
+            requested_cost = result.get("extensions", {}).get("cost", {}).get("requestedQueryCost", 0)
+            wait = (requested_cost - throttle_status.get("currentlyAvailable", 0)) / \
+                   (throttle_status.get("restoreRate") or 50.0)
+            time.sleep(max(wait, 1))
+        return result
+
     def toggle_active(self):
         """
         Method overridden for archiving the instance from the action menu.
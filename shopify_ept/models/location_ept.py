@@ -30,6 +30,17 @@ class ShopifyLocationEpt(models.Model):
                                           help="The warehouse to set while importing order, if this"
                                                " Shopify location is found.")
     active = fields.Boolean(default=True)
+    stock_reconcile_last_product_id = fields.Integer(readonly=True, copy=False,
+                                                     help="ID of the last Shopify product whose stock is committed in "
+                                                          "the current full reconcile. The interrupted reconcile "
+                                                          "resumes after it.")
+
+    def init(self):
+        """
+        Creates the index of the location searches of the instance.
+        """
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS shopify_location_ept_instance_location_index
+                            ON shopify_location_ept (instance_id, shopify_location_id)""")
 
     @api.constrains('export_stock_warehouse_ids')
     def _check_locations_warehouse_ids(self):
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+from .. import shopify
+
+_logger = logging.getLogger("Shopify Order Backfill")
+
+
+class ShopifyOrderBackfillEpt(models.Model):
+    _name = "shopify.order.backfill.ept"
+    _description = "Shopify Order Backfill"
+    _order = "id desc"
+
+    name = fields.Char(copy=False)
+    shopify_instance_id = fields.Many2one("shopify.instance.ept", string="Instance", required=True)
+    date_from = fields.Datetime("From Date", required=True)
+    date_to = fields.Datetime("To Date", required=True)
+    shard_size = fields.Integer(default=1000, help="Maximum number of orders imported by one shard. The date range "
+                                                   "is split until every shard has less orders than this.")
+    worker_count = fields.Integer("Workers", default=4, help="Number of shards imported at the same time. All "
+                                                              "workers share the API request limit of the store.")
+    state = fields.Selection([("draft", "Draft"), ("running", "Running"), ("paused", "Paused"),
+                              ("done", "Done")], default="draft", copy=False)
+    shard_ids = fields.One2many("shopify.order.backfill.shard.ept", "backfill_id", "Shards", copy=False)
+    shard_total_count = fields.Integer("Total Shards", compute="_compute_shard_count")
+    shard_done_count = fields.Integer("Done Shards", compute="_compute_shard_count")
+    shard_failed_count = fields.Integer("Failed Shards", compute="_compute_shard_count")
+    order_total_count = fields.Integer("Total Orders", compute="_compute_shard_count")
+    order_imported_count = fields.Integer("Imported Orders", compute="_compute_shard_count")
+
+    @api.depends("shard_ids.state", "shard_ids.order_count", "shard_ids.imported_count")
+    def _compute_shard_count(self):
+        """
+        Computes the progress of the backfill from its shards.
+        """
+        for backfill in self:
+            shards = backfill.shard_ids
+            backfill.shard_total_count = len(shards)
+            backfill.shard_done_count = len(shards.filtered(lambda x: x.state == "done"))
+            backfill.shard_failed_count = len(shards.filtered(lambda x: x.state == "failed"))
+            backfill.order_total_count = sum(shards.mapped("order_count"))
+            backfill.order_imported_count = sum(shards.mapped("imported_count"))
+
+    @api.model
+    def create(self, vals):
+        """
+        Sets the name of the backfill.
+        """
+        instance = self.env["shopify.instance.ept"].browse(vals.get("shopify_instance_id"))
+        vals.update({"name": "%s: %s - %s" % (instance.name, vals.get("date_from"), vals.get("date_to"))})
+        return super(ShopifyOrderBackfillEpt, self).create(vals)
+
+    def action_plan_shards(self):
+        """
+        This method splits the date range of the backfill into shards for each order status configured in the
+        instance. A range is split in two halves until the orders counted by Shopify in it fit in the shard size.
+        """
+        order_queue_obj = self.env["shopify.order.data.queue.ept"]
+        shard_obj = self.env["shopify.order.backfill.shard.ept"]
+        self.ensure_one()
+        if self.state != "draft":
+            raise UserError(_("Shards can be planned only for the backfill in draft state."))
+        if self.date_from >= self.date_to:
+            raise UserError(_("The start date must precede the end date."))
+
+        instance = self.shopify_instance_id
+        instance.connect_in_shopify()
+        self.shard_ids.unlink()
+        shard_vals = []
+        for order_status in instance.shopify_order_status_ids.mapped("status"):
+            ranges = [(self.date_from, self.date_to)]
+            while ranges:
+                date_from, date_to = ranges.pop()
+                from_date, to_date = order_queue_obj.convert_dates_by_timezone(instance, date_from, date_to)
+                instance.shopify_wait_for_api_credit()
+                order_count = shopify.Order.count(status="any", fulfillment_status=order_status,
+                                                  updated_at_min=from_date, updated_at_max=to_date)
+                if not order_count:
+                    continue
+                if order_count > self.shard_size and date_to - date_from > timedelta(minutes=1):
+                    middle_date = date_from + (date_to - date_from) / 2
+                    ranges += [(middle_date, date_to), (date_from, middle_date)]
+                    continue
+                shard_vals.append({"backfill_id": self.id, "order_status": order_status, "date_from": date_from,
+                                   "date_to": date_to, "order_count": order_count})
+        shard_obj.create(shard_vals)
+        _logger.info("Planned %s shards for order backfill %s.", len(shard_vals), self.name)
+        return True
+
+    def action_start(self):
+        """
+        Starts or resumes the backfill. The shards are imported by the backfill cron.
+        """
+        if not self.shard_ids:
+            self.action_plan_shards()
+        self.write({"state": "running"})
+        return True
+
+    def action_pause(self):
+        """
+        Pauses the backfill. Running shards stop after their current page and will continue from it on resume.
+        """
+        self.filtered(lambda x: x.state == "running").write({"state": "paused"})
+        return True
+
+    def action_retry_failed_shards(self):
+        """
+        Sets the failed shards to pending, so they are imported again from the page they failed on.
+        """
+        self.shard_ids.filtered(lambda x: x.state == "failed").write({"state": "pending", "message": False})
+        return True
+
+    @api.model
+    def process_order_backfill_cron(self):
+        """
+        This method is called by the cron to import the shards of the running backfills.
+        """
+        for backfill in self.search([("state", "=", "running")]):
+            backfill.run_backfill_workers()
+        return True
+
+    def run_backfill_workers(self):
+        """
+        This method imports the pending shards of the backfill with parallel workers. Each worker uses its own
+        cursor, claims one shard at a time and waits for the API bucket of the store before every request.
+        """
+        self.ensure_one()
+        # Shards of a previous run which was killed are imported again from their last page.
+        self.shard_ids.filtered(lambda x: x.state == "running").write({"state": "pending"})
+        self._cr.commit()
+
+        start = time.time()
+        worker_count = max(self.worker_count, 1)
+        with ThreadPoolExecutor(max_workers=worker_count) as executor:
+            workers = [executor.submit(self._run_backfill_worker, "worker-%s" % number)
+                       for number in range(worker_count)]
+            for worker in workers:
+                worker.result()
+
+        self.invalidate_cache()
+        if not self.shard_ids.filtered(lambda x: x.state in ["pending", "running", "failed"]):
+            self.write({"state": "done"})
+        _logger.info("Order backfill %s processed in %s seconds.", self.name, str(time.time() - start))
+        return True
+
+    def _run_backfill_worker(self, worker_name):
+        """
+        Imports shards of the backfill until none is left or the backfill is paused.
+        @param worker_name: Name of the worker saved in the shard it imports.
+        """
+        with api.Environment.manage(), self.pool.cursor() as new_cr:
+            backfill = self.with_env(self.env(cr=new_cr))
+            backfill.shopify_instance_id.connect_in_shopify()
+            while True:
+                shard = backfill.env["shopify.order.backfill.shard.ept"].claim_backfill_shard(backfill, worker_name)
+                if not shard:
+                    break
+                shard.import_backfill_shard()
+        return True
+
+
+class ShopifyOrderBackfillShardEpt(models.Model):
+    _name = "shopify.order.backfill.shard.ept"
+    _description = "Shopify Order Backfill Shard"
+    _order = "date_from, id"
+
+    backfill_id = fields.Many2one("shopify.order.backfill.ept", required=True, ondelete="cascade")
+    shopify_instance_id = fields.Many2one(related="backfill_id.shopify_instance_id", store=True)
+    order_status = fields.Char(required=True)
+    date_from = fields.Datetime("From Date", required=True)
+    date_to = fields.Datetime("To Date", required=True)
+    order_count = fields.Integer(help="Number of orders counted by Shopify, when the shard was planned.")
+    imported_count = fields.Integer(help="Number of orders processed by the shard.")
+    page_info = fields.Char(copy=False, help="Cursor of the next page to import.")
+    state = fields.Selection([("pending", "Pending"), ("running", "Running"), ("done", "Done"),
+                              ("failed", "Failed")], default="pending", copy=False)
+    worker = fields.Char(copy=False, help="Worker importing the shard.")
+    message = fields.Text(copy=False)
+
+    def claim_backfill_shard(self, backfill, worker_name):
+        """
+        This method locks one pending shard of the running backfill and assigns it to the worker. Shards locked by
+        other workers are skipped.
+        @return: Record of the shard or False.
+        """
+        self._cr.execute("""SELECT shard.id FROM shopify_order_backfill_shard_ept shard
+                            INNER JOIN shopify_order_backfill_ept backfill ON backfill.id = shard.backfill_id
+                            WHERE shard.backfill_id = %s AND shard.state = 'pending' AND backfill.state = 'running'
+                            ORDER BY shard.date_from, shard.id LIMIT 1
+                            FOR UPDATE OF shard SKIP LOCKED""", (backfill.id,))
+        result = self._cr.fetchone()
+        if not result:
+            return False
+        shard = self.browse(result[0])
+        shard.write({"state": "running", "worker": worker_name})
+        self._cr.commit()
+        return shard
+
+    def import_backfill_shard(self):
+        """
+        This method imports the orders of the shard page by page and commits after every page with the cursor of
+        the next page, so a paused or failed shard continues from there.
+        """
+        order_queue_obj = self.env["shopify.order.data.queue.ept"]
+        instance = self.shopify_instance_id
+        _logger.info("%s started shard %s of %s from %s to %s.", self.worker, self.order_status, instance.name,
+                     self.date_from, self.date_to)
+        try:
+            for orders, next_page_info in order_queue_obj.shopify_order_page_iterator(instance, self.date_from,
+                                                                                      self.date_to,
+                                                                                      self.order_status,
+                                                                                      self.page_info,
+                                                                                      wait_for_api_credit=True):
+                order_queue_obj.process_shopify_orders_directly(orders, instance)
+                self.write({"page_info": next_page_info, "imported_count": self.imported_count + len(orders)})
+                self._cr.commit()
+                self.backfill_id.invalidate_cache(["state"])
+                if self.backfill_id.state != "running":
+                    self.write({"state": "pending"})
+                    self._cr.commit()
+                    return False
+        except Exception as error:
+            self._cr.rollback()
+            _logger.exception("Shard %s of order backfill %s failed.", self.id, self.backfill_id.name)
+            self.write({"state": "failed", "message": str(error)})
+            self._cr.commit()
+            return False
+        self.write({"state": "done", "page_info": False})
+        self._cr.commit()
+        return True
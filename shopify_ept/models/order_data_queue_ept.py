@@ -6,6 +6,7 @@ import re
 import logging
 from datetime import datetime, timedelta
 import pytz
+from dateutil import parser
 from odoo import models, fields, api, _
 
 from odoo.exceptions import UserError
@@ -19,7 +20,7 @@ _logger = logging.getLogger("Shopify Order Queue")
 
 class ShopifyOrderDataQueueEpt(models.Model):
     _name = "shopify.order.data.queue.ept"
-    _inherit = ['mail.thread', 'mail.activity.mixin']
+    _inherit = ['mail.thread', 'mail.activity.mixin', 'data.queue.state.mixin.ept']
     _description = "Shopify Order Data Queue"
 
     name = fields.Char(help="Sequential name of imported order.", copy=False)
@@ -56,6 +57,13 @@ class ShopifyOrderDataQueueEpt(models.Model):
                                          help="it is used know queue how many time processed")
     is_action_require = fields.Boolean(default=False, help="it is used  to find the action require queue")
 
+    def init(self):
+        """
+        Creates the index of the queues by creation date, used to purge the old queues.
+        """
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS shopify_order_data_queue_ept_create_date_index
+                            ON shopify_order_data_queue_ept (create_date)""")
+
     @api.depends('order_data_queue_line_ids.state')
     def _compute_queue_state(self):
         """
@@ -79,34 +87,56 @@ class ShopifyOrderDataQueueEpt(models.Model):
             and display the count records in the form view order data queue.
             @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 2/11/2019.
         """
+        state_counts = self.get_queue_line_state_counts_ept("shopify.order.data.queue.line.ept",
+                                                            "shopify_order_data_queue_id")
         for order_queue in self:
-            queue_lines = order_queue.order_data_queue_line_ids
-            order_queue.order_queue_line_total_record = len(queue_lines)
-            order_queue.order_queue_line_draft_record = len(queue_lines.filtered(lambda x: x.state == "draft"))
-            order_queue.order_queue_line_done_record = len(queue_lines.filtered(lambda x: x.state == "done"))
-            order_queue.order_queue_line_fail_record = len(queue_lines.filtered(lambda x: x.state == "failed"))
-            order_queue.order_queue_line_cancel_record = len(queue_lines.filtered(lambda x: x.state == "cancel"))
+            queue_counts = state_counts.get(order_queue.id, {})
+            order_queue.order_queue_line_total_record = sum(queue_counts.values())
+            order_queue.order_queue_line_draft_record = queue_counts.get("draft", 0)
+            order_queue.order_queue_line_done_record = queue_counts.get("done", 0)
+            order_queue.order_queue_line_fail_record = queue_counts.get("failed", 0)
+            order_queue.order_queue_line_cancel_record = queue_counts.get("cancel", 0)
 
-    @api.model
-    def create(self, vals):
+    @api.model_create_multi
+    def create(self, vals_list):
         """This method used to create a sequence for Order Queue Data.
             @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 04/11/2019.
         """
         sequence_id = self.env.ref('shopify_ept.seq_order_queue_data').ids
-        if sequence_id:
-            record_name = self.env['ir.sequence'].browse(sequence_id).next_by_id()
-        else:
-            record_name = '/'
-        vals.update({'name': record_name or ''})
-        return super(ShopifyOrderDataQueueEpt, self).create(vals)
+        for vals in vals_list:
+            if sequence_id:
+                record_name = self.env['ir.sequence'].browse(sequence_id).next_by_id()
+            else:
+                record_name = '/'
+            vals.update({'name': record_name or ''})
+        return super(ShopifyOrderDataQueueEpt, self).create(vals_list)
+
+    @api.model
+    def reset_order_queue_process_flags(self):
+        """
+        This method resets the processing flag of queues which are not being processed anymore, i.e. none of their
+        lines is leased by a running worker.
+        """
+        self._cr.execute("""UPDATE shopify_order_data_queue_ept AS queue SET is_process_queue = False
+                            WHERE queue.is_process_queue = True AND NOT EXISTS (
+                                SELECT 1 FROM shopify_order_data_queue_line_ept AS queue_line
+                                WHERE queue_line.shopify_order_data_queue_id = queue.id
+                                    AND queue_line.lease_expires_at > (now() at time zone 'UTC'))""")
+        self._cr.commit()
+        return True
 
     def import_order_cron_action(self, ctx={}):
         """This method is used to import orders from the auto-import cron job.
+            If the previous run was interrupted, it resumes the same import window from the saved checkpoint.
         """
         instance_id = ctx.get('shopify_instance_id')
         instance = self.env['shopify.instance.ept'].browse(instance_id)
         from_date = instance.last_date_order_import
         to_date = datetime.now()
+        if instance.order_import_checkpoint_status and instance.order_import_checkpoint_to_date:
+            to_date = instance.order_import_checkpoint_to_date
+            _logger.info("Resuming order import of instance %s from order %s.", instance.name,
+                         instance.order_import_checkpoint_order_id)
         if not from_date:
             from_date = to_date - timedelta(3)
 
@@ -143,32 +173,135 @@ class ShopifyOrderDataQueueEpt(models.Model):
         """
         start = time.time()
         order_queues = []
-        total_order_ids = []
         instance.connect_in_shopify()
         if not order_type == "shipped":
-            for order_status_id in instance.shopify_order_status_ids:
-                order_status = order_status_id.status
-                order_ids = self.shopify_order_request(instance, from_date, to_date, order_status)
-                total_order_ids+= order_ids
-
-                if order_ids:
-                    if len(order_ids) >= 250:
-                        order_ids, order_queue_list = self.list_all_orders(order_ids, instance, created_by,
-                                                                           order_status)
-                        total_order_ids+= order_ids
+            is_checkpoint = created_by == "scheduled_action"
+            order_statuses = instance.shopify_order_status_ids.mapped("status")
+            if is_checkpoint and instance.order_import_checkpoint_status in order_statuses:
+                # Statuses before the checkpoint are already imported in the interrupted run.
+                order_statuses = order_statuses[order_statuses.index(instance.order_import_checkpoint_status):]
+            elif is_checkpoint:
+                self.shopify_write_order_import_checkpoint(instance, {
+                    "order_import_checkpoint_status": order_statuses and order_statuses[0] or False,
+                    "order_import_checkpoint_to_date": to_date})
+
+            for order_status in order_statuses:
+                page_info = False
+                status_from_date = from_date
+                if is_checkpoint and instance.order_import_checkpoint_status == order_status:
+                    page_info = instance.order_import_checkpoint_page_info
+                    if instance.order_import_checkpoint_updated_at:
+                        status_from_date = max(from_date, instance.order_import_checkpoint_updated_at - timedelta(
+                            minutes=instance.order_import_overlap_minutes))
+                for orders, next_page_info in self.shopify_order_page_iterator(instance, status_from_date, to_date,
+                                                                               order_status, page_info):
+                    self.process_shopify_orders_directly(orders, instance)
+                    if is_checkpoint:
+                        last_order = orders[-1].to_dict()
+                        self.shopify_write_order_import_checkpoint(instance, {
+                            "order_import_checkpoint_status": order_status,
+                            "order_import_checkpoint_page_info": next_page_info,
+                            "order_import_checkpoint_updated_at": self.shopify_convert_updated_at(last_order),
+                            "order_import_checkpoint_order_id": last_order.get("id")})
+
+            instance.write({"last_date_order_import": to_date - timedelta(
+                minutes=instance.order_import_overlap_minutes)})
+            if is_checkpoint:
+                self.shopify_write_order_import_checkpoint(instance, {"order_import_checkpoint_status": False,
+                                                                      "order_import_checkpoint_to_date": False})
         else:
             order_queues = self.shopify_shipped_order_request(instance, from_date, to_date, created_by="import",
                                                               order_type="shipped")
-
-        if order_type != "shipped" and total_order_ids:
-            self.process_shopify_orders_directly(total_order_ids, instance)
-            instance.last_date_order_import = to_date - timedelta(days=2)
-        else:
             instance.last_shipped_order_import_date = to_date - timedelta(days=2)
         end = time.time()
         _logger.info("Imported Orders in %s seconds.", str(end - start))
         return order_queues
 
+    def shopify_write_order_import_checkpoint(self, instance, vals):
+        """
+        This method saves the checkpoint of the auto import order process and commits it, so an interrupted import
+        can be resumed from the last processed page.
+        @param instance: Record of Shopify Instance.
+        @param vals: Values of the checkpoint fields to write.
+        """
+        if not vals.get("order_import_checkpoint_status", True):
+            vals.update({"order_import_checkpoint_page_info": False,
+                         "order_import_checkpoint_updated_at": False,
+                         "order_import_checkpoint_order_id": False})
+        instance.write(vals)
+        self._cr.commit()
+        return True
+
+    def shopify_convert_updated_at(self, order_data):
+        """
+        This method converts the updated date of the order response in UTC without timezone to store it in Odoo.
+        @param order_data: Dictionary of the order response.
+        """
+        if not order_data.get("updated_at"):
+            return False
+        return parser.parse(order_data.get("updated_at")).astimezone(utc).replace(tzinfo=None)
+
+    def shopify_order_page_iterator(self, instance, from_date, to_date, order_status, page_info=False,
+                                    wait_for_api_credit=False):
+        """
+        This method yields the orders page by page along with the cursor of the next page. When the cursor of a page
+        is given, it starts from that page or if the cursor is not accepted anymore, from the given dates.
+        @param order_status: Fulfillment status of the orders to import.
+        @param page_info: Cursor of the page to start from.
+        @param wait_for_api_credit: True when the requests must wait for the API bucket shared by other threads.
+        """
+        orders = False
+        if page_info:
+            try:
+                orders = self.shopify_order_page_request(page_info, instance, wait_for_api_credit)
+            except UserError as error:
+                _logger.info("Cursor of the order import is not valid anymore, the import restarts from the date "
+                             "%s. Error: %s", from_date, error)
+        if orders is False:
+            if wait_for_api_credit:
+                instance.shopify_wait_for_api_credit()
+            orders = self.shopify_order_request(instance, from_date, to_date, order_status)
+
+        while orders:
+            next_page_info = self.shopify_get_next_page_info()
+            yield orders, next_page_info
+            if not next_page_info:
+                break
+            orders = self.shopify_order_page_request(next_page_info, instance, wait_for_api_credit)
+
+    def shopify_get_next_page_info(self):
+        """
+        This method gives the cursor of the next page from the Link header of the last response.
+        """
+        link = shopify.ShopifyResource.connection.response.headers.get('Link')
+        if not link or not isinstance(link, str):
+            return False
+        for page_link in link.split(','):
+            if page_link.find('next') > 0:
+                return page_link.split(';')[0].strip('<>').split('page_info=')[1]
+        return False
+
+    def shopify_order_page_request(self, page_info, instance=False, wait_for_api_credit=False):
+        """
+        This method requests the page of orders for the given cursor and retries once, when the request limit of the
+        store is reached.
+        @param page_info: Cursor of the page.
+        """
+        if wait_for_api_credit:
+            instance.shopify_wait_for_api_credit()
+        try:
+            result = shopify.Order().find(limit=250, page_info=page_info)
+        except ClientError as error:
+            if hasattr(error, "response") and error.response.code == 429 and \
+                    error.response.msg == "Too Many Requests":
+                time.sleep(5)
+                result = shopify.Order().find(limit=250, page_info=page_info)
+            else:
+                raise UserError(error)
+        except Exception as error:
+            raise UserError(error)
+        return result
+
     def shopify_order_request(self, instance, from_date, to_date, order_type):
         """ This method used to pull the orders from shopify Store to Odoo.
             :param order_type: Which type of orders pull from Shopify to Odoo.
@@ -182,7 +315,8 @@ class ShopifyOrderDataQueueEpt(models.Model):
             order_ids = shopify.Order().find(status="any",
                                              fulfillment_status=order_type,
                                              updated_at_min=from_date,
-                                             updated_at_max=to_date, limit=250)
+                                             updated_at_max=to_date, limit=250,
+                                             order="updated_at asc")
         except Exception as error:
             raise UserError(error)
 
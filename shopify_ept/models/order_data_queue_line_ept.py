@@ -3,7 +3,9 @@
 import json
 import logging
 import time
+import uuid
 from odoo import models, fields
+from odoo.tools.misc import split_every
 
 _logger = logging.getLogger("Shopify Order Queue Line")
 
@@ -11,6 +13,8 @@ _logger = logging.getLogger("Shopify Order Queue Line")
 class ShopifyOrderDataQueueLineEpt(models.Model):
     _name = "shopify.order.data.queue.line.ept"
     _description = "Shopify Order Data Queue Line"
+    _inherit = "shopify.queue.payload.mixin.ept"
+    _queue_payload_fields = {"order_data": "order_data_payload"}
 
     shopify_order_data_queue_id = fields.Many2one("shopify.order.data.queue.ept",
                                                   ondelete="cascade")
@@ -21,7 +25,9 @@ class ShopifyOrderDataQueueLineEpt(models.Model):
     shopify_order_id = fields.Char(help="Id of imported order.", copy=False)
     sale_order_id = fields.Many2one("sale.order", copy=False,
                                     help="Order created in Odoo.")
-    order_data = fields.Text(help="Data imported from Shopify of current order.", copy=False)
+    order_data = fields.Text(help="Data imported from Shopify of current order.", copy=False,
+                             compute="_compute_queue_payload", inverse="_inverse_queue_payload")
+    order_data_payload = fields.Binary(attachment=False, copy=False, help="Compressed data of the order.")
 
     customer_name = fields.Text(help="Shopify Customer Name", copy=False)
 
@@ -33,6 +39,23 @@ class ShopifyOrderDataQueueLineEpt(models.Model):
                                                          "shopify_order_data_queue_line_id",
                                                          help="Log lines created against which line.")
     name = fields.Char(help="Order Name")
+    lease_owner = fields.Char(copy=False, help="Worker which has leased the line for processing.")
+    lease_expires_at = fields.Datetime(copy=False, help="Other workers can lease the line after this time, if it "
+                                                        "is not processed.")
+
+    def init(self):
+        """
+        Creates the indexes of the lines by queue and state, and the partial indexes of the lines to process by
+        queue and in the order they are leased.
+        """
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS shopify_order_data_queue_line_ept_queue_pending_index
+                            ON shopify_order_data_queue_line_ept (shopify_order_data_queue_id)
+                            WHERE state IN ('draft', 'failed')""")
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS shopify_order_data_queue_line_ept_queue_state_index
+                            ON shopify_order_data_queue_line_ept (shopify_order_data_queue_id, state)""")
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS shopify_order_data_queue_line_ept_draft_lease_index
+                            ON shopify_order_data_queue_line_ept (create_date, id)
+                            WHERE state = 'draft'""")
 
     def create_order_queue_line(self, order_dict, instance, order_data, customer_name, customer_email, order_queue_id):
         """
@@ -42,32 +65,45 @@ class ShopifyOrderDataQueueLineEpt(models.Model):
         :param order_queue_id: Record of order queue.
         @author: Maulik Barad on Date 10-Sep-2020.
         """
-        order_queue_line_vals = {"shopify_order_id": order_dict.get("id", False),
-                                 "shopify_instance_id": instance.id,
-                                 "order_data": order_data,
-                                 "name": order_dict.get("name", ""),
-                                 "customer_name": customer_name,
-                                 "customer_email": customer_email,
-                                 "shopify_order_data_queue_id": order_queue_id.id}
+        order_queue_line_vals = self.prepare_order_queue_line_vals(order_dict, instance, order_data, customer_name,
+                                                                   customer_email, order_queue_id)
         return self.create(order_queue_line_vals)
 
+    def prepare_order_queue_line_vals(self, order_dict, instance, order_data, customer_name, customer_email,
+                                      order_queue_id):
+        """
+        Prepares the values of the order data queue line from order data.
+        :param order_dict: The response of order in the dictionary.
+        :param order_data: The response of order in dump data.
+        :param order_queue_id: Record of order queue.
+        @return: Values of the queue line.
+        """
+        return {"shopify_order_id": order_dict.get("id", False),
+                "shopify_instance_id": instance.id,
+                "order_data": order_data,
+                "name": order_dict.get("name", ""),
+                "customer_name": customer_name,
+                "customer_email": customer_email,
+                "shopify_order_data_queue_id": order_queue_id.id}
+
     def create_order_data_queue_line(self, orders_data, instance, created_by="import"):
         """
         This method used to create order data queue lines. It creates new queue after 50 order queue lines.
+        Orders received by the webhook are added in the draft webhook queue, other pages are enqueued in bulk.
         @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 06/11/2019.
         Task Id : 157350
         """
+        if created_by != "webhook":
+            return self.shopify_bulk_create_order_queue_lines(orders_data, instance, created_by)
+
         count = 0
         need_to_create_queue = True
         orders_data.reverse()
         order_queue_list = []
 
         for order in orders_data:
-            if created_by == "webhook":
-                order_queue, need_to_create_queue = self.search_webhook_order_queue(created_by, instance, order,
-                                                                                    need_to_create_queue)
-            else:
-                order = order.to_dict()
+            order_queue, need_to_create_queue = self.search_webhook_order_queue(created_by, instance, order,
+                                                                                need_to_create_queue)
 
             if need_to_create_queue:
                 order_queue = self.shopify_create_order_queue(instance, created_by)
@@ -81,7 +117,7 @@ class ShopifyOrderDataQueueLineEpt(models.Model):
             data = json.dumps(order)
             customer_name, customer_email = self.get_customer_name_and_email(order)
             self.create_order_queue_line(order, instance, data, customer_name, customer_email, order_queue)
-            if created_by == "webhook" and len(order_queue.order_data_queue_line_ids) >= 50:
+            if len(order_queue.order_data_queue_line_ids) >= 50:
                 order_queue.order_data_queue_line_ids.process_import_order_queue_data(update_order=True)
 
             count += 1
@@ -94,6 +130,36 @@ class ShopifyOrderDataQueueLineEpt(models.Model):
 
         return order_queue_list
 
+    def shopify_bulk_create_order_queue_lines(self, orders_data, instance, created_by="import", queue_size=50):
+        """
+        This method enqueues a page of orders. All queues of the page are created with one create, then all their
+        lines with one create, and one notification is sent for the page.
+        :param orders_data: Orders as resources or dictionaries, in the order received from Shopify.
+        :param queue_size: Number of lines in one queue.
+        @return: List of ids of the created queues.
+        """
+        orders_data = [order if isinstance(order, dict) else order.to_dict() for order in reversed(orders_data)]
+        if not orders_data:
+            return []
+
+        order_chunks = list(split_every(queue_size, orders_data))
+        order_queues = self.env["shopify.order.data.queue.ept"].create(
+            [{"shopify_instance_id": instance.id, "created_by": created_by} for _chunk in order_chunks])
+        order_queue_line_vals = []
+        for order_queue, orders in zip(order_queues, order_chunks):
+            for order in orders:
+                customer_name, customer_email = self.get_customer_name_and_email(order)
+                order_queue_line_vals.append(self.prepare_order_queue_line_vals(order, instance, json.dumps(order),
+                                                                                customer_name, customer_email,
+                                                                                order_queue))
+        self.create(order_queue_line_vals)
+
+        message = "Order Queue %s created." % ", ".join(order_queues.mapped("name"))
+        self.generate_simple_notification(message)
+        self._cr.commit()
+        _logger.info(message)
+        return order_queues.ids
+
     def search_webhook_order_queue(self, created_by, instance, order, need_to_create_queue):
         """ This method is used to search the webhook order queue.
             @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 27 October 2020 .
@@ -151,44 +217,89 @@ class ShopifyOrderDataQueueLineEpt(models.Model):
 
         return self.env["shopify.order.data.queue.ept"].create(order_queue_vals)
 
-    def auto_import_order_queue_data(self):
+    def auto_import_order_queue_data(self, batch_size=50, lease_seconds=900):
         """
-        This method is used to find order queue which queue lines have state in draft and is_action_require is False.
+        This method is used to process draft order queue lines of queues which is_action_require is False.
+        The lines are leased in batches with SELECT ... FOR UPDATE SKIP LOCKED, so more than one cron (a copy of
+        the process order queue cron) can drain the queues at the same time without processing the same line twice.
         If cronjob has tried more than 3 times to process any queue then it marks that queue has need process
         to manually. It will be called from auto queue process cron.
         @author: Haresh Mori @Emipro Technologies Pvt.Ltd on date 07/10/2019.
         Task Id : 157350
+        :param batch_size: Number of queue lines leased at a time.
+        :param lease_seconds: Time after which a leased line, which is not processed, can be leased again.
         """
         shopify_order_queue_obj = self.env["shopify.order.data.queue.ept"]
-        order_queue_ids = []
+        lease_owner = uuid.uuid4().hex
+        start = time.time()
+        order_queue_process_cron_time = self.env["shopify.instance.ept"].get_shopify_cron_execution_time(
+            "shopify_ept.process_shopify_order_queue")
+        counted_queue_ids = []
+        handled_line_ids = []
+
+        shopify_order_queue_obj.reset_order_queue_process_flags()
+        while True:
+            # Lines left in draft by this run (i.e. skipped queues) are not leased again until the next run.
+            queue_lines = self.lease_order_queue_lines(lease_owner, batch_size, lease_seconds, handled_line_ids)
+            if not queue_lines:
+                return True
+
+            queues = queue_lines.shopify_order_data_queue_id
+            # The process count of a queue is increased only once per cron run.
+            self.filter_order_queue_lines_and_post_message(queues, queue_lines,
+                                                           count_queues=queues - shopify_order_queue_obj.browse(
+                                                               counted_queue_ids))
+            counted_queue_ids += queues.ids
+            handled_line_ids += queue_lines.ids
+            self.release_order_queue_lines(queue_lines)
+            if time.time() - start > order_queue_process_cron_time - 60:
+                return True
 
-        self.env.cr.execute(
-            """update shopify_order_data_queue_ept set is_process_queue = False where is_process_queue = True""")
+    def lease_order_queue_lines(self, lease_owner, batch_size=50, lease_seconds=900, exclude_line_ids=None):
+        """
+        This method leases a batch of draft queue lines for the worker. Lines locked or leased by other workers
+        are skipped.
+        :param lease_owner: Unique name of the worker.
+        :param exclude_line_ids: Ids of the lines already handled by the worker.
+        :return: Records of the leased queue lines.
+        """
+        self._cr.execute("""UPDATE shopify_order_data_queue_line_ept
+                            SET lease_owner = %s,
+                                lease_expires_at = (now() at time zone 'UTC') + %s * interval '1 second'
+                            WHERE id IN (
+                                SELECT queue_line.id FROM shopify_order_data_queue_line_ept AS queue_line
+                                INNER JOIN shopify_order_data_queue_ept AS queue
+                                    ON queue_line.shopify_order_data_queue_id = queue.id
+                                WHERE queue_line.state = 'draft' AND queue.is_action_require = False
+                                    AND NOT queue_line.id = ANY(%s)
+                                    AND (queue_line.lease_expires_at IS NULL OR
+                                         queue_line.lease_expires_at < (now() at time zone 'UTC'))
+                                ORDER BY queue_line.create_date, queue_line.id
+                                LIMIT %s
+                                FOR UPDATE OF queue_line SKIP LOCKED)
+                            RETURNING id""", (lease_owner, lease_seconds, exclude_line_ids or [], batch_size))
+        line_ids = [result[0] for result in self._cr.fetchall()]
         self._cr.commit()
+        return self.browse(line_ids)
 
-        query = """select queue.id
-                from shopify_order_data_queue_line_ept as queue_line
-                inner join shopify_order_data_queue_ept as queue on queue_line.shopify_order_data_queue_id = queue.id
-                where queue_line.state='draft' and queue.is_action_require = 'False'
-                ORDER BY queue_line.create_date ASC"""
-        self._cr.execute(query)
-        order_queue_list = self._cr.fetchall()
-        if not order_queue_list:
-            return True
-
-        for result in order_queue_list:
-            if result[0] not in order_queue_ids:
-                order_queue_ids.append(result[0])
-
-        queues = shopify_order_queue_obj.browse(order_queue_ids)
-        self.filter_order_queue_lines_and_post_message(queues)
+    def release_order_queue_lines(self, queue_lines):
+        """
+        This method releases the lease of the processed queue lines.
+        """
+        if queue_lines:
+            self._cr.execute("""UPDATE shopify_order_data_queue_line_ept SET lease_owner = NULL,
+                                lease_expires_at = NULL WHERE id in %s""", (tuple(queue_lines.ids),))
+            queue_lines.invalidate_cache(["lease_owner", "lease_expires_at"])
+            self._cr.commit()
         return True
 
-    def filter_order_queue_lines_and_post_message(self, queues):
+    def filter_order_queue_lines_and_post_message(self, queues, queue_lines=False, count_queues=False):
         """
         This method is used to post a message if the queue is process more than 3 times otherwise
         it calls the child method to process the order queue line.
         :param queues: Record of the order queues.
+        :param queue_lines: Leased queue lines to process, all draft lines of the queues are processed if not given.
+        :param count_queues: Queues which process count is increased, all queues if not given.
         @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 16 October 2020 .
         """
         ir_model_obj = self.env["ir.model"]
@@ -196,12 +307,19 @@ class ShopifyOrderDataQueueLineEpt(models.Model):
         start = time.time()
         order_queue_process_cron_time = queues.shopify_instance_id.get_shopify_cron_execution_time(
             "shopify_ept.process_shopify_order_queue")
+        if count_queues is False:
+            count_queues = queues
 
         for queue in queues:
-            order_data_queue_line_ids = queue.order_data_queue_line_ids.filtered(lambda x: x.state == "draft")
+            if queue_lines:
+                order_data_queue_line_ids = queue_lines.filtered(
+                    lambda x: x.shopify_order_data_queue_id == queue and x.state == "draft")
+            else:
+                order_data_queue_line_ids = queue.order_data_queue_line_ids.filtered(lambda x: x.state == "draft")
 
             # For counting the queue crashes and creating schedule activity for the queue.
-            queue.queue_process_count += 1
+            if queue in count_queues:
+                queue.queue_process_count += 1
             if queue.queue_process_count > 3:
                 queue.is_action_require = True
                 note = "<p>Need to process this order queue manually.There are 3 attempts been made by " \
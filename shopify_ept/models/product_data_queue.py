@@ -9,6 +9,7 @@ from datetime import datetime, timedelta
 
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
+from odoo.tools.misc import split_every
 from .. import shopify
 from ..shopify.pyactiveresource.connection import ClientError
 
@@ -17,7 +18,7 @@ _logger = logging.getLogger("Shopify Product Queue")
 
 class ShopifyProductDataQueue(models.Model):
     _name = "shopify.product.data.queue.ept"
-    _inherit = ["mail.thread", "mail.activity.mixin"]
+    _inherit = ["mail.thread", "mail.activity.mixin", "data.queue.state.mixin.ept"]
     _description = "Shopify Product Data Queue"
 
     name = fields.Char(size=120)
@@ -51,19 +52,28 @@ class ShopifyProductDataQueue(models.Model):
                                          help="it is used know queue how many time processed")
     skip_existing_product = fields.Boolean(string="Do Not Update Existing Products")
 
+    def init(self):
+        """
+        Creates the index of the queues by creation date, used to purge the old queues.
+        """
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS shopify_product_data_queue_ept_create_date_index
+                            ON shopify_product_data_queue_ept (create_date)""")
+
     @api.depends("product_data_queue_lines.state")
     def _compute_queue_line_record(self):
         """This is used for count of total record of product queue line base on it's state and
             it display in the form view of product queue.
             @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 2/11/2019.
         """
+        state_counts = self.get_queue_line_state_counts_ept("shopify.product.data.queue.line.ept",
+                                                            "product_data_queue_id")
         for product_queue in self:
-            queue_lines = product_queue.product_data_queue_lines
-            product_queue.queue_line_total_records = len(queue_lines)
-            product_queue.queue_line_draft_records = len(queue_lines.filtered(lambda x: x.state == "draft"))
-            product_queue.queue_line_fail_records = len(queue_lines.filtered(lambda x: x.state == "failed"))
-            product_queue.queue_line_done_records = len(queue_lines.filtered(lambda x: x.state == "done"))
-            product_queue.queue_line_cancel_records = len(queue_lines.filtered(lambda x: x.state == "cancel"))
+            queue_counts = state_counts.get(product_queue.id, {})
+            product_queue.queue_line_total_records = sum(queue_counts.values())
+            product_queue.queue_line_draft_records = queue_counts.get("draft", 0)
+            product_queue.queue_line_fail_records = queue_counts.get("failed", 0)
+            product_queue.queue_line_done_records = queue_counts.get("done", 0)
+            product_queue.queue_line_cancel_records = queue_counts.get("cancel", 0)
 
     @api.depends("product_data_queue_lines.state")
     def _compute_queue_state(self):
@@ -81,46 +91,51 @@ class ShopifyProductDataQueue(models.Model):
             else:
                 record.state = "partially_completed"
 
-    @api.model
-    def create(self, vals):
+    @api.model_create_multi
+    def create(self, vals_list):
         """This method used to create a sequence for product queue.
             @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 05/10/2019.
         """
         sequence_id = self.env.ref("shopify_ept.seq_product_queue_data").ids
-        if sequence_id:
-            record_name = self.env["ir.sequence"].browse(sequence_id).next_by_id()
-        else:
-            record_name = "/"
-        vals.update({"name": record_name or ""})
-        return super(ShopifyProductDataQueue, self).create(vals)
+        for vals in vals_list:
+            if sequence_id:
+                record_name = self.env["ir.sequence"].browse(sequence_id).next_by_id()
+            else:
+                record_name = "/"
+            vals.update({"name": record_name or ""})
+        return super(ShopifyProductDataQueue, self).create(vals_list)
 
     def create_product_queues(self, instance, results, skip_existing_product, template_ids=""):
         """
-        Creates product queues and adds queue lines in it.
+        Creates product queues and adds queue lines in it. All queues of the page and all their lines are created
+        with one create each, and one notification is sent for the page.
         @param instance: Shopify Instance.
         @param results: Response of Products from shopify.
         @param template_ids: List of ids of templates.
         @return: List of Product queues.
         @author: Maulik Barad on Date 28-Aug-2020.
         """
-        product_queue_list = []
-        order_data_queue_line = self.env['shopify.order.data.queue.line.ept']
-        count = 125
-        for result in results:
-            if count == 125:
-                product_queue = self.shopify_create_product_queue(instance, skip_existing_product=skip_existing_product)
-                product_queue_list.append(product_queue.id)
-                message = "Product Queue Created", product_queue.name
-                order_data_queue_line.generate_simple_notification(message)
-                self._cr.commit()
-                _logger.info(message)
-                count = 0
-                if template_ids:
-                    product_queue.message_post(body=_('%s products are not imported') % ','.join(template_ids))
-            self.shopify_create_product_data_queue_line(result, instance, product_queue)
-            count = count + 1
+        product_data_queue_line_obj = self.env["shopify.product.data.queue.line.ept"]
+        results = [result if isinstance(result, dict) else result.to_dict() for result in results]
+        if not results:
+            return []
+
+        result_chunks = list(split_every(125, results))
+        product_queues = self.create([{"shopify_instance_id": instance.id, "created_by": "import",
+                                       "skip_existing_product": skip_existing_product} for _chunk in result_chunks])
+        product_queue_line_vals = []
+        for product_queue, chunk in zip(product_queues, result_chunks):
+            if template_ids:
+                product_queue.message_post(body=_('%s products are not imported') % ','.join(template_ids))
+            product_queue_line_vals += [self.prepare_product_data_queue_line_vals(result, instance, product_queue)
+                                        for result in chunk]
+        product_data_queue_line_obj.create(product_queue_line_vals)
+
+        message = "Product Queue Created %s" % ", ".join(product_queues.mapped("name"))
+        self.env["shopify.order.data.queue.line.ept"].generate_simple_notification(message)
         self._cr.commit()
-        return product_queue_list
+        _logger.info(message)
+        return product_queues.ids
 
     def shopify_create_product_data_queue(self, instance, skip_existing_product=False, template_ids=""):
         """
@@ -237,7 +252,18 @@ class ShopifyProductDataQueue(models.Model):
         @author: Maulik Barad on Date 01-Sep-2020.
         """
         product_data_queue_line_obj = self.env["shopify.product.data.queue.line.ept"]
+        product_data_queue_line_obj.create(self.prepare_product_data_queue_line_vals(result, instance,
+                                                                                    product_data_queue))
+        return True
 
+    def prepare_product_data_queue_line_vals(self, result, instance, product_data_queue):
+        """
+        This method prepares the values of a product data queue line.
+        @param result: Response of a product from shopify.
+        @param instance: Shopify Instance.
+        @param product_data_queue: Product data queue to attach the queue line with.
+        @return: Values of the queue line.
+        """
         # No need to convert the response into dictionary, when response is coming from webhook.
         if not isinstance(result, dict):
             result = result.to_dict()
@@ -245,15 +271,13 @@ class ShopifyProductDataQueue(models.Model):
         image_import_state = 'done'
         if instance.sync_product_with_images:
             image_import_state = 'pending'
-        product_queue_line_vals = {"product_data_id": result.get("id"),
-                                   "shopify_instance_id": instance and instance.id or False,
-                                   "name": result.get("title"),
-                                   "synced_product_data": data,
-                                   "product_data_queue_id": product_data_queue and product_data_queue.id or False,
-                                   "shopify_image_import_state":image_import_state,
-                                   }
-        product_data_queue_line_obj.create(product_queue_line_vals)
-        return True
+        return {"product_data_id": result.get("id"),
+                "shopify_instance_id": instance and instance.id or False,
+                "name": result.get("title"),
+                "synced_product_data": data,
+                "product_data_queue_id": product_data_queue and product_data_queue.id or False,
+                "shopify_image_import_state": image_import_state,
+                }
 
     def create_schedule_activity_for_product(self, queue_line, from_sale=False):
         """
@@ -14,10 +14,13 @@ _logger = logging.getLogger("Shopify Product Queue Line")
 class ShopifyProductDataQueueLineEpt(models.Model):
     _name = "shopify.product.data.queue.line.ept"
     _description = "Shopify Product Data Queue Line"
+    _inherit = "shopify.queue.payload.mixin.ept"
+    _queue_payload_fields = {"synced_product_data": "synced_product_data_payload"}
 
     shopify_instance_id = fields.Many2one("shopify.instance.ept", string="Instance")
     last_process_date = fields.Datetime()
-    synced_product_data = fields.Text()
+    synced_product_data = fields.Text(compute="_compute_queue_payload", inverse="_inverse_queue_payload")
+    synced_product_data_payload = fields.Binary(attachment=False, copy=False, help="Compressed data of the product.")
     product_data_id = fields.Char()
     state = fields.Selection([("draft", "Draft"), ("failed", "Failed"), ("done", "Done"),
                               ("cancel", "Cancelled")],
@@ -31,6 +34,16 @@ class ShopifyProductDataQueueLineEpt(models.Model):
     shopify_image_import_state = fields.Selection([('pending', 'Pending'), ('done', 'Done')], default='done',
                                                   help="It used to identify that product image imported explicitly")
 
+    def init(self):
+        """
+        Creates the indexes of the lines by queue and state, and the partial index of the lines to process.
+        """
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS shopify_product_data_queue_line_ept_queue_pending_index
+                            ON shopify_product_data_queue_line_ept (product_data_queue_id)
+                            WHERE state IN ('draft', 'failed')""")
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS shopify_product_data_queue_line_ept_queue_state_index
+                            ON shopify_product_data_queue_line_ept (product_data_queue_id, state)""")
+
     def auto_import_product_queue_line_data(self):
         """
         This method is used to find product queue which queue lines have state in draft and is_action_require is False.
@@ -118,18 +131,17 @@ class ShopifyProductDataQueueLineEpt(models.Model):
             self.env.cr.execute(
                 """update shopify_product_data_queue_ept set is_process_queue = False where is_process_queue = True""")
             self._cr.commit()
-            commit_count = 0
+            executor = shopify_instance.shopify_batch_executor("Import Shopify Products")
+            queue_id.is_process_queue = True
             for product_queue_line in self:
-                commit_count += 1
-                if commit_count == 10:
-                    queue_id.is_process_queue = True
-                    self._cr.commit()
-                    commit_count = 0
-                shopify_product_template_obj.shopify_sync_products(product_queue_line,
-                                                                   False,
-                                                                   shopify_instance,
-                                                                   log_book_id)
-                queue_id.is_process_queue = False
+                with executor.process(on_failure=lambda error, line=product_queue_line: line.write(
+                        {"state": "failed"})):
+                    shopify_product_template_obj.shopify_sync_products(product_queue_line,
+                                                                       False,
+                                                                       shopify_instance,
+                                                                       log_book_id)
+            queue_id.is_process_queue = False
+            executor.finish()
             queue_id.common_log_book_id = log_book_id
             if queue_id.common_log_book_id and not queue_id.common_log_book_id.log_lines:
                 queue_id.common_log_book_id.unlink()
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+
+import base64
+import logging
+import zlib
+
+import psycopg2
+
+from odoo import models, api
+
+_logger = logging.getLogger("Shopify Queue Payload")
+
+
+class ShopifyQueuePayloadMixinEpt(models.AbstractModel):
+    """
+    Mixin for the queue lines, which stores the data received from Shopify compressed in a binary column. The binary
+    column is not prefetched, so the data is loaded only when a line reads it while processing.
+    """
+    _name = "shopify.queue.payload.mixin.ept"
+    _description = "Shopify Queue Payload Mixin"
+
+    # Field with the data of the line and the binary field storing it compressed.
+    _queue_payload_fields = {}
+
+    @api.model
+    def compress_queue_payload(self, data):
+        """
+        Compresses the data of the line for the binary field.
+        @param data: Data of the line as text.
+        """
+        if not data:
+            return False
+        return base64.b64encode(zlib.compress(data.encode("utf-8")))
+
+    @api.model
+    def decompress_queue_payload(self, payload):
+        """
+        Gives the data of the line from the value of the binary field.
+        """
+        if not payload:
+            return False
+        return zlib.decompress(base64.b64decode(payload)).decode("utf-8")
+
+    def _prepare_queue_payload_vals(self, vals):
+        """
+        Replaces the data of the line in the values by its compressed payload, so the payload is written with the
+        record instead of by the inverse afterwards.
+        @param vals: Values of create or write.
+        @return: Values with the payload.
+        """
+        vals = dict(vals)
+        for field_name, payload_field_name in self._queue_payload_fields.items():
+            if field_name in vals:
+                vals[payload_field_name] = self.compress_queue_payload(vals.pop(field_name))
+        return vals
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Inserts the lines with their compressed payload.
+        """
+        vals_list = [self._prepare_queue_payload_vals(vals) for vals in vals_list]
+        return super(ShopifyQueuePayloadMixinEpt, self).create(vals_list)
+
+    def write(self, vals):
+        """
+        Writes the compressed payload of the lines with the other values.
+        """
+        return super(ShopifyQueuePayloadMixinEpt, self).write(self._prepare_queue_payload_vals(vals))
+
+    @api.depends(lambda self: list(self._queue_payload_fields.values()))
+    def _compute_queue_payload(self):
+        """
+        Gives the data of the lines from their compressed payload.
+        """
+        for line in self:
+            for field_name, payload_field_name in self._queue_payload_fields.items():
+                line[field_name] = self.decompress_queue_payload(line[payload_field_name])
+
+    def _inverse_queue_payload(self):
+        """
+        Stores the data of the lines compressed, when the data field is assigned on the records.
+        """
+        for line in self:
+            for field_name, payload_field_name in self._queue_payload_fields.items():
+                line[payload_field_name] = self.compress_queue_payload(line[field_name])
+
+    @api.model
+    def migrate_queue_payload(self, column_name, batch_size=1000):
+        """
+        Moves the data of an old text column into the compressed payload, in batches updated with one query each.
+        The column is dropped only when the payload of every line having data in it is stored. It is called from
+        the migration of the module.
+        @param column_name: Name of the old column of the data.
+        """
+        payload_field_name = self._queue_payload_fields[column_name]
+        self._cr.execute("""SELECT 1 FROM information_schema.columns WHERE table_name = %s AND column_name = %s""",
+                         (self._table, column_name))
+        if not self._cr.fetchone():
+            return True
+        last_id = 0
+        while True:
+            self._cr.execute("""SELECT id, "%s" FROM "%s" WHERE id > %%s AND "%s" IS NOT NULL AND "%s" IS NULL
+                                ORDER BY id LIMIT %%s""" % (column_name, self._table, column_name,
+                                                            payload_field_name), (last_id, batch_size))
+            rows = self._cr.fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            rows = [(line_id, self.compress_queue_payload(data)) for line_id, data in rows]
+            rows = [(line_id, payload) for line_id, payload in rows if payload]
+            if rows:
+                self._cr.execute("""UPDATE "%s" AS line SET "%s" = data.payload
+                                    FROM unnest(%%s, %%s) AS data(id, payload) WHERE line.id = data.id""" % (
+                                        self._table, payload_field_name),
+                                 ([row[0] for row in rows], [psycopg2.Binary(row[1]) for row in rows]))
+            _logger.info("Compressed the %s of %s lines of %s.", column_name, len(rows), self._table)
+
+        self._cr.execute("""SELECT count(*) FROM "%s" WHERE "%s" IS NOT NULL AND "%s" <> '' AND "%s" IS NULL""" % (
+            self._table, column_name, column_name, payload_field_name))
+        missing_count = self._cr.fetchone()[0]
+        if missing_count:
+            _logger.error("The %s of %s lines of %s is not compressed, the column is kept.", column_name,
+                          missing_count, self._table)
+            return False
+        self._cr.execute("""ALTER TABLE "%s" DROP COLUMN "%s" """ % (self._table, column_name))
+        return True
+
+    @api.model
+    def queue_payload_size_report(self):
+        """
+        Gives the size of the queue line tables and of the stored payloads of the lines.
+        @return: List of dictionaries with table, lines, table size and payload size in bytes.
+        """
+        report = []
+        for model_name in ["shopify.order.data.queue.line.ept", "shopify.product.data.queue.line.ept",
+                           "shopify.customer.data.queue.line.ept"]:
+            model = self.env[model_name]
+            payload_columns = " + ".join('COALESCE(octet_length("%s"), 0)' % payload_field_name
+                                         for payload_field_name in model._queue_payload_fields.values())
+            self._cr.execute("""SELECT count(*), COALESCE(sum(%s), 0), pg_total_relation_size('%s')
+                                FROM "%s" """ % (payload_columns, model._table, model._table))
+            line_count, payload_size, table_size = self._cr.fetchone()
+            report.append({"table": model._table, "lines": line_count, "table_size": table_size,
+                           "payload_size": payload_size})
+            _logger.info("%s: %s lines, %s bytes in table, %s bytes of payload.", model._table, line_count,
+                         table_size, payload_size)
+        return report
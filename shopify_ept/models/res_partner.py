@@ -1,16 +1,162 @@
 # -*- coding: utf-8 -*-
 # See LICENSE file for full copyright and licensing details.
 
+import hashlib
 import logging
 from odoo import models, fields, api
 
 _logger = logging.getLogger("Shopify Partner")
 
+# The fingerprint covers the fields every matched address has. The optional fields are compared afterwards, only
+# when the incoming address has them, like _find_partner_ept skips the empty values.
+ADDRESS_FINGERPRINT_FIELDS = ["name", "street", "city", "zip", "country_id"]
+ADDRESS_OPTIONAL_FIELDS = ["street2", "phone", "state_id", "company_name"]
+
+
 class ResPartner(models.Model):
     _inherit = "res.partner"
 
     is_shopify_customer = fields.Boolean(string="Is Shopify Customer?", default=False,
                                          help="Used for identified that the customer is imported from Shopify store.")
+    shopify_address_fingerprint = fields.Char(index=True, copy=False,
+                                              help="Hash of the normalized address, used to find the existing address "
+                                                   "of a Shopify customer.")
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        """
+        Sets the address fingerprint of the created partners.
+        """
+        partners = super(ResPartner, self).create(vals_list)
+        partners.shopify_update_address_fingerprint()
+        return partners
+
+    def write(self, vals):
+        """
+        Updates the address fingerprint, when an address field is changed.
+        """
+        res = super(ResPartner, self).write(vals)
+        if set(vals).intersection(ADDRESS_FINGERPRINT_FIELDS):
+            self.shopify_update_address_fingerprint()
+        return res
+
+    @api.model
+    def shopify_address_fingerprint_ept(self, vals):
+        """
+        Builds the fingerprint of an address from the normalized values of the address fields. Text is compared
+        ignoring case and surrounding spaces, the same way as the =ilike search of the address.
+        :param vals: Dictionary of the address values, relational fields as ids.
+        @return: Hexadecimal hash of the address.
+        """
+        values = []
+        for field_name in ADDRESS_FINGERPRINT_FIELDS:
+            value = vals.get(field_name)
+            if isinstance(value, models.BaseModel):
+                value = value.id
+            values.append(str(value or "").strip().lower())
+        return hashlib.md5("\x1f".join(values).encode("utf-8")).hexdigest()
+
+    @api.model
+    def shopify_can_use_address_fingerprint(self, vals, address_key_list):
+        """
+        The fingerprint can find an address only when all its fields are compared and have a value, as empty
+        values are not compared by the address search.
+        """
+        return all(field_name in address_key_list and vals.get(field_name)
+                   for field_name in ADDRESS_FINGERPRINT_FIELDS)
+
+    @api.model
+    def shopify_is_same_address_ept(self, existing_vals, vals, address_key_list):
+        """
+        Compares the optional address fields having a value in the incoming address, ignoring case and surrounding
+        spaces.
+        :param existing_vals: Values of the existing address, relational fields as ids.
+        :param vals: Values of the incoming address.
+        @return: True or False.
+        """
+        for field_name in ADDRESS_OPTIONAL_FIELDS:
+            value = vals.get(field_name)
+            if field_name not in address_key_list or not value:
+                continue
+            existing_value = existing_vals.get(field_name)
+            if isinstance(value, models.BaseModel):
+                value = value.id
+            if isinstance(existing_value, models.BaseModel):
+                existing_value = existing_value.id
+            if str(value).strip().lower() != str(existing_value or "").strip().lower():
+                return False
+        return True
+
+    def shopify_update_address_fingerprint(self):
+        """
+        Stores the address fingerprint of the partners with one UPDATE. It is written with SQL, so no write or
+        recompute is triggered on the partners.
+        """
+        partner_ids = []
+        fingerprints = []
+        for partner_vals in self.read(ADDRESS_FINGERPRINT_FIELDS, load=False):
+            partner_ids.append(partner_vals["id"])
+            fingerprints.append(self.shopify_address_fingerprint_ept(partner_vals))
+        if partner_ids:
+            self._cr.execute("""UPDATE res_partner SET shopify_address_fingerprint = data.fingerprint
+                                FROM unnest(%s, %s) AS data(id, fingerprint) WHERE res_partner.id = data.id""",
+                             (partner_ids, fingerprints))
+            self.invalidate_cache(["shopify_address_fingerprint"], partner_ids)
+        return True
+
+    @api.model
+    def shopify_backfill_address_fingerprint(self, chunk_size=5000, max_chunks=20):
+        """
+        This method is called by the cron to set the fingerprint of the partners created before it existed. The
+        partners are processed in chunks ordered by id, with a commit after every chunk. When no partner is left,
+        the address search uses only the fingerprint.
+        :param chunk_size: Number of partners processed in one chunk.
+        :param max_chunks: Number of chunks processed in one run.
+        """
+        param_obj = self.env["ir.config_parameter"].sudo()
+        if param_obj.get_param("shopify_ept.address_fingerprint_backfilled"):
+            return True
+        for _chunk in range(max_chunks):
+            self._cr.execute("""SELECT id FROM res_partner WHERE shopify_address_fingerprint IS NULL
+                                ORDER BY id LIMIT %s""", (chunk_size,))
+            partner_ids = [row[0] for row in self._cr.fetchall()]
+            if not partner_ids:
+                param_obj.set_param("shopify_ept.address_fingerprint_backfilled", "True")
+                _logger.info("Address fingerprint of all partners is set.")
+                break
+            self.with_context(active_test=False).browse(partner_ids).shopify_update_address_fingerprint()
+            self._cr.commit()
+            self.invalidate_cache()
+            _logger.info("Address fingerprint set for %s partners up to id %s.", len(partner_ids), partner_ids[-1])
+        return True
+
+    @api.model
+    def shopify_is_address_fingerprint_backfilled(self):
+        """
+        Returns True, when all existing partners have their address fingerprint.
+        """
+        return bool(self.env["ir.config_parameter"].sudo().get_param("shopify_ept.address_fingerprint_backfilled"))
+
+    @api.model
+    def shopify_find_partner_by_address(self, partner_vals, address_key_list, extra_domain):
+        """
+        Searches the partner with the same address. The fingerprint is an indexed equality and the optional
+        fields are compared on the found partners. Until all existing partners have a fingerprint, or when a
+        fingerprint field of the address is empty, the search falls back to the comparison of every address field.
+        :param partner_vals: Values of the address.
+        :param address_key_list: Fields compared by the fallback search.
+        :param extra_domain: Domain added to the search.
+        @return: Record of partner or empty recordset.
+        """
+        if not self.shopify_is_address_fingerprint_backfilled() or not self.shopify_can_use_address_fingerprint(
+                partner_vals, address_key_list):
+            return self._find_partner_ept(partner_vals, address_key_list, extra_domain) or self
+        fingerprint = self.shopify_address_fingerprint_ept(partner_vals)
+        partners = self.search([("shopify_address_fingerprint", "=", fingerprint)] + extra_domain)
+        for existing_vals in partners.read(ADDRESS_OPTIONAL_FIELDS, load=False):
+            if self.shopify_is_same_address_ept(existing_vals, partner_vals, address_key_list):
+                return self.browse(existing_vals["id"])
+        return self
 
     @api.model
     def create_shopify_pos_customer(self, order_response, instance):
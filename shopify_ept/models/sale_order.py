@@ -5,13 +5,15 @@ import json
 import logging
 from datetime import datetime
 import time
+from concurrent.futures import ThreadPoolExecutor
 import pytz
+import psycopg2
 
 from dateutil import parser
 
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
-from ..shopify.pyactiveresource.util import xml_to_dict
+from odoo.tools.misc import split_every
 from .. import shopify
 from ..shopify.pyactiveresource.connection import ClientError
 
@@ -20,6 +22,64 @@ utc = pytz.utc
 _logger = logging.getLogger("Shopify Order")
 
 
+def _shopify_request_in_bucket(bucket, request, retries=3, with_code=False):
+    """
+    Makes one request of a worker thread after waiting for the API bucket of the store. A request refused with 429
+    is retried after the time given by Shopify.
+    @param request: Function making the request.
+    @param with_code: Gives the HTTP status of the refused request as well.
+    @return: Tuple of result of the request and error message, and the HTTP status code of the error or 0 when
+    with_code is set.
+    """
+    result, error, code = False, "", 0
+    for attempt in range(retries):
+        bucket.acquire()
+        try:
+            result = request()
+            bucket.sync_from_response(shopify.ShopifyResource.connection.response)
+            break
+        except ClientError as client_error:
+            response = getattr(client_error, "response", None)
+            bucket.sync_from_response(response)
+            if response is not None and response.code == 429 and attempt < retries - 1:
+                time.sleep(float(response.headers.get("Retry-After", 2)))
+                continue
+            result, error, code = False, str(client_error), response.code if response is not None else 0
+            break
+        except Exception as request_error:
+            result, error = False, str(request_error)
+            break
+    return (result, error, code) if with_code else (result, error)
+
+
+def _post_shopify_fulfillments(shop_url, bucket, fulfillment_requests):
+    """
+    Posts the fulfillments of one order from a worker thread of the fulfillment dispatcher, one after another.
+    It does not use the environment, only the Shopify session of the thread, paced by the API bucket of the store.
+    @return: List of tuples of fulfillment resource, result of the save and error message.
+    """
+    if shopify.ShopifyResource.get_site() != shop_url:
+        shopify.ShopifyResource.set_site(shop_url)
+    results = []
+    for fulfillment_vals in fulfillment_requests:
+        new_fulfillment = shopify.Fulfillment(fulfillment_vals)
+        fulfillment_result, error = _shopify_request_in_bucket(bucket, new_fulfillment.save)
+        results.append((new_fulfillment, fulfillment_result, error))
+    return results
+
+
+def _close_shopify_order(shop_url, bucket, shopify_order_id):
+    """
+    Closes one order in a worker thread by posting close to its id, without requesting the order first.
+    @return: Tuple of shopify order id, error message and HTTP status code of the error.
+    """
+    if shopify.ShopifyResource.get_site() != shop_url:
+        shopify.ShopifyResource.set_site(shop_url)
+    _result, error, code = _shopify_request_in_bucket(
+        bucket, lambda: shopify.Order({"id": shopify_order_id}).close() or True, with_code=True)
+    return shopify_order_id, error, code
+
+
 class SaleOrder(models.Model):
     _inherit = "sale.order"
 
@@ -71,14 +131,27 @@ class SaleOrder(models.Model):
     updated_in_shopify = fields.Boolean("Updated In Shopify ?", compute=_get_shopify_order_status,
                                         search='_search_shopify_order_ids')
     closed_at_ept = fields.Datetime("Closed At", copy=False)
+    shopify_close_failed_count = fields.Integer("Close Failed Attempts", default=0, copy=False,
+                                                help="Number of times Shopify refused to close the order. The "
+                                                     "order is not tried again after 5 refusals, until the "
+                                                     "attempts are reset.")
     canceled_in_shopify = fields.Boolean(default=False, copy=False)
     is_pos_order = fields.Boolean("POS Order ?", copy=False, default=False)
     is_service_tracking_updated = fields.Boolean("Service Tracking Updated", default=False, copy=False)
 
     _sql_constraints = [('unique_shopify_order',
-                         'unique(shopify_instance_id,shopify_order_id,shopify_order_number)',
+                         'unique(shopify_instance_id,shopify_order_id)',
                          "Shopify order must be Unique.")]
 
+    def init(self):
+        """
+        Creates the index of the order reference searches of the instance. The Shopify order id is indexed by the
+        unique constraint.
+        """
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS sale_order_shopify_instance_client_order_ref_index
+                            ON sale_order (shopify_instance_id, client_order_ref)
+                            WHERE shopify_instance_id IS NOT NULL""")
+
     def create_shopify_log_line(self, message, queue_line, log_book, order_name):
         """
         Creates log line with the message and makes the queue line fail, if queue line is passed.
@@ -262,105 +335,193 @@ class SaleOrder(models.Model):
         order_risk_obj = self.env["shopify.order.risk"]
 
         order_ids = []
-        commit_count = 0
+        workflow_order_ids = []
+        bom_cache = {}
         instance = log_book.shopify_instance_id
+        executor = instance.shopify_batch_executor("Import Shopify Orders")
 
         instance.connect_in_shopify()
 
+        if is_queue_line:
+            existing_orders = self.shopify_existing_order_map(instance, [(line.shopify_order_id, line.name)
+                                                                         for line in order_data_lines])
+        else:
+            # Direct imports give shopify.Order resources, which get() would request from Shopify.
+            order_data_lines = [line if isinstance(line, dict) else line.to_dict() for line in order_data_lines]
+            existing_orders = self.shopify_existing_order_map(instance, [(line.get("id"), line.get("name"))
+                                                                         for line in order_data_lines])
+
+        orders_data = []
         for order_data_line in order_data_lines:
-            if commit_count == 5:
-                self._cr.commit()
-                commit_count = 0
-            commit_count += 1
             if is_queue_line:
+                # Already imported orders are skipped before their data is decoded.
+                sale_order_id = existing_orders.get(order_data_line.shopify_order_id) or existing_orders.get(
+                    order_data_line.name)
+                if sale_order_id:
+                    order_data_line.write({"state": "done", "processed_at": datetime.now(),
+                                           "sale_order_id": sale_order_id})
+                    _logger.info("Done the Process of order Because Shopify Order(%s) is exist in Odoo.",
+                                 order_data_line.name)
+                    continue
                 order_data = order_data_line.order_data
                 order_response = json.loads(order_data)
             else:
-                if not isinstance(order_data_line, dict):
-                    order_response = order_data_line.to_dict()
-                else:
-                    order_response = order_data_line
+                order_response = order_data_line
                 order_data_line = False
+                if existing_orders.get(str(order_response.get("id"))) or existing_orders.get(
+                        order_response.get("name")):
+                    continue
+            orders_data.append((order_data_line, order_response))
 
-            order_number = order_response.get("order_number")
+        synced_product_ids = self.shopify_import_missing_products([order_response for _, order_response in
+                                                                   orders_data], instance, log_book)
 
-            _logger.info("Started processing Shopify order(%s) and order id is(%s)", order_number,
-                         order_response.get("id"))
+        for order_data_line, order_response in orders_data:
+            with executor.process(on_failure=lambda error, line=order_data_line, response=order_response:
+                                  self.shopify_order_import_failed(error, line, log_book, response)):
+                order_number = order_response.get("order_number")
 
-            date_order = self.convert_order_date(order_response)
-            if str(instance.import_order_after_date) > date_order:
-                message = "Order %s is not imported in Odoo due to configuration mismatch.\n Received order date is " \
-                          "%s. \n Please check the order after date in shopify configuration." % (order_number,
-                                                                                                  date_order)
-                _logger.info(message)
-                self.create_shopify_log_line(message, order_data_line, log_book, order_response.get("name"))
-                continue
+                _logger.info("Started processing Shopify order(%s) and order id is(%s)", order_number,
+                             order_response.get("id"))
 
-            sale_order = self.search_existing_shopify_order(order_response, instance, order_number)
+                date_order = self.convert_order_date(order_response)
+                if str(instance.import_order_after_date) > date_order:
+                    message = "Order %s is not imported in Odoo due to configuration mismatch.\n Received order " \
+                              "date is %s. \n Please check the order after date in shopify configuration." % (
+                                  order_number, date_order)
+                    _logger.info(message)
+                    self.create_shopify_log_line(message, order_data_line, log_book, order_response.get("name"))
+                    continue
 
-            if sale_order:
+                pos_order = True if order_response.get("source_name", "") == "pos" else False
+                partner, delivery_address, invoice_address = self.prepare_shopify_customer_and_addresses(
+                    order_response, pos_order, instance, order_data_line, log_book)
+                if not partner:
+                    continue
+
+                lines = order_response.get("line_items")
+                if self.check_mismatch_details(lines, instance, order_number, order_data_line, log_book,
+                                               synced_product_ids):
+                    _logger.info("Mismatch details found in this Shopify Order(%s) and id (%s)", order_number,
+                                 order_response.get("id"))
+                    if order_data_line:
+                        order_data_line.write({"state": "failed", "processed_at": datetime.now()})
+                    continue
+
+                try:
+                    with self._cr.savepoint():
+                        sale_order = self.shopify_create_order(instance, partner, delivery_address, invoice_address,
+                                                               order_data_line, order_response, log_book, lines,
+                                                               order_number)
+                except psycopg2.IntegrityError:
+                    # Another worker has created the same order meanwhile.
+                    self.invalidate_cache()
+                    sale_order = self.search_existing_shopify_order(order_response, instance, order_number)
+                    if order_data_line:
+                        order_data_line.write({"state": "done", "processed_at": datetime.now(),
+                                               "sale_order_id": sale_order.id})
+                    _logger.info("Shopify Order(%s) is already imported by another process.", order_number)
+                    continue
+                if not sale_order:
+                    message = "Configuration missing in Odoo while importing Shopify Order(%s) and id (%s)" % (
+                        order_number, order_response.get("id"))
+                    _logger.info(message)
+                    self.create_shopify_log_line(message, order_data_line, log_book, order_response.get("name"))
+                    continue
+
+                location_vals = self.set_shopify_location_and_warehouse(order_response, instance, pos_order)
+                sale_order.write(location_vals)
+
+                risk_result = shopify.OrderRisk().find(order_id=order_response.get("id"))
+                if risk_result:
+                    order_risk_obj.shopify_create_risk_in_order(risk_result, sale_order)
+                    risk = sale_order.risk_ids.filtered(lambda x: x.recommendation != "accept")
+                    if risk:
+                        sale_order.is_risky_order = True
+
+                # The auto workflow runs for all the imported orders together, after the import.
+                if not sale_order.is_risky_order:
+                    if sale_order.shopify_order_status == "partial":
+                        sale_order.process_order_fullfield_qty(order_response, bom_cache)
+                    workflow_order_ids.append(sale_order.id)
+
+                order_ids.append(sale_order.id)
                 if order_data_line:
                     order_data_line.write({"state": "done", "processed_at": datetime.now(),
                                            "sale_order_id": sale_order.id})
-                _logger.info("Done the Process of order Because Shopify Order(%s) is exist in Odoo and Odoo order is("
-                             "%s)", order_number, sale_order.name)
-                continue
+                _logger.info("Processed the Odoo Order %s process and Shopify Order (%s)", sale_order.name,
+                             order_number)
 
-            pos_order = True if order_response.get("source_name", "") == "pos" else False
-            partner, delivery_address, invoice_address = self.prepare_shopify_customer_and_addresses(
-                order_response, pos_order, instance, order_data_line, log_book)
-            if not partner:
-                continue
-
-            lines = order_response.get("line_items")
-            if self.check_mismatch_details(lines, instance, order_number, order_data_line, log_book):
-                _logger.info("Mismatch details found in this Shopify Order(%s) and id (%s)", order_number,
-                             order_response.get("id"))
-                if order_data_line:
-                    order_data_line.write({"state": "failed", "processed_at": datetime.now()})
-                continue
+        executor.finish()
+        self.browse(workflow_order_ids).exists().shopify_process_auto_workflow(log_book)
+        return order_ids
 
-            sale_order = self.shopify_create_order(instance, partner, delivery_address, invoice_address,
-                                                   order_data_line, order_response, log_book, lines, order_number)
-            if not sale_order:
-                message = "Configuration missing in Odoo while importing Shopify Order(%s) and id (%s)" % (
-                    order_number, order_response.get("id"))
-                _logger.info(message)
-                self.create_shopify_log_line(message, order_data_line, log_book, order_response.get("name"))
-                continue
-            order_ids.append(sale_order.id)
-
-            location_vals = self.set_shopify_location_and_warehouse(order_response, instance, pos_order)
-            sale_order.write(location_vals)
-
-            risk_result = shopify.OrderRisk().find(order_id=order_response.get("id"))
-            if risk_result:
-                order_risk_obj.shopify_create_risk_in_order(risk_result, sale_order)
-                risk = sale_order.risk_ids.filtered(lambda x: x.recommendation != "accept")
-                if risk:
-                    sale_order.is_risky_order = True
-
-            _logger.info("Starting auto workflow process for Odoo order(%s) and Shopify order is (%s)",
-                         sale_order.name, order_number)
-
-            if not sale_order.is_risky_order:
-                if sale_order.shopify_order_status == "fulfilled":
-                    sale_order.auto_workflow_process_id.shipped_order_workflow_ept(sale_order)
-                if sale_order.shopify_order_status == "partial":
-                    sale_order.process_order_fullfield_qty(order_response)
-                    sale_order.process_orders_and_invoices_ept()
-                else:
-                    sale_order.process_orders_and_invoices_ept()
+    def shopify_process_auto_workflow(self, log_book):
+        """
+        This method runs the auto workflow of the imported orders in batches of the same workflow. The fulfilled
+        orders are shipped first, then all orders are confirmed, invoiced and paid together. When a batch fails, its
+        orders are processed one by one, so only the failing order is left unprocessed.
+        @param log_book: Log book of the import, for the orders which workflow fails.
+        """
+        for workflow in self.auto_workflow_process_id:
+            orders = self.filtered(lambda x: x.auto_workflow_process_id == workflow)
+            _logger.info("Starting auto workflow %s for %s orders.", workflow.name, len(orders))
+            try:
+                with self._cr.savepoint():
+                    orders.shopify_run_auto_workflow(workflow)
+            except Exception:
+                _logger.exception("Auto workflow %s failed for the batch, processing the orders one by one.",
+                                  workflow.name)
+                for order in orders:
+                    try:
+                        with self._cr.savepoint():
+                            order.shopify_run_auto_workflow(workflow)
+                    except Exception as error:
+                        message = "Auto workflow is not processed for order %s: %s" % (order.name, str(error))
+                        self.create_shopify_log_line(message, False, log_book, order.client_order_ref)
+            self._cr.commit()
+            _logger.info("Done auto workflow %s for %s orders.", workflow.name, len(orders))
+        return True
 
-            _logger.info("Done auto workflow process for Odoo order(%s) and Shopify order is (%s)", sale_order.name,
-                         order_number)
+    def shopify_run_auto_workflow(self, workflow):
+        """
+        This method ships the fulfilled orders and processes the invoices of the orders with the workflow.
+        """
+        shipped_orders = self.filtered(lambda x: x.shopify_order_status == "fulfilled")
+        if shipped_orders:
+            workflow.shipped_order_workflow_ept(shipped_orders)
+        self.process_orders_and_invoices_in_batch_ept()
+        return True
 
-            if order_data_line:
-                order_data_line.write({"state": "done", "processed_at": datetime.now(),
-                                       "sale_order_id": sale_order.id})
-            _logger.info("Processed the Odoo Order %s process and Shopify Order (%s)", sale_order.name, order_number)
+    def shopify_order_import_failed(self, error, order_data_line, log_book, order_response):
+        """
+        This method marks the queue line as failed and logs the error, when the import of the order is rolled back.
+        """
+        message = "Error while importing Shopify Order(%s): %s" % (order_response.get("order_number"), str(error))
+        self.create_shopify_log_line(message, order_data_line, log_book, order_response.get("name"))
+        if order_data_line:
+            order_data_line.write({"state": "failed", "processed_at": datetime.now()})
+        return True
 
-        return order_ids
+    def shopify_existing_order_map(self, instance, order_refs):
+        """ This method finds the already imported orders of a page with one query.
+            @param order_refs: List of tuples of Shopify order id and order name.
+            @return: Dictionary of Shopify order id and order name with the id of the sale order.
+        """
+        order_ids = tuple(str(order_id) for order_id, _ in order_refs if order_id)
+        order_names = tuple(name for _, name in order_refs if name)
+        if not order_ids and not order_names:
+            return {}
+        self._cr.execute("""SELECT shopify_order_id, client_order_ref, id FROM sale_order
+                            WHERE shopify_instance_id = %s AND (shopify_order_id IN %s OR client_order_ref IN %s)""",
+                         (instance.id, order_ids or ("",), order_names or ("",)))
+        existing_orders = {}
+        for shopify_order_id, client_order_ref, sale_order_id in self._cr.fetchall():
+            if shopify_order_id:
+                existing_orders[shopify_order_id] = sale_order_id
+            if client_order_ref in order_names:
+                existing_orders.setdefault(client_order_ref, sale_order_id)
+        return existing_orders
 
     def search_existing_shopify_order(self, order_response, instance, order_number):
         """ This method is used to search the existing shopify order.
@@ -379,10 +540,31 @@ class SaleOrder(models.Model):
 
         return sale_order
 
+    def shopify_import_missing_products(self, order_responses, instance, log_book):
+        """ This method collects the products of the order lines, which variants are not found in Odoo, and imports
+            them together before the orders are processed.
+            @param order_responses: Responses of the orders.
+            @return: Ids of the Shopify products which are fetched and synced.
+        """
+        shopify_product_template_obj = self.env["shopify.product.template.ept"]
+        missing_product_ids = set()
+        for order_response in order_responses:
+            for line in order_response.get("line_items", []):
+                if line.get("gift_card", False) or not line.get("product_id") or not line.get("variant_id"):
+                    continue
+                if line.get("product_id") in missing_product_ids or self.search_shopify_variant(line, instance):
+                    continue
+                missing_product_ids.add(line.get("product_id"))
+        if not missing_product_ids:
+            return []
+        _logger.info("Importing %s missing products for the orders.", len(missing_product_ids))
+        return shopify_product_template_obj.import_products_by_ids_for_orders(missing_product_ids, instance, log_book)
+
     def check_mismatch_details(self, lines, instance, order_number, order_data_queue_line,
-                               log_book_id):
+                               log_book_id, synced_product_ids=None):
         """This method used to check the mismatch details in the order lines.
             @param : self, lines, instance, order_number, order_data_queue_line
+            @param synced_product_ids: Ids of products already fetched for the orders, which are not requested again.
             @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 11/11/2019.
             Task Id : 157350
         """
@@ -412,9 +594,10 @@ class SaleOrder(models.Model):
                 line_variant_id = line.get("variant_id", False)
                 line_product_id = line.get("product_id", False)
                 if line_product_id and line_variant_id:
-                    shopify_product_template_obj.shopify_sync_products(False, line_product_id,
-                                                                       instance, log_book_id,
-                                                                       order_data_queue_line)
+                    if not synced_product_ids or line_product_id not in synced_product_ids:
+                        shopify_product_template_obj.shopify_sync_products(False, line_product_id,
+                                                                           instance, log_book_id,
+                                                                           order_data_queue_line)
                     shopify_variant = self.search_shopify_variant(line, instance)
                     if not shopify_variant:
                         message = "Product [%s][%s] not found for Order %s" % (
@@ -561,10 +744,9 @@ class SaleOrder(models.Model):
         pricelist_obj = self.env["product.pricelist"]
         order_currency = order_response.get("currency") or False
         if order_currency:
-            currency = currency_obj.search([("name", "=", order_currency)])
+            currency = currency_obj.get_currency_by_name_ept(order_currency)
             if not currency:
-                currency = currency_obj.search(
-                    [("name", "=", order_currency), ("active", "=", False)])
+                currency = currency_obj.get_currency_by_name_ept(order_currency, include_inactive=True)
                 if currency:
                     currency.write({"active": True})
                     pricelist = pricelist_obj.search(
@@ -747,23 +929,80 @@ class SaleOrder(models.Model):
         return account_tax_id
 
     @api.model
-    def closed_at(self, instance):
+    def closed_at(self, instance, limit=500, max_workers=4, max_attempts=5):
         """
         This method is used to close orders in the Shopify store after the update fulfillment
         from Odoo to the Shopify store.
+        The orders are closed by id from a bounded pool of workers sharing the API bucket of the store, at most
+        limit orders per run, and the closed orders are written with one write. The orders refused by Shopify
+        with a client error (4xx other than 429) are counted, so they are taken after the others and dropped, with
+        a log line, after max_attempts. Timeouts, connection errors and throttling are not counted.
         """
         sales_orders = self.search([('warehouse_id', '=', instance.shopify_warehouse_id.id),
                                     ('shopify_order_id', '!=', False),
                                     ('shopify_instance_id', '=', instance.id),
-                                    ('state', '=', 'done'), ('closed_at_ept', '=', False)],
-                                   order='date_order')
+                                    ('state', '=', 'done'), ('closed_at_ept', '=', False),
+                                    ('shopify_close_failed_count', '<', max_attempts)],
+                                   order='shopify_close_failed_count, date_order', limit=limit)
+        if not sales_orders:
+            return True
 
         instance.connect_in_shopify()
+        shop_url = instance.prepare_shopify_shop_url(instance.shopify_host, instance.shopify_api_key,
+                                                     instance.shopify_password)
+        bucket = instance.shopify_get_api_bucket()
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(lambda order_id: _close_shopify_order(shop_url, bucket, order_id),
+                                        sales_orders.mapped('shopify_order_id')))
+
+        closed_order_ids = set()
+        refused_errors = {}
+        for shopify_order_id, error, code in results:
+            if error:
+                _logger.info("Order %s could not be closed in Shopify: %s", shopify_order_id, error)
+                if 400 <= code < 500 and code != 429:
+                    refused_errors[shopify_order_id] = error
+                continue
+            closed_order_ids.add(shopify_order_id)
+        closed_orders = sales_orders.filtered(lambda order: order.shopify_order_id in closed_order_ids)
+        closed_orders.write({'closed_at_ept': datetime.now()})
+        refused_orders = sales_orders.filtered(lambda order: order.shopify_order_id in refused_errors)
+        if refused_orders:
+            self._cr.execute("""UPDATE sale_order
+                                SET shopify_close_failed_count = COALESCE(shopify_close_failed_count, 0) + 1
+                                WHERE id IN %s""", (tuple(refused_orders.ids),))
+            refused_orders.invalidate_cache(['shopify_close_failed_count'])
+            self.log_dropped_shopify_close_orders(
+                refused_orders.filtered(lambda order: order.shopify_close_failed_count >= max_attempts),
+                refused_errors, instance)
+        _logger.info("Closed %s of %s orders in Shopify in %s seconds.", len(closed_order_ids), len(sales_orders),
+                     str(time.time() - start))
+        return True
+
+    def log_dropped_shopify_close_orders(self, sale_orders, errors, instance):
+        """
+        This method logs the orders which are not tried to close in Shopify anymore in a log book.
+        @param sale_orders: Records of sale orders.
+        @param errors: Dictionary of shopify order id and error message.
+        """
+        if not sale_orders:
+            return True
+        model_id = self.env["common.log.lines.ept"].get_model_id("sale.order")
+        log_book = self.env["common.log.book.ept"].shopify_create_common_log_book("export", instance, model_id)
+        for sale_order in sale_orders:
+            message = "Order %s is not closed in Shopify anymore after %s refused attempts. Reset the attempts " \
+                      "from the order to try again.\nError: %s" % (sale_order.name,
+                                                                    sale_order.shopify_close_failed_count,
+                                                                    errors.get(sale_order.shopify_order_id))
+            self.create_shopify_log_line(message, False, log_book, sale_order.client_order_ref)
+        return True
 
-        for sale_order in sales_orders:
-            order = shopify.Order.find(sale_order.shopify_order_id)
-            order.close()
-            sale_order.write({'closed_at_ept': datetime.now()})
+    def action_shopify_reset_close_attempts(self):
+        """
+        This method resets the refused close attempts of the orders, so they are closed in Shopify again.
+        """
+        self.write({"shopify_close_failed_count": 0})
         return True
 
     def get_shopify_carrier_code(self, picking):
@@ -777,11 +1016,13 @@ class SaleOrder(models.Model):
                            or picking.carrier_id.name or ''
         return carrier_name
 
-    def prepare_tracking_numbers_and_lines_for_fulfilment(self, picking):
+    def prepare_tracking_numbers_and_lines_for_fulfilment(self, picking, fulfillment_data=None):
         """
         This method prepares tracking numbers' list and list of dictionaries of shopify line id and
         fulfilled qty for that.
         @author: Maulik Barad on Date 17-Sep-2020.
+        :param fulfillment_data: Moves, move lines, packages and sale lines loaded for all pickings of the run by
+        shopify_prefetch_fulfillment_data. They are loaded for this picking only, when not given.
         """
         shopify_line_ids = not self.is_service_tracking_updated and \
                            self.order_line.filtered(lambda l: l.shopify_line_id and l.product_id.type == "service" and
@@ -793,15 +1034,20 @@ class SaleOrder(models.Model):
                                self.order_line.filtered(
                                    lambda l: l.shopify_line_id and l.product_id.type == "service" and
                                              not l.is_delivery).mapped("shopify_line_id") or []
-        moves = picking.move_lines
-        product_moves = moves.filtered(lambda x: x.sale_line_id.product_id.id == x.product_id.id and x.state == "done")
-        if picking.mapped("package_ids").filtered(lambda l: l.tracking_no):
-            tracking_numbers, line_items = self.prepare_tracking_numbers_and_lines_for_multi_tracking_order(moves,
-                                                                                                            product_moves)
+        fulfillment_data = fulfillment_data or self.shopify_prefetch_fulfillment_data(picking)
+        sale_lines = fulfillment_data["sale_lines"]
+        moves = [move for move in fulfillment_data["moves_by_picking"].get(picking.id, []) if move["state"] == "done"]
+        product_moves = [move for move in moves if move["sale_line_id"] and
+                         sale_lines[move["sale_line_id"]]["product_id"] == move["product_id"]]
+        kit_moves = [move for move in moves if move["sale_line_id"] and
+                     sale_lines[move["sale_line_id"]]["product_id"] != move["product_id"]]
+        if any(fulfillment_data["tracking_numbers"].get(package_id) for package_id in
+               fulfillment_data["package_ids_by_picking"].get(picking.id, [])):
+            tracking_numbers, line_items = self.prepare_tracking_numbers_and_lines_for_multi_tracking_order(
+                product_moves, kit_moves, fulfillment_data)
         else:
-            tracking_numbers, line_items = self.prepare_tracking_numbers_and_lines_for_simple_tracking_order(moves,
-                                                                                                             product_moves,
-                                                                                                             picking)
+            tracking_numbers, line_items = self.prepare_tracking_numbers_and_lines_for_simple_tracking_order(
+                product_moves, kit_moves, fulfillment_data, picking)
         for line in shopify_line_ids:
             quantity = sum(
                 self.order_line.filtered(lambda l: l.shopify_line_id == line).mapped("product_uom_qty"))
@@ -810,65 +1056,105 @@ class SaleOrder(models.Model):
 
         return tracking_numbers, line_items
 
-    def prepare_tracking_numbers_and_lines_for_simple_tracking_order(self, moves, product_moves, picking):
+    def shopify_prefetch_fulfillment_data(self, pickings):
+        """ This method loads the moves, move lines, packages and sale lines of all pickings with one search and
+            read per model, so the fulfillment of every picking is prepared from memory.
+            :param pickings: Records of pickings.
+            @return: Dictionary of the moves by picking, move lines by move, packages by picking, tracking number
+            by package and sale line by id.
+        """
+        moves = self.env["stock.move"].search([("picking_id", "in", pickings.ids)]).read(
+            ["picking_id", "product_id", "sale_line_id", "state", "product_qty"], load=False)
+        move_lines = self.env["stock.move.line"].search([("picking_id", "in", pickings.ids)]).read(
+            ["picking_id", "move_id", "qty_done", "result_package_id"], load=False)
+        package_ids = list({move_line["result_package_id"] for move_line in move_lines if
+                            move_line["result_package_id"]})
+        packages = self.env["stock.quant.package"].browse(package_ids).read(["tracking_no"])
+        sale_line_ids = list({move["sale_line_id"] for move in moves if move["sale_line_id"]})
+        sale_lines = self.env["sale.order.line"].browse(sale_line_ids).read(
+            ["product_id", "shopify_line_id", "product_qty", "product_uom_qty"], load=False)
+
+        fulfillment_data = {"moves_by_picking": {}, "move_lines_by_move": {}, "package_ids_by_picking": {},
+                            "tracking_numbers": {package["id"]: package["tracking_no"] for package in packages},
+                            "sale_lines": {sale_line["id"]: sale_line for sale_line in sale_lines}}
+        for move in moves:
+            fulfillment_data["moves_by_picking"].setdefault(move["picking_id"], []).append(move)
+        for move_line in move_lines:
+            fulfillment_data["move_lines_by_move"].setdefault(move_line["move_id"], []).append(move_line)
+            package_ids_of_picking = fulfillment_data["package_ids_by_picking"].setdefault(move_line["picking_id"],
+                                                                                           [])
+            if move_line["result_package_id"] and move_line["result_package_id"] not in package_ids_of_picking:
+                package_ids_of_picking.append(move_line["result_package_id"])
+        return fulfillment_data
+
+    def prepare_tracking_numbers_and_lines_for_simple_tracking_order(self, product_moves, kit_moves,
+                                                                     fulfillment_data, picking):
         """ This method is used to prepare tracking numbers and line items for the simple tracking order.
-            :param moves: Move lines of picking.
-            :param product_moves: Filtered moves.
+            :param product_moves: Done moves of the products of the sale lines.
+            :param kit_moves: Done moves of the components of kit sale lines.
+            :param fulfillment_data: Data loaded by shopify_prefetch_fulfillment_data.
             @return: tracking_numbers, line_items
             @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 20 October 2020 .
             Task_id: 167537
         """
+        sale_lines = fulfillment_data["sale_lines"]
         tracking_numbers = []
         line_items = []
         for move in product_moves:
-            shopify_line_id = move.sale_line_id.shopify_line_id
+            shopify_line_id = sale_lines[move["sale_line_id"]]["shopify_line_id"]
 
-            line_items.append({"id": shopify_line_id, "quantity": int(move.product_qty)})
+            line_items.append({"id": shopify_line_id, "quantity": int(move["product_qty"])})
             tracking_numbers.append(picking.carrier_tracking_ref or "")
 
-        kit_sale_lines = moves.filtered(
-            lambda x: x.sale_line_id.product_id.id != x.product_id.id and x.state == "done").sale_line_id
-        for kit_sale_line in kit_sale_lines:
-            shopify_line_id = kit_sale_line.shopify_line_id
-            line_items.append({"id": shopify_line_id, "quantity": int(kit_sale_line.product_qty)})
+        kit_sale_line_ids = []
+        for move in kit_moves:
+            if move["sale_line_id"] not in kit_sale_line_ids:
+                kit_sale_line_ids.append(move["sale_line_id"])
+        for kit_sale_line_id in kit_sale_line_ids:
+            kit_sale_line = sale_lines[kit_sale_line_id]
+            line_items.append({"id": kit_sale_line["shopify_line_id"], "quantity": int(kit_sale_line["product_qty"])})
             tracking_numbers.append(picking.carrier_tracking_ref or "")
 
         return tracking_numbers, line_items
 
-    def prepare_tracking_numbers_and_lines_for_multi_tracking_order(self, moves, product_moves):
-        """ This method is used to prepare tracking numbers and line items for the simple tracking order.
-            :param moves: Move lines of picking.
-            :param product_moves: Filtered moves.
+    def prepare_tracking_numbers_and_lines_for_multi_tracking_order(self, product_moves, kit_moves,
+                                                                    fulfillment_data):
+        """ This method is used to prepare tracking numbers and line items for the multi tracking order.
+            :param product_moves: Done moves of the products of the sale lines.
+            :param kit_moves: Done moves of the components of kit sale lines.
+            :param fulfillment_data: Data loaded by shopify_prefetch_fulfillment_data.
             @return: tracking_numbers, line_items
             @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 20 October 2020 .
             Task_id: 167537
         """
+        sale_lines = fulfillment_data["sale_lines"]
+        package_tracking_numbers = fulfillment_data["tracking_numbers"]
+        move_lines_by_move = fulfillment_data["move_lines_by_move"]
         tracking_numbers = []
         line_items = []
         for move in product_moves:
             total_qty = 0
-            shopify_line_id = move.sale_line_id.shopify_line_id
+            shopify_line_id = sale_lines[move["sale_line_id"]]["shopify_line_id"]
 
-            for move_line in move.move_line_ids:
-                tracking_no = move_line.result_package_id.tracking_no or ""
-                total_qty += move_line.qty_done
+            for move_line in move_lines_by_move.get(move["id"], []):
+                tracking_no = package_tracking_numbers.get(move_line["result_package_id"]) or ""
+                total_qty += move_line["qty_done"]
                 tracking_numbers.append(tracking_no)
 
             line_items.append({"id": shopify_line_id, "quantity": int(total_qty)})
 
-        kit_move_lines = moves.filtered(
-            lambda x: x.sale_line_id.product_id.id != x.product_id.id and x.state == "done")
         existing_sale_line_ids = []
-        for move in kit_move_lines:
-            if move.sale_line_id.id in existing_sale_line_ids:
+        for move in kit_moves:
+            if move["sale_line_id"] in existing_sale_line_ids:
                 continue
 
-            shopify_line_id = move.sale_line_id.shopify_line_id
-            existing_sale_line_ids.append(move.sale_line_id.id)
+            sale_line = sale_lines[move["sale_line_id"]]
+            existing_sale_line_ids.append(move["sale_line_id"])
 
-            tracking_no = move.move_line_ids.result_package_id.mapped("tracking_no") or []
-            tracking_no = tracking_no and tracking_no[0] or ""
-            line_items.append({"id": shopify_line_id, "quantity": int(move.sale_line_id.product_uom_qty)})
+            package_ids = [move_line["result_package_id"] for move_line in move_lines_by_move.get(move["id"], [])
+                           if move_line["result_package_id"]]
+            tracking_no = package_ids and package_tracking_numbers.get(package_ids[0]) or ""
+            line_items.append({"id": sale_line["shopify_line_id"], "quantity": int(sale_line["product_uom_qty"])})
             tracking_numbers.append(tracking_no)
 
         return tracking_numbers, line_items
@@ -899,13 +1185,16 @@ class SaleOrder(models.Model):
 
         instance.connect_in_shopify()
         picking_ids = self.shopify_search_picking_for_update_order_status(instance)
+        order_responses = self.request_for_shopify_orders_in_batch(picking_ids.sale_id, instance)
+        fulfillment_data = self.shopify_prefetch_fulfillment_data(picking_ids)
+        fulfillment_requests = []
         for picking in picking_ids:
             carrier_name = self.get_shopify_carrier_code(picking)
             sale_order = picking.sale_id
 
             _logger.info("We are processing Sale order '%s' and Picking '%s'", sale_order.name, picking.name)
-            is_continue_process, order_response = self.request_for_shopify_order(sale_order)
-            if is_continue_process:
+            order_response = order_responses.get(sale_order.shopify_order_id)
+            if not order_response:
                 continue
             order_lines = sale_order.order_line
             if order_lines and order_lines.filtered(lambda s: s.product_id.type != 'service' and not s.shopify_line_id):
@@ -918,7 +1207,8 @@ class SaleOrder(models.Model):
                 self.create_shopify_log_line(message, False, log_book, sale_order.client_order_ref)
                 continue
 
-            tracking_numbers, line_items = sale_order.prepare_tracking_numbers_and_lines_for_fulfilment(picking)
+            tracking_numbers, line_items = sale_order.prepare_tracking_numbers_and_lines_for_fulfilment(
+                picking, fulfillment_data)
 
             if not line_items:
                 message = "No order lines found for the update order shipping status for order [%s]" \
@@ -934,17 +1224,11 @@ class SaleOrder(models.Model):
 
             fulfillment_vals = self.prepare_vals_for_fulfillment(sale_order, shopify_location_id, tracking_numbers,
                                                                  picking, carrier_name, line_items, notify_customer)
+            fulfillment_requests.append((picking, sale_order, order_response, shopify_location_id, fulfillment_vals))
 
-            is_create_mismatch, fulfillment_result, new_fulfillment = self.post_fulfilment_in_shopify(fulfillment_vals,
-                                                                                                      sale_order,
-                                                                                                      log_book)
-            if is_create_mismatch:
-                continue
-
-            self.process_shopify_fulfilment_result(fulfillment_result, order_response, picking, sale_order, log_book,
-                                                   new_fulfillment)
-
-            sale_order.shopify_location_id = shopify_location_id
+        fulfillment_results = self.post_fulfillments_in_batch([request[4] for request in fulfillment_requests],
+                                                              instance)
+        self.process_shopify_fulfilment_results_in_batch(fulfillment_requests, fulfillment_results, log_book)
 
         if not log_book.log_lines:
             log_book.unlink()
@@ -970,25 +1254,42 @@ class SaleOrder(models.Model):
                                                order="date")
         return picking_ids
 
-    def request_for_shopify_order(self, sale_order):
-        """ This method is used to request for sale order in the shopify store and if order response has
-            fufillment_status is fulfilled then continue the update order status for that picking.
-            @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 20 October 2020 .
-            Task_id: 167537
-        """
-        try:
-            order = shopify.Order.find(sale_order.shopify_order_id)
-            order_data = order.to_dict()
-            if order_data.get('fulfillment_status') == 'fulfilled':
-                _logger.info('Order %s is already fulfilled', sale_order.name)
-                sale_order.picking_ids.filtered(lambda l: l.state == 'done').write({'updated_in_shopify': True})
-                return True, order_data
-            if order_data.get('cancelled_at') and order_data.get('cancel_reason'):
-                sale_order.picking_ids.filtered(lambda l: l.state == 'done').write({'is_cancelled_in_shopify': True})
-                return True, order_data
-            return False, order_data
-        except Exception as error:
-            return True, {}
+    def request_for_shopify_orders_in_batch(self, sale_orders, instance):
+        """ This method is used to request the status of the orders in the shopify store, 250 orders per request.
+            The done pickings of the orders which are already fulfilled or cancelled in the store are marked with
+            one write each, so only the other orders are returned to update their status.
+            :param sale_orders: Records of sale orders.
+            @return: Dictionary of shopify order id and its status response.
+        """
+        order_responses = {}
+        shopify_order_ids = list({order_id for order_id in sale_orders.mapped("shopify_order_id") if order_id})
+        for order_ids in split_every(250, shopify_order_ids):
+            instance.shopify_wait_for_api_credit()
+            try:
+                orders = shopify.Order.find(ids=",".join(order_ids), status="any", limit=250,
+                                            fields="id,fulfillment_status,cancelled_at,cancel_reason")
+            except Exception as error:
+                _logger.info("Status of orders could not be requested from Shopify: %s", str(error))
+                continue
+            for order in orders:
+                order_data = order.to_dict()
+                order_responses[str(order_data.get("id"))] = order_data
+
+        fulfilled_orders = cancelled_orders = self.env["sale.order"]
+        for sale_order in sale_orders:
+            order_data = order_responses.get(sale_order.shopify_order_id)
+            if not order_data:
+                continue
+            if order_data.get("fulfillment_status") == "fulfilled":
+                _logger.info("Order %s is already fulfilled", sale_order.name)
+                fulfilled_orders |= sale_order
+            elif order_data.get("cancelled_at") and order_data.get("cancel_reason"):
+                cancelled_orders |= sale_order
+        fulfilled_orders.picking_ids.filtered(lambda l: l.state == "done").write({"updated_in_shopify": True})
+        cancelled_orders.picking_ids.filtered(lambda l: l.state == "done").write({"is_cancelled_in_shopify": True})
+        for sale_order in fulfilled_orders | cancelled_orders:
+            order_responses.pop(sale_order.shopify_order_id)
+        return order_responses
 
     def search_shopify_location_for_update_order_status(self, sale_order, instance, log_book):
         """ This method is used to search the shopify location for the update order status from Odoo to shopify store.
@@ -1029,28 +1330,66 @@ class SaleOrder(models.Model):
                             "notify_customer": notify_customer}
         return fulfillment_vals
 
-    def post_fulfilment_in_shopify(self, fulfillment_vals, sale_order, log_book):
-        """ This method is used to post the fulfillment from Odoo to Shopify store.
-            @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 10 November 2020 .
-            Task_id: 167930 - Update order status changes as per v13
-        """
-        try:
-            new_fulfillment = shopify.Fulfillment(fulfillment_vals)
-            fulfillment_result = new_fulfillment.save()
-            if not fulfillment_result:
-                return False, fulfillment_result, new_fulfillment
-        except ClientError as error:
-            if hasattr(error, "response"):
-                if error.response.code == 429 and error.response.msg == "Too Many Requests":
-                    time.sleep(5)
-                    fulfillment_result = new_fulfillment.save()
-        except Exception as error:
-            message = "%s" % str(error)
-            _logger.info(message)
-            self.create_shopify_log_line(message, False, log_book, sale_order.client_order_ref)
-            return True, fulfillment_result, new_fulfillment
-
-        return False, fulfillment_result, new_fulfillment
+    def post_fulfillments_in_batch(self, fulfillment_requests, instance, max_workers=4):
+        """ This method posts the fulfillments from a bounded pool of workers, which share the API bucket of the
+            store. The fulfillments of the same order are posted one after another by the same worker.
+            :param fulfillment_requests: List of values of the fulfillments.
+            :param max_workers: Number of fulfillments posted at the same time.
+            @return: List of tuples of fulfillment resource, result and error, in the order of the requests.
+        """
+        if not fulfillment_requests:
+            return []
+        shop_url = instance.prepare_shopify_shop_url(instance.shopify_host, instance.shopify_api_key,
+                                                     instance.shopify_password)
+        bucket = instance.shopify_get_api_bucket()
+        indexes_by_order = {}
+        for index, fulfillment_vals in enumerate(fulfillment_requests):
+            indexes_by_order.setdefault(fulfillment_vals.get("order_id"), []).append(index)
+
+        start = time.time()
+        results = [None] * len(fulfillment_requests)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            workers = {executor.submit(_post_shopify_fulfillments, shop_url, bucket,
+                                       [fulfillment_requests[index] for index in indexes]): indexes
+                       for indexes in indexes_by_order.values()}
+            for worker, indexes in workers.items():
+                for index, result in zip(indexes, worker.result()):
+                    results[index] = result
+        _logger.info("Posted %s fulfillments in %s seconds.", len(fulfillment_requests), str(time.time() - start))
+        return results
+
+    def process_shopify_fulfilment_results_in_batch(self, fulfillment_requests, fulfillment_results, log_book):
+        """ This method processes the results of the posted fulfillments. The fulfilled pickings and the locations
+            of the orders are written in batch, the failed fulfillments are processed one by one.
+            :param fulfillment_requests: List of tuples of picking, sale order, order response, location and values.
+            :param fulfillment_results: List of tuples of fulfillment resource, result and error.
+        """
+        picking_obj = self.env["stock.picking"]
+        fulfillment_ids = {}
+        orders_by_location = {}
+        for request, (new_fulfillment, fulfillment_result, error) in zip(fulfillment_requests, fulfillment_results):
+            picking, sale_order, order_response, shopify_location_id, _fulfillment_vals = request
+            if error:
+                _logger.info(error)
+                self.create_shopify_log_line(error, False, log_book, sale_order.client_order_ref)
+                continue
+            if fulfillment_result:
+                fulfillment_ids[picking.id] = str(new_fulfillment.attributes.get("id") or "")
+            else:
+                self.process_shopify_fulfilment_result(fulfillment_result, order_response, picking, sale_order,
+                                                       log_book, new_fulfillment)
+            orders_by_location[shopify_location_id] = orders_by_location.get(shopify_location_id,
+                                                                             self.env["sale.order"]) | sale_order
+
+        if fulfillment_ids:
+            picking_obj.browse(list(fulfillment_ids)).write({"updated_in_shopify": True})
+            self._cr.executemany("UPDATE stock_picking SET shopify_fulfillment_id = %s WHERE id = %s",
+                                 [(fulfillment_id, picking_id) for picking_id, fulfillment_id in
+                                  fulfillment_ids.items()])
+            picking_obj.invalidate_cache(["shopify_fulfillment_id"], list(fulfillment_ids))
+        for shopify_location_id, sale_orders in orders_by_location.items():
+            sale_orders.write({"shopify_location_id": shopify_location_id.id})
+        return True
 
     def process_shopify_fulfilment_result(self, fulfillment_result, order_response, picking, sale_order, log_book,
                                           new_fulfillment):
@@ -1073,9 +1412,7 @@ class SaleOrder(models.Model):
 
         fulfillment_id = ''
         if new_fulfillment:
-            shopify_fullment_result = xml_to_dict(new_fulfillment.to_xml())
-            if shopify_fullment_result:
-                fulfillment_id = shopify_fullment_result.get('fulfillment').get('id') or ''
+            fulfillment_id = new_fulfillment.attributes.get('id') or ''
 
         picking.write({'updated_in_shopify': True, 'shopify_fulfillment_id': fulfillment_id})
 
@@ -1339,16 +1676,20 @@ class SaleOrder(models.Model):
             res += super(SaleOrder, other_orders)._create_invoices(grouped, final, date)
         return res
 
-    def process_order_fullfield_qty(self, order_response):
+    def process_order_fullfield_qty(self, order_response, bom_cache=None):
         """ This method is used to search order line which product qty need to create stock move.
             :param order_response: Response of shopify order.
+            :param bom_cache: Dictionary of exploded kits, shared by the orders of an import.
             @author: Haresh Mori @Emipro Technologies Pvt. Ltd on date 31 December 2020 .
             Task_id: 169381 - Gift card order import changes
         """
         module_obj = self.env['ir.module.module']
+        stock_location_obj = self.env["stock.location"]
         mrp_module = module_obj.sudo().search([('name', '=', 'mrp'), ('state', '=', 'installed')])
+        customer_location = stock_location_obj.search([("usage", "=", "customer")], limit=1)
         lines = order_response.get("line_items")
         bom_lines = []
+        move_vals = []
         for line in lines:
             shopify_line_id = line.get('id')
             sale_order_line = self.order_line.filtered(lambda order_line: int(order_line.shopify_line_id)
@@ -1358,11 +1699,14 @@ class SaleOrder(models.Model):
                 continue
             fulfilled_qty = float(line.get('quantity')) - float(line.get('fulfillable_quantity'))
             if mrp_module:
-                bom_lines = self.check_for_bom_product(sale_order_line.product_id)
+                bom_lines = self.check_for_bom_product(sale_order_line.product_id, bom_cache)
             for bom_line in bom_lines:
-                self.create_stock_move_of_fullfield_qty(sale_order_line, fulfilled_qty, bom_line)
+                move_vals.append(self.prepare_stock_move_vals_of_fullfield_qty(sale_order_line, fulfilled_qty,
+                                                                               customer_location, bom_line))
             if fulfilled_qty > 0 and not mrp_module:
-                self.create_stock_move_of_fullfield_qty(sale_order_line, fulfilled_qty)
+                move_vals.append(self.prepare_stock_move_vals_of_fullfield_qty(sale_order_line, fulfilled_qty,
+                                                                               customer_location))
+        self.create_and_done_stock_moves_ept([vals for vals in move_vals if vals])
         return True
 
     def create_stock_move_of_fullfield_qty(self, order_line, fulfilled_qty, bom_line=False):
@@ -1375,6 +1719,17 @@ class SaleOrder(models.Model):
         """
         stock_location_obj = self.env["stock.location"]
         customer_location = stock_location_obj.search([("usage", "=", "customer")], limit=1)
+        move_vals = self.prepare_stock_move_vals_of_fullfield_qty(order_line, fulfilled_qty, customer_location,
+                                                                  bom_line)
+        if move_vals:
+            self.create_and_done_stock_moves_ept([move_vals])
+        return True
+
+    def prepare_stock_move_vals_of_fullfield_qty(self, order_line, fulfilled_qty, customer_location, bom_line=False):
+        """ This method is used to prepare the vals of the stock move of the fulfilled qty of the order line.
+            :param bom_line: Exploded line of the kit.
+            :return: Dictionary of the vals or empty dictionary, when there is nothing to move.
+        """
         if bom_line:
             product = bom_line[0].product_id
             product_qty = bom_line[1].get('qty', 0) * fulfilled_qty
@@ -1383,16 +1738,13 @@ class SaleOrder(models.Model):
             product = order_line.product_id
             product_qty = fulfilled_qty
             product_uom = order_line.product_uom
-        if product and product_qty and product_uom:
-            move_vals = self.prepare_val_for_stock_move(product, product_qty, product_uom, customer_location,
-                                                        order_line)
-            if bom_line:
-                move_vals.update({'bom_line_id': bom_line[0].id})
-            stock_move = self.env['stock.move'].create(move_vals)
-            stock_move._action_assign()
-            stock_move._set_quantity_done(fulfilled_qty)
-            stock_move._action_done()
-        return True
+        if not (product and product_qty and product_uom):
+            return {}
+        move_vals = self.prepare_val_for_stock_move(product, product_qty, product_uom, customer_location,
+                                                    order_line)
+        if bom_line:
+            move_vals.update({'bom_line_id': bom_line[0].id})
+        return move_vals
 
     def prepare_val_for_stock_move(self, product, fulfilled_qty, product_uom, customer_location, order_line):
         """ Prepare vals for the stock move.
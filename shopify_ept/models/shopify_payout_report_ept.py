@@ -44,6 +44,13 @@ class ShopifyPaymentReportEpt(models.Model):
                              default="draft", tracking=True)
     is_skip_from_cron = fields.Boolean(string="Skip From Schedule Actions", default=False)
 
+    def init(self):
+        """
+        Creates the index of the payout searches of the instance.
+        """
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS shopify_payout_report_ept_instance_reference_index
+                            ON shopify_payout_report_ept (instance_id, payout_reference_id)""")
+
     def get_payout_report(self, start_date, end_date, instance):
         """
         This method is used to import Payout reports and create record in Odoo.
@@ -178,7 +185,7 @@ class ShopifyPaymentReportEpt(models.Model):
             'net_amount': net_amount,
         }
 
-        currency_id = currency_obj.search([('name', '=', currency)], limit=1)
+        currency_id = currency_obj.get_currency_by_name_ept(currency)
         if currency_id:
             transaction_vals.update({'currency_id': currency_id.id})
 
@@ -221,7 +228,7 @@ class ShopifyPaymentReportEpt(models.Model):
             'amount': amount,
             'instance_id': instance.id
         }
-        currency_id = currency_obj.search([('name', '=', currency)], limit=1)
+        currency_id = currency_obj.get_currency_by_name_ept(currency)
         if currency_id:
             payout_vals.update({'currency_id': currency_id.id})
         return payout_vals
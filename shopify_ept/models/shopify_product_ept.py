@@ -4,10 +4,11 @@
 import json
 import logging
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from odoo import models, fields, api
 from odoo.exceptions import UserError
+from odoo.tools.misc import split_every
 from .. import shopify
 from ..shopify.pyactiveresource.connection import ClientError
 
@@ -49,6 +50,17 @@ class ShopifyProductProductEpt(models.Model):
     taxable = fields.Boolean(default=True)
     last_stock_update_date = fields.Datetime(readonly=True, help="It is used in export stock process.")
 
+    def init(self):
+        """
+        Creates the indexes of the variant, inventory item and SKU searches of the instance.
+        """
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS shopify_product_product_ept_instance_variant_index
+                            ON shopify_product_product_ept (shopify_instance_id, variant_id)""")
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS shopify_product_product_ept_instance_inventory_item_index
+                            ON shopify_product_product_ept (shopify_instance_id, inventory_item_id)""")
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS shopify_product_product_ept_instance_default_code_index
+                            ON shopify_product_product_ept (shopify_instance_id, default_code)""")
+
     def toggle_active(self):
         """
         This method is used to archiving related shopify product template if there is only
@@ -647,17 +659,30 @@ class ShopifyProductProductEpt(models.Model):
         Check export_stock_warehouse_ids is configured in location or not
         Get the total stock of the product with configured warehouses and update that stock in shopify location
         here we use InventoryLevel shopify API for export stock
+        Only the quantities changed since their last successful export are sent. The full reconcile run, every
+        configured number of days, sends the quantities of all exported products of the instance to correct the
+        changes made in Shopify. It commits the last reconciled product of each location with each batch, so an
+        interrupted reconcile resumes where it stopped. The context key shopify_stock_full_reconcile sends all
+        quantities of the given products, without changing the date of the full reconcile.
+        With the GraphQL engine, the quantities of the location are sent in bulk mutations.
         @author: Maulik Barad on Date 15-Sep-2020.
         """
         common_log_line_obj = self.env["common.log.lines.ept"]
         product_obj = self.env["product.product"]
+        stock_ledger_obj = self.env["shopify.stock.ledger.ept"]
 
         log_line_array = []
         model = "shopify.product.product.ept"
         model_id = common_log_line_obj.get_model_id(model)
-        all_products = self.search_shopify_product_for_export_stock(instance, product_ids)
+        is_full_reconcile = not self._context.get('is_process_from_selected_product') and \
+                            self.is_shopify_stock_full_reconcile(instance)
+        if is_full_reconcile:
+            all_products = self.search([("shopify_instance_id", "=", instance.id), ("exported_in_shopify", "=", True)],
+                                       order='last_stock_update_date')
+        else:
+            all_products = self.search_shopify_product_for_export_stock(instance, product_ids)
 
-        if self._context.get('is_process_from_selected_product'):
+        if self._context.get('is_process_from_selected_product') or is_full_reconcile:
             shopify_products = all_products
         else:
             if instance.shopify_last_date_update_stock:
@@ -675,6 +700,8 @@ class ShopifyProductProductEpt(models.Model):
 
         instance.connect_in_shopify()
         location_ids = self.env["shopify.location.ept"].search([("instance_id", "=", instance.id)])
+        ignore_ledger = is_full_reconcile or self._context.get("shopify_stock_full_reconcile")
+        use_graphql = instance.stock_export_engine == "graphql"
         if not location_ids:
             message = "Location not found for instance %s while update stock" % instance.name
             log_line_array = self.shopify_create_log(message, model_id, False, log_line_array)
@@ -686,15 +713,47 @@ class ShopifyProductProductEpt(models.Model):
                 log_line_array = self.shopify_create_log(message, model_id, False, log_line_array)
                 continue
 
-            odoo_product_ids = shopify_products.product_id.ids
+            location_products = shopify_products
+            if is_full_reconcile:
+                location_products = shopify_products.sorted("id").filtered(
+                    lambda product: product.id > location_id.stock_reconcile_last_product_id)
+            odoo_product_ids = location_products.product_id.ids
             product_stock = self.check_stock(instance, odoo_product_ids, product_obj,
                                              location_id.export_stock_warehouse_ids)
-            commit_count = 0
-            for shopify_product in shopify_products:
-                if commit_count == 50:
-                    self._cr.commit()
-                    commit_count = 0
-                commit_count += 1
+            pushed_quantities = {} if ignore_ledger else stock_ledger_obj.get_pushed_quantities(instance,
+                                                                                                   location_id)
+            exported_quantities = {}
+            graphql_levels = []
+            reconciled_product_id = False
+
+            def save_exported_stock():
+                """
+                Sends the pending GraphQL quantities and saves the ledger and the reconcile progress, so they are
+                committed with the batch of products.
+                """
+                nonlocal use_graphql, log_line_array
+                if graphql_levels:
+                    graphql_quantities, rest_levels, use_graphql, log_line_array = \
+                        self.export_stock_levels_by_graphql(instance, location_id, graphql_levels, model_id,
+                                                            log_line_array)
+                    exported_quantities.update(graphql_quantities)
+                    for rest_product, rest_quantity in rest_levels:
+                        is_rest_exported, log_line_array = self.export_stock_level_in_shopify(
+                            instance, location_id, rest_product, rest_quantity, model_id, log_line_array)
+                        if is_rest_exported:
+                            exported_quantities.update({str(rest_product.inventory_item_id): rest_quantity})
+                    graphql_levels.clear()
+                if exported_quantities:
+                    stock_ledger_obj.record_pushed_quantities(instance, location_id, exported_quantities)
+                    exported_quantities.clear()
+                if is_full_reconcile and reconciled_product_id:
+                    location_id.write({"stock_reconcile_last_product_id": reconciled_product_id})
+
+            # The API errors are logged per product, so the batch only decides when to commit.
+            executor = instance.shopify_batch_executor("Export Stock in Shopify", save_exported_stock)
+            for shopify_product in location_products:
+                executor.step()
+                reconciled_product_id = shopify_product.id
                 odoo_product = shopify_product.product_id
                 if odoo_product.type == "product":
                     if not shopify_product.inventory_item_id:
@@ -704,39 +763,143 @@ class ShopifyProductProductEpt(models.Model):
                         log_line_array = self.shopify_create_log(message, model_id, odoo_product, log_line_array)
                         continue
 
-                    quantity = self.compute_qty_for_export_stock(product_stock, shopify_product, odoo_product)
-                    try:
-                        shopify.InventoryLevel.set(location_id.shopify_location_id, shopify_product.inventory_item_id,
-                                                   int(quantity))
-                    except ClientError as error:
-                        if hasattr(error, "response"):
-                            if error.response.code == 429 and error.response.msg == "Too Many Requests":
-                                time.sleep(5)
-                                shopify.InventoryLevel.set(location_id.shopify_location_id,
-                                                           shopify_product.inventory_item_id,
-                                                           int(quantity))
-                                continue
-                            message = "Error while Export stock for Product ID: %s & Product Name: '%s' for instance:" \
-                                      "'%s'\nError: %s\n%s" % (odoo_product.id, odoo_product.name, instance.name,
-                                                               str(error.response.code) + " " + error.response.msg,
-                                                               json.loads(error.response.body.decode()).get("errors")[0]
-                                                               )
-                            log_line_array = self.shopify_create_log(message, model_id, odoo_product, log_line_array)
-
-                    except Exception as error:
-                        message = "Error while Export stock for Product ID: %s & Product Name: '%s' for instance: " \
-                                  "'%s'\nError: %s" % (odoo_product.id, odoo_product.name, instance.name, str(error))
-                        log_line_array = self.shopify_create_log(message, model_id, odoo_product, log_line_array)
+                    quantity = int(self.compute_qty_for_export_stock(product_stock, shopify_product, odoo_product))
+                    inventory_item_id = str(shopify_product.inventory_item_id)
+                    if use_graphql and pushed_quantities.get(inventory_item_id) != quantity:
+                        graphql_levels.append((shopify_product, quantity))
+                    elif pushed_quantities.get(inventory_item_id) != quantity:
+                        is_exported, log_line_array = self.export_stock_level_in_shopify(
+                            instance, location_id, shopify_product, quantity, model_id, log_line_array)
+                        if is_exported:
+                            exported_quantities.update({inventory_item_id: quantity})
 
                     if not self._context.get('is_process_from_selected_product'):
                         shopify_product.write({
                             'last_stock_update_date': last_export_date if not shopify_product.last_stock_update_date else datetime.now()})
+            executor.finish()
+
+        if is_full_reconcile and location_ids:
+            instance.write({"last_stock_full_reconcile_date": datetime.now()})
+            location_ids.write({"stock_reconcile_last_product_id": 0})
 
         if len(log_line_array) > 0:
             self.create_log_book(log_line_array, "export", instance)
 
         return all_products
 
+    def export_stock_level_in_shopify(self, instance, location_id, shopify_product, quantity, model_id,
+                                      log_line_array):
+        """
+        This method sets the quantity of the product in the Shopify location and logs the error if any.
+        @param instance: Record of instance.
+        @param location_id: Record of Shopify location.
+        @param shopify_product: Record of Shopify product.
+        @param quantity: Quantity to set.
+        @return: True if the quantity is set, and the log line array.
+        """
+        odoo_product = shopify_product.product_id
+        try:
+            shopify.InventoryLevel.set(location_id.shopify_location_id, shopify_product.inventory_item_id, quantity)
+            return True, log_line_array
+        except ClientError as error:
+            if hasattr(error, "response"):
+                if error.response.code == 429 and error.response.msg == "Too Many Requests":
+                    time.sleep(5)
+                    shopify.InventoryLevel.set(location_id.shopify_location_id, shopify_product.inventory_item_id,
+                                               quantity)
+                    return True, log_line_array
+                message = "Error while Export stock for Product ID: %s & Product Name: '%s' for instance:" \
+                          "'%s'\nError: %s\n%s" % (odoo_product.id, odoo_product.name, instance.name,
+                                                   str(error.response.code) + " " + error.response.msg,
+                                                   json.loads(error.response.body.decode()).get("errors")[0])
+                log_line_array = self.shopify_create_log(message, model_id, odoo_product, log_line_array)
+        except Exception as error:
+            message = "Error while Export stock for Product ID: %s & Product Name: '%s' for instance: " \
+                      "'%s'\nError: %s" % (odoo_product.id, odoo_product.name, instance.name, str(error))
+            log_line_array = self.shopify_create_log(message, model_id, odoo_product, log_line_array)
+        return False, log_line_array
+
+    def export_stock_levels_by_graphql(self, instance, location_id, levels, model_id, log_line_array):
+        """
+        This method sets the quantities of the location with the inventorySetQuantities mutation, 250 items per
+        request. The user errors are logged for their items and the other items of the request are sent again.
+        When the store does not support the mutation, the remaining items are given back to be exported by REST,
+        as well as any item still not sent after one pass per item.
+        @param instance: Record of instance.
+        @param location_id: Record of Shopify location.
+        @param levels: List of tuples of Shopify product and quantity.
+        @return: Dictionary of inventory item id and exported quantity, list of levels to export by REST, whether
+        the mutation is available for the store and the log line array.
+        """
+        mutation = """mutation inventorySetQuantities($input: InventorySetQuantitiesInput!) {
+            inventorySetQuantities(input: $input) {
+                userErrors { field message }
+            }
+        }"""
+        exported_quantities = {}
+        chunks = list(split_every(250, levels))
+        rest_levels = []
+        for index, chunk in enumerate(chunks):
+            chunk = list(chunk)
+            # Every pass with user errors drops at least one item, so the chunk is sent at most once per item.
+            for _pass in range(len(chunk)):
+                variables = {"input": {
+                    "name": "available", "reason": "correction", "ignoreCompareQuantity": True,
+                    "quantities": [{"inventoryItemId": "gid://shopify/InventoryItem/%s" % product.inventory_item_id,
+                                    "locationId": "gid://shopify/Location/%s" % location_id.shopify_location_id,
+                                    "quantity": quantity} for product, quantity in chunk]}}
+                try:
+                    result = instance.shopify_graphql_request(mutation, variables)
+                except Exception as error:
+                    _logger.info("GraphQL stock export failed for instance %s, exporting by REST: %s",
+                                 instance.name, error)
+                    result = {}
+                if not (result.get("data") or {}).get("inventorySetQuantities") or result.get("errors"):
+                    if result:
+                        _logger.info("GraphQL stock export is not available for instance %s, exporting by REST: %s",
+                                     instance.name, result.get("errors"))
+                    rest_levels += chunk + [level for rest in chunks[index + 1:] for level in rest]
+                    return exported_quantities, rest_levels, False, log_line_array
+
+                user_errors = result["data"]["inventorySetQuantities"].get("userErrors") or []
+                if not user_errors:
+                    exported_quantities.update({str(product.inventory_item_id): quantity
+                                                for product, quantity in chunk})
+                    chunk = []
+                    break
+                failed_indexes = set()
+                for user_error in user_errors:
+                    field = user_error.get("field") or []
+                    item_index = int(field[2]) if len(field) > 2 and str(field[2]).isdigit() else None
+                    if item_index is not None and item_index >= len(chunk):
+                        item_index = None
+                    failed_levels = [chunk[item_index]] if item_index is not None else chunk
+                    for product, quantity in failed_levels:
+                        message = "Error while Export stock for Product ID: %s & Product Name: '%s' for " \
+                                  "instance: '%s'\nError: %s" % (product.product_id.id, product.product_id.name,
+                                                                instance.name, user_error.get("message"))
+                        log_line_array = self.shopify_create_log(message, model_id, product.product_id,
+                                                                 log_line_array)
+                    failed_indexes.update([item_index] if item_index is not None else range(len(chunk)))
+                chunk = [level for level_index, level in enumerate(chunk) if level_index not in failed_indexes]
+                if not chunk:
+                    break
+            # Items not sent after all passes are exported by REST.
+            rest_levels += chunk
+        return exported_quantities, rest_levels, True, log_line_array
+
+    def is_shopify_stock_full_reconcile(self, instance):
+        """
+        This method decides whether the stock export is the full reconcile run, which sends the quantities of all
+        exported products of the instance. It is done every configured number of days.
+        @param instance: Record of instance.
+        @return: True or False.
+        """
+        if instance.stock_full_reconcile_days <= 0 or not instance.last_stock_full_reconcile_date:
+            return True
+        return datetime.now() >= instance.last_stock_full_reconcile_date + timedelta(
+            days=instance.stock_full_reconcile_days)
+
     def compute_qty_for_export_stock(self, product_stock, shopify_product, odoo_product):
         """ This method is used to find qty base on the configuration of Shopify.
             :param product_stock: Dictionary of the odoo product with qty.
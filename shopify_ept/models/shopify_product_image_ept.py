@@ -23,3 +23,10 @@ class ShopifyProductImageEpt(models.Model):
     url = fields.Char(related="odoo_image_id.url", help="External URL of image")
     image = fields.Image(related="odoo_image_id.image")
     sequence = fields.Integer(help="Sequence of images.", index=True, default=10)
+
+    def init(self):
+        """
+        Creates the index of the image searches of the template.
+        """
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS shopify_product_image_ept_template_image_index
+                            ON shopify_product_image_ept (shopify_template_id, shopify_image_id)""")
@@ -2,6 +2,7 @@
 # See LICENSE file for full copyright and licensing details.
 
 from odoo import models, fields, api
+from .res_partner import ADDRESS_OPTIONAL_FIELDS
 
 
 class ShopifyResPartnerEpt(models.Model):
@@ -12,6 +13,13 @@ class ShopifyResPartnerEpt(models.Model):
     shopify_instance_id = fields.Many2one("shopify.instance.ept", "Instances")
     shopify_customer_id = fields.Char()
 
+    def init(self):
+        """
+        Creates the index of the customer searches of the instance.
+        """
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS shopify_res_partner_ept_instance_customer_index
+                            ON shopify_res_partner_ept (shopify_instance_id, shopify_customer_id)""")
+
     def shopify_create_contact_partner(self, vals, instance, queue_line, log_book):
         """
         This method is used to create a contact type customer.
@@ -22,24 +30,15 @@ class ShopifyResPartnerEpt(models.Model):
 
         shopify_instance_id = instance.id
         shopify_customer_id = vals.get("id", False)
-        first_name = vals.get("first_name", "")
-        last_name = vals.get("last_name", "")
         email = vals.get("email", "")
+        name = self.shopify_prepare_customer_name(vals)
 
-        if not first_name and not last_name and not email:
+        if not name:
             message = "First name, Last name and Email are not found in customer data."
             model_id = common_log_line_obj.get_model_id("res.partner")
             common_log_line_obj.shopify_create_customer_log_line(message, model_id, queue_line, log_book)
             return False
 
-        name = ""
-        if first_name:
-            name = "%s" % first_name
-        if last_name:
-            name += " %s" % last_name if name else "%s" % last_name
-        if not name and email:
-            name = email
-
         partner = self.search_shopify_partner(shopify_customer_id, shopify_instance_id)
 
         if partner:
@@ -72,6 +71,181 @@ class ShopifyResPartnerEpt(models.Model):
 
         return partner
 
+    def shopify_import_customers_in_batch(self, customers, instance, log_book):
+        """
+        This method imports a page of customers. The existing Shopify customers and the partners of the emails are
+        found with one query each, then the new partners, their mappings and their addresses are created with
+        one create each.
+        :param customers: List of tuples of queue line and customer data.
+        @return: Dictionary of queue line and its main partner. Failed lines are not in it.
+        """
+        partner_obj = self.env["res.partner"]
+        common_log_line_obj = self.env["common.log.lines.ept"]
+
+        customer_ids = [str(customer_data.get("id")) for _line, customer_data in customers if customer_data.get("id")]
+        partner_by_customer = self.search_shopify_partners_in_batch(customer_ids, instance)
+        partner_by_email = partner_obj.search_partners_by_emails_ept([customer_data.get("email") for
+                                                                      _line, customer_data in customers])
+        partner_by_line = {}
+        email_partners = partner_obj
+        mapping_vals = []
+        new_partner_vals = []
+        new_index_by_customer = {}
+        new_index_by_email = {}
+        line_new_partner_index = {}
+        for line, customer_data in customers:
+            shopify_customer_id = str(customer_data.get("id") or "")
+            email = customer_data.get("email") or ""
+            name = self.shopify_prepare_customer_name(customer_data)
+            if not name:
+                message = "First name, Last name and Email are not found in customer data."
+                model_id = common_log_line_obj.get_model_id("res.partner")
+                common_log_line_obj.shopify_create_customer_log_line(message, model_id, line, log_book)
+                continue
+
+            partner = partner_by_customer.get(shopify_customer_id)
+            if not partner and email:
+                partner = partner_by_email.get(email.strip().lower())
+                if partner:
+                    email_partners |= partner
+                    partner_by_customer[shopify_customer_id] = partner
+                    mapping_vals.append({"shopify_customer_id": shopify_customer_id,
+                                         "shopify_instance_id": instance.id, "partner_id": partner.id})
+            if partner:
+                partner_by_line[line] = partner
+                continue
+
+            # The same customer or email can come twice in the page, its partner is created once.
+            email_key = email.strip().lower()
+            index = new_index_by_customer.get(shopify_customer_id)
+            if index is None and email_key:
+                index = new_index_by_email.get(email_key)
+                if index is not None and shopify_customer_id:
+                    new_index_by_customer[shopify_customer_id] = index
+                    mapping_vals.append({"shopify_customer_id": shopify_customer_id,
+                                         "shopify_instance_id": instance.id, "partner_index": index})
+            if index is None:
+                partner_vals = self.shopify_prepare_partner_vals(customer_data.get("default_address", {}))
+                partner_vals.update({
+                    "name": name,
+                    "email": email,
+                    "customer_rank": 1,
+                    "is_shopify_customer": True,
+                    "type": "contact",
+                })
+                new_partner_vals.append(partner_vals)
+                index = len(new_partner_vals) - 1
+                if email_key:
+                    new_index_by_email[email_key] = index
+                if shopify_customer_id:
+                    new_index_by_customer[shopify_customer_id] = index
+                    mapping_vals.append({"shopify_customer_id": shopify_customer_id,
+                                         "shopify_instance_id": instance.id, "partner_index": index})
+            line_new_partner_index[line] = index
+
+        new_partners = partner_obj.create(new_partner_vals)
+        for line, index in line_new_partner_index.items():
+            partner_by_line[line] = new_partners[index]
+        for vals in mapping_vals:
+            if "partner_index" in vals:
+                vals.update({"partner_id": new_partners[vals.pop("partner_index")].id})
+        email_partners.write({"is_shopify_customer": True})
+        self.create(mapping_vals)
+
+        addresses = []
+        for line, customer_data in customers:
+            if line not in partner_by_line:
+                continue
+            addresses += [(address, partner_by_line[line]) for address in customer_data.get("addresses", [])
+                          if not address.get("default")]
+        self.shopify_create_addresses_in_batch(addresses)
+        return partner_by_line
+
+    def shopify_prepare_customer_name(self, vals):
+        """
+        This method prepares the name of the customer from its first name, last name or email.
+        @return: Name of the customer or empty string.
+        """
+        first_name = vals.get("first_name", "")
+        last_name = vals.get("last_name", "")
+        email = vals.get("email", "")
+        name = ""
+        if first_name:
+            name = "%s" % first_name
+        if last_name:
+            name += " %s" % last_name if name else "%s" % last_name
+        if not name and email:
+            name = email
+        return name
+
+    def search_shopify_partners_in_batch(self, shopify_customer_ids, instance):
+        """
+        This method searches the partners of the Shopify customers of the instance with one query.
+        :param shopify_customer_ids: List of ids of Shopify customers.
+        @return: Dictionary of Shopify customer id and partner.
+        """
+        if not shopify_customer_ids:
+            return {}
+        shopify_partners = self.search([("shopify_customer_id", "in", shopify_customer_ids),
+                                        ("shopify_instance_id", "=", instance.id)])
+        partner_by_customer = {}
+        for shopify_partner in shopify_partners:
+            partner_by_customer.setdefault(shopify_partner.shopify_customer_id, shopify_partner.partner_id)
+        return partner_by_customer
+
+    def shopify_create_addresses_in_batch(self, addresses):
+        """
+        This method finds or creates the contact addresses of a page of customers. The addresses are found by their
+        fingerprint with one search and the missing ones are created with one create. Until the fingerprint of
+        all partners is set, every address is processed separately, as well as the addresses which cannot be
+        found by their fingerprint.
+        :param addresses: List of tuples of Shopify address and parent partner.
+        @return: True
+        """
+        partner_obj = self.env["res.partner"]
+        if not partner_obj.shopify_is_address_fingerprint_backfilled():
+            for address, parent_partner in addresses:
+                self.shopify_create_or_update_address(address, parent_partner)
+            return True
+
+        prepared_addresses = []
+        separate_addresses = []
+        for address, parent_partner in addresses:
+            if not address.get("first_name") and not address.get("last_name"):
+                continue
+            partner_vals = self.shopify_prepare_partner_vals(address)
+            address_key_list = ["name", "street", "street2", "city", "zip", "phone", "state_id", "country_id"]
+            if address.get("company"):
+                address_key_list.append("company_name")
+                partner_vals.update({"company_name": address.get("company")})
+            if not partner_obj.shopify_can_use_address_fingerprint(partner_vals, address_key_list):
+                separate_addresses.append((address, parent_partner))
+                continue
+            fingerprint = partner_obj.shopify_address_fingerprint_ept(partner_vals)
+            prepared_addresses.append((partner_vals, parent_partner, fingerprint, address_key_list))
+
+        # An address found under any parent is not created again, like in shopify_create_or_update_address.
+        existing_addresses = {}
+        if prepared_addresses:
+            partners = partner_obj.search([("shopify_address_fingerprint", "in",
+                                            list({address[2] for address in prepared_addresses}))])
+            for existing_vals in partners.read(["shopify_address_fingerprint"] + ADDRESS_OPTIONAL_FIELDS,
+                                               load=False):
+                existing_addresses.setdefault(existing_vals["shopify_address_fingerprint"], []).append(existing_vals)
+        create_vals = []
+        for partner_vals, parent_partner, fingerprint, address_key_list in prepared_addresses:
+            if any(partner_obj.shopify_is_same_address_ept(existing_vals, partner_vals, address_key_list)
+                   for existing_vals in existing_addresses.get(fingerprint, [])):
+                continue
+            existing_addresses.setdefault(fingerprint, []).append(dict(partner_vals))
+            partner_vals.update({"type": "contact", "parent_id": parent_partner.id})
+            create_vals.append(partner_vals)
+        partner_obj.create(create_vals)
+
+        for address, parent_partner in separate_addresses:
+            self.shopify_create_or_update_address(address, parent_partner)
+        return True
+
     def search_shopify_partner(self, shopify_customer_id, shopify_instance_id):
         """ This method is used to search the shopify partner.
             :param shopify_customer_id: Id of shopify customer which receive from customer response.
@@ -109,14 +283,15 @@ class ShopifyResPartnerEpt(models.Model):
             address_key_list.append("company_name")
             partner_vals.update({"company_name": company_name})
 
-        partner = partner_obj._find_partner_ept(partner_vals, address_key_list,
-                                                [("parent_id", "=", parent_partner.id), ("type", "=", partner_type)])
+        partner = partner_obj.shopify_find_partner_by_address(partner_vals, address_key_list,
+                                                              [("parent_id", "=", parent_partner.id),
+                                                               ("type", "=", partner_type)])
 
         if not partner:
-            partner = partner_obj._find_partner_ept(partner_vals, address_key_list,
-                                                    [("parent_id", "=", parent_partner.id)])
+            partner = partner_obj.shopify_find_partner_by_address(partner_vals, address_key_list,
+                                                                  [("parent_id", "=", parent_partner.id)])
         if not partner:
-            partner = partner_obj._find_partner_ept(partner_vals, address_key_list)
+            partner = partner_obj.shopify_find_partner_by_address(partner_vals, address_key_list, [])
             if partner and not partner.child_ids and partner_type == 'invoice':
                 partner.write({"type": partner_type})
         if partner:
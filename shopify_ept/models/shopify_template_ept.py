@@ -57,6 +57,13 @@ class ShopifyProductTemplateEpt(models.Model):
     active = fields.Boolean(default=True)
     shopify_image_ids = fields.One2many("shopify.product.image.ept", "shopify_template_id")
 
+    def init(self):
+        """
+        Creates the index of the template searches of the instance.
+        """
+        self._cr.execute("""CREATE INDEX IF NOT EXISTS shopify_product_template_ept_instance_tmpl_index
+                            ON shopify_product_template_ept (shopify_instance_id, shopify_tmpl_id)""")
+
     @api.depends("shopify_product_ids.exported_in_shopify", "shopify_product_ids.variant_id")
     def _compute_total_sync_variants(self):
         """ This method used to compute the total sync variants.
@@ -201,6 +208,53 @@ class ShopifyProductTemplateEpt(models.Model):
 
         return result
 
+    def import_products_by_ids_for_orders(self, template_ids, instance, log_book_id):
+        """
+        Fetches the products with the given ids in chunks of 250 and syncs each template once. It is used to import
+        the missing products of a page of orders before processing the orders.
+        @param template_ids: Ids of Shopify templates.
+        @param log_book_id: Common Log Book.
+        @return: Ids of the templates which are fetched from Shopify.
+        """
+        model_id = self.env["common.log.lines.ept"].get_model_id("shopify.product.template.ept")
+        fetched_template_ids = []
+        template_ids = list(template_ids)
+        instance.connect_in_shopify()
+        for start in range(0, len(template_ids), 250):
+            chunk_ids = ",".join(str(template_id) for template_id in template_ids[start:start + 250])
+            try:
+                products = self.shopify_find_products_by_ids(chunk_ids)
+            except Exception as error:
+                message = "Error while importing products for orders. Product IDs: %s.\nError: %s" % (chunk_ids,
+                                                                                                    str(error))
+                self.create_log_line_for_queue_line(message, model_id, log_book_id, False, False, "")
+                continue
+            for product in products:
+                try:
+                    with self._cr.savepoint():
+                        self.shopify_sync_products(False, product.id, instance, log_book_id,
+                                                   template_data=product.to_dict())
+                except Exception as error:
+                    message = "Error while importing product for orders. Product ID: %s.\nError: %s" % (product.id,
+                                                                                                       str(error))
+                    self.create_log_line_for_queue_line(message, model_id, log_book_id, False, False, "")
+                    continue
+                fetched_template_ids.append(product.id)
+        return fetched_template_ids
+
+    def shopify_find_products_by_ids(self, template_ids):
+        """
+        Requests the products of the ids, retrying once when the request limit of Shopify is reached.
+        @param template_ids: Comma separated ids of at most 250 templates.
+        """
+        try:
+            return shopify.Product().find(ids=template_ids, limit=250)
+        except ClientError as error:
+            if hasattr(error, "response") and error.response.code == 429:
+                time.sleep(5)
+                return shopify.Product().find(ids=template_ids, limit=250)
+            raise
+
     def prepare_variant_vals(self, instance, variant_data):
         """
         This method used to prepare a shopify variant dictionary.
@@ -274,7 +328,7 @@ class ShopifyProductTemplateEpt(models.Model):
         return product_category
 
     def shopify_sync_products(self, product_data_line_id, shopify_tmpl_id, instance, log_book_id,
-                              order_data_line_id=False):
+                              order_data_line_id=False, template_data=False):
         """
         This method is used to sync products from queue line or shopify template id for Order.
         @param product_data_line_id: Product Queue Line.
@@ -283,6 +337,7 @@ class ShopifyProductTemplateEpt(models.Model):
         @param instance: Shopify Instance.
         @param log_book_id: Common Log Book.
         @param order_data_line_id: Order Queue Line, when needed to import a product for a order.
+        @param template_data: Data of the shopify template, when it is already fetched.
         @author: Maulik Barad on Date 01-Sep-2020.
         """
         common_log_line_obj = self.env["common.log.lines.ept"]
@@ -290,9 +345,12 @@ class ShopifyProductTemplateEpt(models.Model):
         model_id = common_log_line_obj.get_model_id("shopify.product.template.ept")
         instance.connect_in_shopify()
 
-        template_data, skip_existing_product = self.convert_shopify_template_response(shopify_tmpl_id,
-                                                                                      product_data_line_id, model_id,
-                                                                                      log_book_id, order_data_line_id)
+        skip_existing_product = False
+        if not template_data:
+            template_data, skip_existing_product = self.convert_shopify_template_response(shopify_tmpl_id,
+                                                                                          product_data_line_id,
+                                                                                          model_id, log_book_id,
+                                                                                          order_data_line_id)
 
         if not template_data:
             return True
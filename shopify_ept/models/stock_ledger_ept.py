@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# See LICENSE file for full copyright and licensing details.
+
+from odoo import models, fields, api
+from odoo.tools.misc import split_every
+
+
+class ShopifyStockLedgerEpt(models.Model):
+    _name = "shopify.stock.ledger.ept"
+    _description = "Shopify Stock Ledger"
+
+    shopify_instance_id = fields.Many2one("shopify.instance.ept", "Instance", required=True, ondelete="cascade")
+    location_id = fields.Many2one("shopify.location.ept", "Location", required=True, ondelete="cascade")
+    inventory_item_id = fields.Char(required=True)
+    quantity = fields.Integer(help="Last quantity exported to Shopify successfully.")
+    pushed_at = fields.Datetime(help="Date and time of the last successful export of the quantity.")
+
+    _sql_constraints = [("shopify_stock_ledger_unique", "unique(shopify_instance_id,location_id,inventory_item_id)",
+                         "Stock ledger line must be unique per location and inventory item.")]
+
+    @api.model
+    def get_pushed_quantities(self, instance, location):
+        """
+        This method gives the quantities last exported to the location with one query.
+        @param instance: Record of instance.
+        @param location: Record of Shopify location.
+        @return: Dictionary of inventory item id and quantity.
+        """
+        self._cr.execute("""SELECT inventory_item_id, quantity FROM shopify_stock_ledger_ept
+                            WHERE shopify_instance_id = %s AND location_id = %s""", (instance.id, location.id))
+        return dict(self._cr.fetchall())
+
+    @api.model
+    def record_pushed_quantities(self, instance, location, quantities):
+        """
+        This method saves the quantities exported to the location successfully, inserting or updating the ledger
+        lines in chunks of 1000.
+        @param instance: Record of instance.
+        @param location: Record of Shopify location.
+        @param quantities: Dictionary of inventory item id and exported quantity.
+        """
+        for chunk in split_every(1000, list(quantities.items())):
+            self._cr.execute("""INSERT INTO shopify_stock_ledger_ept
+                                    (shopify_instance_id, location_id, inventory_item_id, quantity, pushed_at,
+                                     create_uid, create_date, write_uid, write_date)
+                                SELECT %s, %s, data.inventory_item_id, data.quantity, now() at time zone 'UTC',
+                                       %s, now() at time zone 'UTC', %s, now() at time zone 'UTC'
+                                FROM unnest(%s, %s) AS data(inventory_item_id, quantity)
+                                ON CONFLICT (shopify_instance_id, location_id, inventory_item_id)
+                                DO UPDATE SET quantity = EXCLUDED.quantity, pushed_at = EXCLUDED.pushed_at,
+                                              write_uid = EXCLUDED.write_uid, write_date = EXCLUDED.write_date""",
+                             (instance.id, location.id, self.env.uid, self.env.uid,
+                              [str(item[0]) for item in chunk], [int(item[1]) for item in chunk]))
+        return True
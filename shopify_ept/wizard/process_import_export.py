@@ -30,6 +30,7 @@ class ShopifyProcessImportExport(models.TransientModel):
          ("import_customers", "Import Customers"),
          ("import_unshipped_orders", "Import Unshipped Orders"),
          ("import_shipped_orders", "Import Shipped Orders"),
+         ("import_orders_backfill", "Import Orders History - Backfill"),
          ("import_orders_by_remote_ids", "Import Orders - By Remote Ids"),
          ("update_order_status", "Update Order Shipping Status"),
          ("export_stock", "Export Stock"),
@@ -39,6 +40,10 @@ class ShopifyProcessImportExport(models.TransientModel):
          ("import_payout_report", "Import Payout Report")], default="sync_product", string="Operation")
     orders_from_date = fields.Datetime(string="From Date")
     orders_to_date = fields.Datetime(string="To Date")
+    backfill_shard_size = fields.Integer("Orders Per Shard", default=1000,
+                                         help="The date range is split in shards having at most these many orders.")
+    backfill_worker_count = fields.Integer("Workers", default=4,
+                                           help="Number of shards imported at the same time.")
     shopify_instance_ids = fields.Many2many("shopify.instance.ept", "shopify_instance_import_export_rel",
                                             "process_id", "shopify_instance_id", "Instances")
     shopify_is_set_price = fields.Boolean(string="Set Price ?",
@@ -134,6 +139,17 @@ class ShopifyProcessImportExport(models.TransientModel):
                 action_name = "shopify_ept.action_shopify_order_data_queue_ept"
                 form_view_name = "shopify_ept.view_shopify_order_data_queue_ept_form"
 
+        elif self.shopify_operation == "import_orders_backfill":
+            backfill = self.env["shopify.order.backfill.ept"].create({"shopify_instance_id": instance.id,
+                                                                     "date_from": self.orders_from_date,
+                                                                     "date_to": self.orders_to_date,
+                                                                     "shard_size": self.backfill_shard_size,
+                                                                     "worker_count": self.backfill_worker_count})
+            backfill.action_plan_shards()
+            queue_ids = backfill.ids
+            action_name = "shopify_ept.action_shopify_order_backfill_ept"
+            form_view_name = "shopify_ept.view_shopify_order_backfill_ept_form"
+
         elif self.shopify_operation == "import_orders_by_remote_ids":
             order_date_queue_obj.import_order_process_by_remote_ids(instance, self.shopify_order_ids)
 
@@ -299,30 +315,34 @@ class ShopifyProcessImportExport(models.TransientModel):
 
     def create_customer_data_queues(self, customer_data):
         """
-        It creates customer data queue from data of Customer.
+        It creates customer data queue from data of Customer. All queues of the page and all their lines are
+        created with one create each, and one notification is sent for the page.
         @author: Maulik Barad on Date 09-Sep-2020.
         @param customer_data: Data of Customer.
         """
-        customer_queue_list = []
         customer_data_queue_obj = self.env["shopify.customer.data.queue.ept"]
         customer_data_queue_line_obj = self.env["shopify.customer.data.queue.line.ept"]
         bus_bus_obj = self.env["bus.bus"]
 
-        if len(customer_data) > 0:
-            for customer_id_chunk in split_every(125, customer_data):
-                customer_queue = customer_data_queue_obj.create_customer_queue(self.shopify_instance_id,
-                                                                               "import_process")
-                customer_data_queue_line_obj.shopify_create_multi_queue(customer_queue, customer_id_chunk)
-
-                message = "Customer Queue created {}".format(customer_queue.name)
-                bus_bus_obj.sendone((self._cr.dbname, "res.partner", self.env.user.partner_id.id),
-                                    {"type": "simple_notification", "title": "Shopify Notification",
-                                     "message": message, "sticky": False, "warning": True})
-                _logger.info(message)
-
-                customer_queue_list.append(customer_queue.id)
-            self._cr.commit()
-        return customer_queue_list
+        if not customer_data:
+            return []
+        customer_chunks = list(split_every(125, customer_data))
+        customer_queues = customer_data_queue_obj.create(
+            [{"shopify_instance_id": self.shopify_instance_id.id, "record_created_from": "import_process"}
+             for _chunk in customer_chunks])
+        customer_queue_line_vals = []
+        for customer_queue, customer_id_chunk in zip(customer_queues, customer_chunks):
+            customer_queue_line_vals += [customer_data_queue_line_obj.prepare_customer_data_queue_line_vals(
+                result, customer_queue) for result in customer_id_chunk]
+        customer_data_queue_line_obj.create(customer_queue_line_vals)
+
+        message = "Customer Queue created {}".format(", ".join(customer_queues.mapped("name")))
+        bus_bus_obj.sendone((self._cr.dbname, "res.partner", self.env.user.partner_id.id),
+                            {"type": "simple_notification", "title": "Shopify Notification",
+                             "message": message, "sticky": False, "warning": True})
+        _logger.info(message)
+        self._cr.commit()
+        return customer_queues.ids
 
     def webhook_customer_create_process(self, res, instance):
         """
@@ -407,7 +427,8 @@ class ShopifyProcessImportExport(models.TransientModel):
 
         products = product_obj.get_products_based_on_movement_date_ept(last_update_date,
                                                                        instance.shopify_company_id)
-        if products:
+        # The full reconcile run exports all products, even when no stock has moved.
+        if products or shopify_product_obj.is_shopify_stock_full_reconcile(instance):
             shopify_products = shopify_product_obj.export_stock_in_shopify(instance, products)
             if shopify_products:
                 instance.write({'shopify_last_date_update_stock': shopify_products[0].last_stock_update_date})
@@ -432,7 +453,8 @@ class ShopifyProcessImportExport(models.TransientModel):
                 ('shopify_template_id', 'in', shopify_template_ids)])
             odoo_product_ids = shopify_products.product_id.ids
             if odoo_product_ids:
-                shopify_product_obj.with_context({'is_process_from_selected_product': True}).export_stock_in_shopify(
+                shopify_product_obj.with_context({'is_process_from_selected_product': True,
+                                                  'shopify_stock_full_reconcile': True}).export_stock_in_shopify(
                     instance, odoo_product_ids)
         return True
 
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 # See LICENSE file for full copyright and licensing details.
 
-from odoo import models, _
+from odoo import models, fields, _
 
 
 class ShopifyQueueProcessEpt(models.TransientModel):
@@ -59,13 +59,13 @@ class ShopifyQueueProcessEpt(models.TransientModel):
         shopify_order_queue_line_obj = self.env["shopify.order.data.queue.line.ept"]
         order_queue_ids = self._context.get('active_ids')
 
-        self.env.cr.execute(
-            """update shopify_order_data_queue_ept set is_process_queue = False where is_process_queue = True""")
-        self._cr.commit()
+        self.env["shopify.order.data.queue.ept"].reset_order_queue_process_flags()
         for order_queue_id in order_queue_ids:
+            # Lines leased by a running cron are processed by it.
             order_queue_line_batch = shopify_order_queue_line_obj.search(
                 [("shopify_order_data_queue_id", "=", order_queue_id),
-                 ("state", "in", ('draft', 'failed'))])
+                 ("state", "in", ('draft', 'failed')), "|", ("lease_expires_at", "=", False),
+                 ("lease_expires_at", "<", fields.Datetime.now())])
             order_queue_line_batch.process_import_order_queue_data()
         return True
 
@@ -32,10 +32,10 @@ class ShopifyInstanceConfig(models.TransientModel):
         currency_obj = self.env["res.currency"]
         pricelist_obj = self.env["product.pricelist"]
 
-        currency_id = currency_obj.search([("name", "=", shop_currency)], limit=1)
+        currency_id = currency_obj.get_currency_by_name_ept(shop_currency)
 
         if not currency_id:
-            currency_id = currency_obj.search([("name", "=", shop_currency), ("active", "=", False)], limit=1)
+            currency_id = currency_obj.get_currency_by_name_ept(shop_currency, include_inactive=True)
             currency_id.write({"active": True})
         if not currency_id:
             currency_id = self.env.user.currency_id
@@ -240,6 +240,23 @@ class ResConfigSettings(models.TransientModel):
                                                       help="This customer will be set in POS order, when"
                                                            "customer is not found.",
                                                       domain="[('customer_rank','>', 0)]")
+    shopify_order_import_overlap_minutes = fields.Integer("Order Import Safety Margin (Minutes)", default=10,
+                                                          help="The next auto import of orders starts this many "
+                                                               "minutes before the end of the previous import window.")
+    shopify_batch_commit_size = fields.Integer("Commit Batch Size", default=50,
+                                               help="Number of records imported or exported before the "
+                                                    "transaction is committed.")
+    shopify_batch_commit_seconds = fields.Integer("Commit Batch Time (Seconds)", default=60,
+                                                  help="Processed records are committed after this time even if "
+                                                       "the batch is not full.")
+    shopify_stock_full_reconcile_days = fields.Integer("Full Stock Reconcile (Days)", default=7,
+                                                       help="Every this many days all quantities are exported, not "
+                                                            "only the changed ones. Set 0 to always export all.")
+    shopify_stock_export_engine = fields.Selection([("rest", "REST (one request per item)"),
+                                                    ("graphql", "GraphQL (250 items per request)")],
+                                                   "Stock Export Engine", default="rest",
+                                                   help="GraphQL sends the quantities in bulk mutations. Stores "
+                                                        "where the mutation is not available are exported by REST.")
     last_date_order_import = fields.Datetime(string="Last Date Of Unshipped Order Import",
                                              help="Last date of sync orders from Shopify to Odoo")
     shopify_last_date_customer_import = fields.Datetime(string="Last Date Of Customer Import",
@@ -313,6 +330,11 @@ class ResConfigSettings(models.TransientModel):
 
             self.shopify_default_pos_customer_id = instance.shopify_default_pos_customer_id
             self.last_date_order_import = instance.last_date_order_import or False
+            self.shopify_order_import_overlap_minutes = instance.order_import_overlap_minutes
+            self.shopify_batch_commit_size = instance.batch_commit_size
+            self.shopify_batch_commit_seconds = instance.batch_commit_seconds
+            self.shopify_stock_full_reconcile_days = instance.stock_full_reconcile_days
+            self.shopify_stock_export_engine = instance.stock_export_engine
             self.shopify_last_date_customer_import = instance.shopify_last_date_customer_import or False
             self.shopify_last_date_update_stock = instance.shopify_last_date_update_stock or False
             self.shopify_last_date_product_import = instance.shopify_last_date_product_import or False
@@ -359,6 +381,11 @@ class ResConfigSettings(models.TransientModel):
             values["create_shopify_orders_webhook"] = self.create_shopify_orders_webhook
             values["shopify_default_pos_customer_id"] = self.shopify_default_pos_customer_id.id
             values["last_date_order_import"] = self.last_date_order_import
+            values["order_import_overlap_minutes"] = self.shopify_order_import_overlap_minutes
+            values["batch_commit_size"] = self.shopify_batch_commit_size
+            values["batch_commit_seconds"] = self.shopify_batch_commit_seconds
+            values["stock_full_reconcile_days"] = self.shopify_stock_full_reconcile_days
+            values["stock_export_engine"] = self.shopify_stock_export_engine
             values["shopify_last_date_customer_import"] = self.shopify_last_date_customer_import
             values["shopify_last_date_update_stock"] = self.shopify_last_date_update_stock
             values["shopify_last_date_product_import"] = self.shopify_last_date_product_import